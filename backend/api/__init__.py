@@ -7,10 +7,20 @@ def register_blueprints(app):
     from .products import products_bp
     from .documents import documents_bp
     from .carousel import carousel_bp
+    from .health import health_bp
+    from .home import home_bp
+    from .batch import batch_bp
+    from .changes import changes_bp
+    from .jobs import jobs_bp
 
     # 前台API註冊
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(categories_bp, url_prefix='/api/categories')
     app.register_blueprint(products_bp, url_prefix='/api/products')
     app.register_blueprint(documents_bp, url_prefix='/api/documents')
-    app.register_blueprint(carousel_bp, url_prefix='/api/carousel')
\ No newline at end of file
+    app.register_blueprint(carousel_bp, url_prefix='/api/carousel')
+    app.register_blueprint(health_bp, url_prefix='/api/health')
+    app.register_blueprint(home_bp, url_prefix='/api/home')
+    app.register_blueprint(batch_bp, url_prefix='/api/batch')
+    app.register_blueprint(changes_bp, url_prefix='/api/changes')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
\ No newline at end of file
@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import wait
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+from models.deadline import DEADLINE_ENVIRON_KEY, request_deadline
+from models.query import REQUEST_CACHE_ENVIRON_KEY, RequestModelCache
+from utils.subrequest import get_subrequest_pool, run_subrequest
+
+batch_bp = Blueprint('batch', __name__)
+
+# 回傳檔案或串流（非 JSON）的端點，不能作為批次子請求
+NON_JSON_ENDPOINTS = ('products.get_product_image', 'carousel.get_carousel_image',
+                      'documents_bp.download_document')
+
+def _endpoint(app, path):
+    """path 對應的端點；找不到時回傳 None（交由子請求回傳 404）"""
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(path.split('?', 1)[0], method='GET')
+    except HTTPException:
+        return None
+    return endpoint
+
+def _item_body(response):
+    """子請求的 JSON 內容；串流或非 JSON 回應回傳 None（並關閉回應）"""
+    if response.direct_passthrough or not response.is_json:
+        response.close()
+        return None
+    return response.get_json(silent=True)
+
+@batch_bp.route('/', methods=['POST'])
+def run_batch():
+    """批次執行多個 GET 子請求（並行、整批期限、數量上限、共用模型快取）
+
+    請求：{"requests": [{"id": "a", "path": "/api/products/123"}, "/api/categories/", ...]}
+    回應：{"responses": [{"id", "path", "status", "body", "duration_ms"}, ...]}，順序與請求相同
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('requests')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "requests 必須是非空陣列"}), 400
+
+    max_requests = current_app.config.get('BATCH_MAX_REQUESTS', 20)
+    if len(items) > max_requests:
+        return jsonify({"error": f"單次最多 {max_requests} 個子請求"}), 400
+
+    subrequests = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'path': item}
+        path = item.get('path') if isinstance(item, dict) else None
+        if not isinstance(path, str) or not path.startswith('/api/') or path.startswith('/api/batch'):
+            return jsonify({"error": f"第 {index + 1} 個子請求的路徑無效"}), 400
+        subrequests.append((item.get('id', index), path))
+
+    app = current_app._get_current_object()
+    rejected = {index for index, (_, path) in enumerate(subrequests)
+                if _endpoint(app, path) in NON_JSON_ENDPOINTS}
+    pool = get_subrequest_pool(app)
+    timeout = app.config.get('BATCH_TIMEOUT', 5)
+    started = time.perf_counter()
+
+    # 子請求沿用外層的授權，並共用同一份模型快取
+    headers = {'Authorization': request.headers['Authorization']} if 'Authorization' in request.headers else {}
+    model_cache = RequestModelCache()
+    # 子請求的期限不超過整批期限，逾時的子請求不會在回應之後繼續佔用執行緒與 Firestore 呼叫
+    deadline = time.monotonic() + timeout
+    parent_deadline = request_deadline()
+    if parent_deadline is not None:
+        deadline = min(deadline, parent_deadline)
+    environ = {REQUEST_CACHE_ENVIRON_KEY: model_cache, DEADLINE_ENVIRON_KEY: deadline}
+    futures = [None if index in rejected else pool.submit(run_subrequest, app, path, headers, environ)
+               for index, (_, path) in enumerate(subrequests)]
+    wait([future for future in futures if future is not None], timeout=timeout)
+
+    responses = []
+    for (item_id, path), future in zip(subrequests, futures):
+        entry = {'id': item_id, 'path': path}
+        if future is None:
+            entry.update(status=400, body={"error": "此端點不回傳 JSON，不能批次呼叫"})
+        elif not future.done():
+            future.cancel()
+            entry.update(status=504, body={"error": "子請求逾時"})
+        elif future.exception() is not None:
+            entry.update(status=500, body={"error": str(future.exception())})
+        else:
+            response, elapsed = future.result()
+            body = _item_body(response)
+            if body is None:
+                entry.update(status=415, body={"error": "子請求未回傳 JSON"})
+            else:
+                entry.update(status=response.status_code, body=body)
+            entry['duration_ms'] = round(elapsed * 1000, 1)
+        responses.append(entry)
+
+    response = jsonify({'responses': responses})
+    response.headers['Server-Timing'] = (f'batch;dur={(time.perf_counter() - started) * 1000:.1f}, '
+                                         f'model-cache;desc="hits={model_cache.hits} misses={model_cache.misses}"')
+    return response, 200
@@ -1,16 +1,19 @@
 from flask import Blueprint, jsonify, redirect
 from models.carousel import Carousel
+from utils.image_cache import proxy_enabled, serve_image
+from utils.response_cache import cached_response
+from utils.singleflight import coalesce_request
 
 carousel_bp = Blueprint('carousel', __name__)
 
 @carousel_bp.route('/', methods=['GET'])
+@cached_response(tags=('carousels',))
+@coalesce_request
 def get_carousel_items():
     """獲取所有啟用的輪播圖項目"""
     try:
-        # Firebase 查詢並排序
-        all_carousels = Carousel.filter_by(is_active=True)
-        # 手動排序
-        carousel_items = sorted(all_carousels, key=lambda x: x.order_num)
+        # Firebase 查詢並排序（需要 is_active + order_num 複合索引）
+        carousel_items = Carousel.query().filter_by(is_active=True).order_by('order_num').all()
 
         result = []
 
@@ -33,6 +36,13 @@ def get_carousel_items():
 def get_carousel_image(carousel_id):
     """獲取輪播圖圖片 - 重定向到 Storage URL"""
     try:
+        if proxy_enabled():
+            response = serve_image(Carousel.COLLECTION, carousel_id,
+                                   lambda: Carousel.get(carousel_id))
+            if response is None:
+                return jsonify({"error": "找不到輪播圖"}), 404
+            return response
+
         carousel = Carousel.get(carousel_id)
         if not carousel:
             return jsonify({"error": "找不到輪播圖"}), 404
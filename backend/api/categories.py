@@ -1,13 +1,34 @@
-from flask import Blueprint, jsonify
+import json
+import click
+from flask import Blueprint, current_app, jsonify
 from models.category import MainCategory, SubCategory
+from models.counters import CATEGORY_PRODUCT_COUNTS, ensure_counters_seeded, reconcile_counters
+from utils.response_cache import cached_response
+from utils.singleflight import coalesce_request
+from utils.startup import register_warmup
 
 categories_bp = Blueprint('categories', __name__)
 
+def _product_counts():
+    """各分類的產品數（分片計數器）；讀取失敗時不影響分類資料"""
+    try:
+        ensure_counters_seeded(current_app.db)
+        return CATEGORY_PRODUCT_COUNTS.values(current_app.db)
+    except Exception as e:
+        print(f"Error reading category product counts: {str(e)}")
+        return None
+
+def _count(counts, key):
+    return max(0, int(counts.get(key, 0))) if counts is not None else None
+
 @categories_bp.route('/', methods=['GET'])
+@cached_response(tags=('main_categories', 'sub_categories', 'products'))
+@coalesce_request
 def get_all_categories():
-    """獲取所有產品分類（階層結構）"""
+    """獲取所有產品分類（階層結構，含各分類產品數）"""
     try:
         main_categories = MainCategory.all()
+        counts = _product_counts()
         result = []
 
         for main_cat in main_categories:
@@ -17,11 +38,13 @@ def get_all_categories():
                 'id': main_cat.id,
                 'name': main_cat.name,
                 'description': main_cat.description,
+                'product_count': _count(counts, f'main:{main_cat.id}'),
                 'subcategories': [
                     {
                         'id': sub_cat.id,
                         'name': sub_cat.name,
-                        'description': sub_cat.description
+                        'description': sub_cat.description,
+                        'product_count': _count(counts, f'sub:{sub_cat.id}')
                     } for sub_cat in sub_cats
                 ]
             }
@@ -32,6 +55,7 @@ def get_all_categories():
         return jsonify({"error": f"獲取分類失敗: {str(e)}"}), 500
 
 @categories_bp.route('/main', methods=['GET'])
+@cached_response(tags=('main_categories',))
 def get_main_categories():
     """獲取所有主分類"""
     try:
@@ -48,6 +72,7 @@ def get_main_categories():
         return jsonify({"error": f"獲取主分類失敗: {str(e)}"}), 500
 
 @categories_bp.route('/main/<main_id>/subcategories', methods=['GET'])
+@cached_response(tags=('sub_categories',))
 def get_subcategories(main_id):
     """獲取指定主分類下的所有子分類"""
     try:
@@ -62,4 +87,13 @@ def get_subcategories(main_id):
         ]
         return jsonify(result), 200
     except Exception as e:
-        return jsonify({"error": f"獲取子分類失敗: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"獲取子分類失敗: {str(e)}"}), 500
+
+@categories_bp.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """以聚合查詢重新計算分類產品數與文件統計，校正分片計數器的漂移"""
+    corrections = reconcile_counters(current_app.db)
+    click.echo(json.dumps(corrections, ensure_ascii=False, indent=2))
+
+# 既有資料的計數器在啟動時建立初始值（只有第一個啟動的行程會執行 reconcile）
+register_warmup('counters', lambda app: ensure_counters_seeded(app.db))
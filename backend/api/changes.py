@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+import click
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from models.carousel import Carousel
+from models.category import MainCategory, SubCategory
+from models.deadline import call_timeout
+from models.document import Document
+from models.product import Product, ProductImage
+from models.query import DOCUMENT_ID, decode_cursor, encode_cursor
+from models.tombstones import TOMBSTONE_COLLECTION, purge_tombstones
+
+changes_bp = Blueprint('changes', __name__)
+
+SYNC_MODELS = {model.COLLECTION: model for model in
+               (Product, ProductImage, MainCategory, SubCategory, Carousel, Document)}
+
+def _is_authenticated():
+    try:
+        verify_jwt_in_request(optional=True)
+        return bool(get_jwt_identity())
+    except Exception:
+        return False
+
+def _naive_utc(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _scan(db, collection, field, cursor, upper, limit, where=()):
+    """依 (field, __name__) 遞增讀取 cursor 之後、upper 之前的文件"""
+    query = db.collection(collection)
+    for clause in where:
+        query = query.where(*clause)
+    query = query.where(field, '<=', upper)
+    if cursor and not cursor.get(DOCUMENT_ID):
+        query = query.where(field, '>', cursor[field])
+    query = query.order_by(field).order_by(DOCUMENT_ID)
+    if cursor and cursor.get(DOCUMENT_ID):
+        query = query.start_after({field: cursor[field], DOCUMENT_ID: cursor[DOCUMENT_ID]})
+    docs = list(query.limit(limit).stream(timeout=call_timeout(collection)))
+    if docs:
+        last = docs[-1]
+        cursor = {field: last.to_dict().get(field), DOCUMENT_ID: last.id}
+    return docs, cursor
+
+@changes_bp.route('/<collection>', methods=['GET'])
+def get_changes(collection):
+    """增量同步：回傳游標之後修改或刪除的文件
+
+    以 updated_at 排序分頁；刪除由模型 delete() 寫入的 tombstones 提供。
+    缺少 updated_at 的舊文件不會出現在結果中，需先執行 flask changes backfill-updated-at。
+    沒有 since 表示從頭同步；回傳的 cursor 需保存供下次使用（即使沒有變更）。
+    """
+    model = SYNC_MODELS.get(collection)
+    if model is None:
+        return jsonify({"error": "不支援的集合"}), 404
+
+    try:
+        state = decode_cursor(request.args['since']) if request.args.get('since') else {}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    limit = min(max(1, request.args.get('limit', 100, type=int)),
+                current_app.config.get('SYNC_PAGE_MAX', 500))
+    now = datetime.utcnow()
+    retention = timedelta(days=current_app.config.get('TOMBSTONE_RETENTION_DAYS', 30))
+    # 寫入時間由應用伺服器產生，保留一小段時間讓進行中的寫入完成，避免漏掉較早時間戳的寫入
+    upper = now - timedelta(seconds=current_app.config.get('SYNC_SETTLE_SECONDS', 5))
+
+    deleted_cursor = state.get('deleted')
+    if deleted_cursor is None:
+        # 完整同步不需要之前的刪除紀錄，從現在開始追蹤
+        deleted_cursor = {'deleted_at': upper, DOCUMENT_ID: None}
+    elif _naive_utc(deleted_cursor['deleted_at']) < now - retention:
+        # 刪除紀錄已清除，無法保證增量正確
+        return jsonify({"error": "同步游標已過期，請重新完整同步", "resync": True}), 410
+
+    try:
+        db = model.get_db()
+        docs, changed_cursor = _scan(db, collection, 'updated_at', state.get('changed'), upper, limit)
+        tombstones, deleted_cursor = _scan(db, TOMBSTONE_COLLECTION, 'deleted_at', deleted_cursor,
+                                           upper, limit, where=[('collection', '==', collection)])
+
+        changes, deleted = [], [doc.to_dict()['doc_id'] for doc in tombstones]
+        public_only = collection == Document.COLLECTION and not _is_authenticated()
+        for doc in docs:
+            obj = model._from_doc(doc)
+            if public_only and obj.requires_login:
+                # 未登入的用戶端視為刪除，文件改為私人時也能移除
+                deleted.append(obj.id)
+                continue
+            changes.append(obj.to_dict())
+
+        cursor = {'deleted': deleted_cursor}
+        if changed_cursor:
+            cursor['changed'] = changed_cursor
+
+        return jsonify({
+            'collection': collection,
+            'changes': changes,
+            'deleted': deleted,
+            'cursor': encode_cursor(cursor),
+            'has_more': len(docs) == limit or len(tombstones) == limit
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"獲取變更失敗: {str(e)}"}), 500
+
+@changes_bp.cli.command('purge-tombstones')
+@click.option('--days', type=int, default=None, help='保留天數（預設 TOMBSTONE_RETENTION_DAYS）')
+def purge_tombstones_command(days):
+    """清除超過保留期限的刪除紀錄"""
+    days = days if days is not None else current_app.config.get('TOMBSTONE_RETENTION_DAYS', 30)
+    count = purge_tombstones(current_app.db, datetime.utcnow() - timedelta(days=days))
+    click.echo(f'已清除 {count} 筆刪除紀錄')
+
+@changes_bp.cli.command('backfill-updated-at')
+@click.option('--dry-run', is_flag=True, help='只計算筆數，不寫入')
+def backfill_updated_at_command(dry_run):
+    """為缺少 updated_at 的文件補上目前時間（增量同步以 updated_at 掃描，缺少欄位的文件會被略過）
+
+    使用目前時間而非 created_at，已同步過的用戶端下次增量同步也會收到這些文件。
+    """
+    db = current_app.db
+    now = datetime.utcnow()
+    for collection in SYNC_MODELS:
+        missing = [doc.reference for doc in
+                   db.collection(collection).select(['updated_at']).stream(timeout=call_timeout(collection))
+                   if (doc.to_dict() or {}).get('updated_at') is None]
+        if not dry_run:
+            for start in range(0, len(missing), 500):
+                batch = db.batch()
+                for ref in missing[start:start + 500]:
+                    batch.update(ref, {'updated_at': now})
+                batch.commit(timeout=call_timeout(collection))
+        click.echo(f'{collection}: {len(missing)} 筆{"缺少 updated_at" if dry_run else "已補上 updated_at"}')
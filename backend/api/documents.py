@@ -1,19 +1,36 @@
 # ...existing code...
 import os
+import threading
 from datetime import datetime, timedelta
-from flask import Blueprint, jsonify, redirect, request
+from urllib.parse import quote, unquote
+from flask import Blueprint, Response, current_app, jsonify, redirect, request
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, decode_token, jwt_required
-from firebase_admin import firestore
-from google.cloud import storage as gcs_client
+from models.counters import DOCUMENT_STATS, ensure_counters_seeded
+from models.document import Document
+from utils.response_cache import cached_response
+from utils.startup import register_warmup
 
 documents_bp = Blueprint('documents_bp', __name__, url_prefix='/api/documents')
 
+_gcs_client = None
+_gcs_client_lock = threading.Lock()
+
 # Helper: GCS client and signed URL generation
 def _get_gcs_client():
-    cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH')
-    if cred_path and os.path.isfile(cred_path):
-        return gcs_client.Client.from_service_account_json(cred_path)
-    return gcs_client.Client()
+    """取得共用的 GCS client（google.cloud.storage 延遲載入，只建立一次）"""
+    global _gcs_client
+    if _gcs_client is None:
+        with _gcs_client_lock:
+            if _gcs_client is None:
+                from google.cloud import storage as gcs_client
+                cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH')
+                if cred_path and os.path.isfile(cred_path):
+                    _gcs_client = gcs_client.Client.from_service_account_json(cred_path)
+                else:
+                    _gcs_client = gcs_client.Client()
+    return _gcs_client
+
+register_warmup('gcs_client', lambda app: _get_gcs_client())
 
 def _generate_signed_url(blob_name, expiration_minutes=15):
     client = _get_gcs_client()
@@ -24,31 +41,111 @@ def _generate_signed_url(blob_name, expiration_minutes=15):
     blob = bucket.blob(blob_name)
     return blob.generate_signed_url(expiration=timedelta(minutes=expiration_minutes), version='v4')
 
+def _content_disposition(doc, blob_name):
+    """附件檔名：標題 + blob 副檔名；非 ASCII 以 RFC 5987 filename* 提供"""
+    ext = os.path.splitext(blob_name)[1]
+    filename = (doc.get('title') or os.path.basename(blob_name) or 'download').replace('/', '_')
+    if ext and not filename.lower().endswith(ext.lower()):
+        filename += ext
+    fallback = filename.encode('ascii', 'ignore').decode('ascii').replace('"', '') or f'download{ext}'
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename)}'
+
+def _blob_name(file_url):
+    """file_url 對應的 bucket 內路徑；完整 URL 須指向本專案的 bucket，否則回傳 None
+
+    支援 storage.googleapis.com/<bucket>/<path> 與 Firebase 下載 URL（/b/<bucket>/o/<編碼路徑>）。
+    """
+    if not file_url:
+        return None
+    if not (file_url.startswith('http://') or file_url.startswith('https://')):
+        return file_url
+    bucket_name = os.getenv('FIREBASE_STORAGE_BUCKET')
+    if not bucket_name or f'/{bucket_name}/' not in file_url:
+        return None
+    path = file_url.split(f'/{bucket_name}/', 1)[1].split('?')[0]
+    if path.startswith('o/'):
+        path = path[2:]
+    return unquote(path) or None
+
+def _file_size(doc, blob):
+    """文件記錄的 file_size；缺少或格式錯誤時改讀 blob 的 metadata"""
+    try:
+        size = int(doc.get('file_size'))
+        if size >= 0:
+            return size
+    except (TypeError, ValueError):
+        pass
+    blob.reload()
+    return int(blob.size)
+
+def _stream_blob(doc, blob_name):
+    """經由後端分段串流 blob（記憶體用量固定為一個 chunk），支援 Range / If-Range 續傳"""
+    bucket = _get_gcs_client().bucket(os.getenv('FIREBASE_STORAGE_BUCKET'))
+    blob = bucket.blob(blob_name)
+    size = _file_size(doc, blob)
+    etag = f'"{doc.get("id")}-{doc.get("updated_at") or ""}-{size}"'
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Content-Disposition': _content_disposition(doc, blob_name),
+        'Cache-Control': 'private, no-cache'
+    }
+    start, stop, status = 0, size, 200
+
+    # If-Range 與目前版本不符時忽略 Range，回傳完整檔案
+    if_range = request.headers.get('If-Range')
+    if request.range is not None and (if_range is None or if_range == etag):
+        span = request.range.range_for_length(size)
+        if span is None:
+            if len(request.range.ranges) == 1:
+                return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+        else:
+            start, stop = span
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    headers['Content-Length'] = str(stop - start)
+
+    chunk_size = current_app.config.get('DOCUMENT_STREAM_CHUNK_SIZE', 1024 * 1024)
+
+    def _generate():
+        offset = start
+        try:
+            while offset < stop:
+                end = min(offset + chunk_size, stop)
+                yield blob.download_as_bytes(start=offset, end=end - 1)
+                offset = end
+        except Exception as e:
+            # 已送出 Content-Length，重新拋出讓伺服器中斷連線（用戶端可用 Range 從已收到的位置續傳）
+            print(f"Error streaming document {blob_name} at byte {offset}: {str(e)}")
+            raise
+
+    return Response(_generate(), status=status, headers=headers,
+                    mimetype=doc.get('file_type') or 'application/octet-stream',
+                    direct_passthrough=True)
+
+def _passthrough_enabled():
+    return current_app.config.get('DOCUMENT_DOWNLOAD_MODE', 'redirect') == 'passthrough'
+
 # Utility: load document record from Firestore
 def _get_document_by_id(doc_id):
-    db = firestore.client()
-    doc_ref = db.collection('documents').document(doc_id).get()
-    if not doc_ref.exists:
-        return None
-    data = doc_ref.to_dict()
-    data['id'] = doc_ref.id
-    return data
+    return Document.get_raw(doc_id)
+
+def _list_documents(requires_login):
+    """列出文件的原始欄位（含模型未定義的欄位）；created_at 轉為 isoformat"""
+    results = []
+    for item in Document.query().filter_by(requires_login=requires_login).raw():
+        if 'created_at' in item and hasattr(item['created_at'], 'isoformat'):
+            item['created_at'] = item['created_at'].isoformat()
+        results.append(item)
+    return results
 
 # 1) 列出公開文件
 @documents_bp.route('/public', methods=['GET'])
+@cached_response(tags=('documents',))
 def list_public_documents():
     try:
-        db = firestore.client()
-        docs_q = db.collection('documents').where('requires_login', '==', False).stream()
-        results = []
-        for d in docs_q:
-            item = d.to_dict()
-            item['id'] = d.id
-            # 若 created_at 是 firestore timestamp，轉為 isoformat
-            if 'created_at' in item and hasattr(item['created_at'], 'isoformat'):
-                item['created_at'] = item['created_at'].isoformat()
-            results.append(item)
-        return jsonify(results), 200
+        return jsonify(_list_documents(False)), 200
     except Exception as e:
         return jsonify({"error": f"獲取公開文件失敗: {str(e)}"}), 500
 
@@ -57,19 +154,31 @@ def list_public_documents():
 @jwt_required()
 def list_private_documents():
     try:
-        db = firestore.client()
-        docs_q = db.collection('documents').where('requires_login', '==', True).stream()
-        results = []
-        for d in docs_q:
-            item = d.to_dict()
-            item['id'] = d.id
-            if 'created_at' in item and hasattr(item['created_at'], 'isoformat'):
-                item['created_at'] = item['created_at'].isoformat()
-            results.append(item)
-        return jsonify(results), 200
+        return jsonify(_list_documents(True)), 200
     except Exception as e:
         return jsonify({"error": f"獲取私人文件失敗: {str(e)}"}), 500
 
+# 文件數量與檔案大小總和（分片計數器）；未登入只看得到公開文件的統計
+@documents_bp.route('/stats', methods=['GET'])
+@cached_response(tags=('documents',))
+def document_stats():
+    try:
+        ensure_counters_seeded(current_app.db)
+        stats = DOCUMENT_STATS.values(current_app.db)
+        authenticated = False
+        try:
+            verify_jwt_in_request(optional=True)
+            authenticated = bool(get_jwt_identity())
+        except Exception:
+            pass
+        prefix = '' if authenticated else 'public_'
+        return jsonify({
+            'count': max(0, int(stats.get(f'{prefix}count', 0))),
+            'file_size': max(0, int(stats.get(f'{prefix}file_size', 0)))
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"獲取文件統計失敗: {str(e)}"}), 500
+
 # 3) 下載文件：公開文件直接 redirect（若為 blob name 則嘗試 public_url 或簽名 URL）
 #    私有文件需驗證，並由後端產生 signed URL 並 redirect
 @documents_bp.route('/download/<doc_id>', methods=['GET'])
@@ -84,6 +193,13 @@ def download_document(doc_id):
         file_url = doc.get('file_url')
 
         if not requires_login:
+            blob_name = _blob_name(file_url)
+            # passthrough 模式下本專案 bucket 的檔案（含完整 URL）一律經由後端串流
+            if blob_name and _passthrough_enabled():
+                try:
+                    return _stream_blob(doc, blob_name)
+                except Exception as e:
+                    return jsonify({"error": f"讀取文件失敗: {str(e)}"}), 500
             if file_url and (file_url.startswith('http://') or file_url.startswith('https://')):
                 return redirect(file_url)
             # 若公開但存的是 blob name，嘗試用 GCS 取得 public URL 或簽名 URL
@@ -124,9 +240,17 @@ def download_document(doc_id):
             return jsonify({"error": "未授權，需登入以下載此文件"}), 401
 
         # 產生 signed URL 並 redirect（private file should have blob name stored in file_url）
-        blob_name = file_url
+        blob_name = _blob_name(file_url)
         if not blob_name:
+            if file_url:
+                # 外部網址：驗證後直接 redirect
+                return redirect(file_url)
             return jsonify({"error": "文件路徑不存在"}), 404
+        if _passthrough_enabled():
+            try:
+                return _stream_blob(doc, blob_name)
+            except Exception as e:
+                return jsonify({"error": f"讀取文件失敗: {str(e)}"}), 500
         try:
             signed_url = _generate_signed_url(blob_name, expiration_minutes=15)
             return redirect(signed_url)
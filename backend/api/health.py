@@ -0,0 +1,78 @@
+from flask import Blueprint, jsonify, current_app
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/live', methods=['GET'])
+def liveness():
+    """存活檢查：行程可回應即回傳 200"""
+    state = current_app.extensions['startup']
+    return jsonify({'status': 'ok', 'uptime': state.to_dict()['uptime']}), 200
+
+@health_bp.route('/ready', methods=['GET'])
+def readiness():
+    """就緒檢查：預熱完成前回傳 503，並附上各啟動階段耗時"""
+    state = current_app.extensions['startup']
+    data = state.to_dict()
+    return jsonify(data), 200 if data['ready'] else 503
+
+@health_bp.route('/replica', methods=['GET'])
+def replica_status():
+    """讀取副本同步狀態與延遲（秒）"""
+    replica = current_app.extensions.get('read_replica')
+    if replica is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(replica.stats(), enabled=True)), 200
+
+@health_bp.route('/limits', methods=['GET'])
+def limits_status():
+    """各端點目前的並行上限、執行中與排隊數量"""
+    shedder = current_app.extensions.get('load_shedder')
+    if shedder is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(shedder.stats(), enabled=True)), 200
+
+@health_bp.route('/circuit', methods=['GET'])
+def circuit_status():
+    """熔斷器狀態與最後可用快照的使用情形"""
+    breaker = current_app.extensions.get('circuit_breaker')
+    if breaker is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(breaker.stats(), enabled=True,
+                        last_known_good=current_app.extensions['last_known_good'].stats())), 200
+
+@health_bp.route('/firestore', methods=['GET'])
+def firestore_status():
+    """Firestore 呼叫逾時設定與各 collection 的對沖讀取統計"""
+    from models.deadline import hedge_stats
+    return jsonify({
+        'timeout': current_app.config.get('FIRESTORE_TIMEOUT'),
+        'request_deadline': current_app.config.get('REQUEST_DEADLINE'),
+        'hedged_reads': current_app.config.get('HEDGED_READS_ENABLED', False),
+        'collections': hedge_stats()
+    }), 200
+
+@health_bp.route('/cache', methods=['GET'])
+def cache_status():
+    """回應快取與圖片磁碟快取的命中、過期回傳與失效次數"""
+    from utils.response_cache import response_cache
+    from utils.image_cache import get_image_cache
+    data = dict(response_cache.to_dict(), enabled=current_app.config.get('RESPONSE_CACHE_ENABLED', True))
+    if current_app.config.get('IMAGE_PROXY_ENABLED'):
+        data['images'] = get_image_cache().stats()
+    return jsonify(data), 200
+
+@health_bp.route('/jobs', methods=['GET'])
+def jobs_status():
+    """背景工作佇列各狀態的工作數與最舊排隊時間"""
+    queue = current_app.extensions.get('job_queue')
+    if queue is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(queue.stats(), enabled=True)), 200
+
+@health_bp.route('/access', methods=['GET'])
+def access_status():
+    """存取頻率記錄：熱門 URL 與估計次數"""
+    tracker = current_app.extensions.get('access_tracker')
+    if tracker is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(tracker.stats(), enabled=True)), 200
@@ -0,0 +1,77 @@
+import hashlib
+import time
+from concurrent.futures import Future, wait
+from flask import Blueprint, current_app, jsonify, request
+from models.deadline import deadline_environ
+from utils.subrequest import SUBREQUEST_ENVIRON_KEY, get_subrequest_pool, run_subrequest
+
+home_bp = Blueprint('home', __name__)
+
+# 首頁區塊與對應的 API（各自的回應快取與 single-flight 仍然有效）
+HOME_SECTIONS = (
+    ('carousel', '/api/carousel/'),
+    ('featured', '/api/products/featured'),
+    ('categories', '/api/categories/'),
+)
+
+def _run_inline(app, path, environ):
+    """在目前執行緒執行子請求，結果包成已完成的 Future"""
+    future = Future()
+    try:
+        future.set_result(run_subrequest(app, path, None, environ))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+@home_bp.route('/', methods=['GET'])
+def get_home():
+    """首頁資料：輪播圖、特色產品與分類一次回傳，各區塊並行讀取"""
+    started = time.perf_counter()
+    app = current_app._get_current_object()
+    environ = deadline_environ()
+    if request.environ.get(SUBREQUEST_ENVIRON_KEY):
+        # 本身已是子請求（例如 /api/batch 的項目）：就地依序執行，不再占用同一個有界執行緒池
+        futures = {name: _run_inline(app, path, environ) for name, path in HOME_SECTIONS}
+    else:
+        pool = get_subrequest_pool(app)
+        futures = {name: pool.submit(run_subrequest, app, path, None, environ) for name, path in HOME_SECTIONS}
+        wait(futures.values(), timeout=app.config.get('HOME_TIMEOUT', 10))
+
+    result, errors, timings = {}, {}, []
+    digest = hashlib.sha1()
+    for name, _ in HOME_SECTIONS:
+        future = futures[name]
+        if not future.done():
+            future.cancel()
+            result[name] = None
+            errors[name] = "逾時"
+            continue
+        try:
+            response, elapsed = future.result()
+        except Exception as e:
+            result[name] = None
+            errors[name] = str(e)
+            continue
+        timings.append(f'{name};dur={elapsed * 1000:.1f}')
+        if response.status_code == 200:
+            body = response.get_data()
+            digest.update(name.encode('utf-8') + b':' + body)
+            result[name] = response.get_json()
+        else:
+            result[name] = None
+            errors[name] = (response.get_json(silent=True) or {}).get('error', response.status_code)
+
+    if len(errors) == len(HOME_SECTIONS):
+        return jsonify({"error": "獲取首頁資料失敗", "errors": errors}), 500
+    if errors:
+        result['errors'] = errors
+
+    response = jsonify(result)
+    timings.append(f'total;dur={(time.perf_counter() - started) * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    if not errors:
+        # 由各區塊內容組成的 ETag，內容不變時回傳 304
+        response.set_etag(digest.hexdigest()[:20])
+        response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        response.make_conditional(request)
+    return response
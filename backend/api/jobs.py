@@ -0,0 +1,71 @@
+import time
+import click
+from flask import Blueprint, current_app, jsonify, request
+from utils.auth import admin_required
+from utils.jobs import JOB_STATUSES
+
+jobs_bp = Blueprint('jobs', __name__)
+
+def _queue():
+    return current_app.extensions.get('job_queue')
+
+@jobs_bp.route('/', methods=['GET'])
+@admin_required()
+def list_jobs():
+    """最近的背景工作（?status=queued|running|succeeded|failed&kind=&limit=）"""
+    queue = _queue()
+    if queue is None:
+        return jsonify({'enabled': False, 'jobs': []}), 200
+    status = request.args.get('status')
+    if status and status not in JOB_STATUSES:
+        return jsonify({"error": f"status 必須是 {', '.join(JOB_STATUSES)} 之一"}), 400
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({
+        'enabled': True,
+        'stats': queue.stats(),
+        'jobs': queue.list(status=status, kind=request.args.get('kind'), limit=limit)
+    }), 200
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@admin_required()
+def get_job(job_id):
+    """背景工作的狀態、嘗試次數與結果"""
+    queue = _queue()
+    job = queue.get(job_id) if queue is not None else None
+    if job is None:
+        return jsonify({"error": "工作不存在"}), 404
+    return jsonify(job), 200
+
+@jobs_bp.route('/<job_id>/retry', methods=['POST'])
+@admin_required()
+def retry_job(job_id):
+    """重新排入已失敗的工作"""
+    queue = _queue()
+    if queue is None or not queue.retry(job_id):
+        return jsonify({"error": "只有失敗的工作可以重試"}), 409
+    return jsonify(queue.get(job_id)), 200
+
+@jobs_bp.cli.command('work')
+@click.option('--once', is_flag=True, help='執行完目前可執行的工作後結束')
+def work_command(once):
+    """在前景執行背景工作（JOB_WORKERS=0 時由獨立行程處理佇列）"""
+    queue = _queue()
+    if queue is None:
+        raise click.ClickException('JOBS_ENABLED 未啟用')
+    if once:
+        click.echo(f'已執行 {queue.run_pending()} 筆工作')
+        return
+    while True:
+        if not queue.run_pending():
+            time.sleep(queue.poll_interval)
+
+@jobs_bp.cli.command('purge')
+@click.option('--days', type=int, default=None, help='保留天數（預設 JOB_RETENTION_DAYS）')
+def purge_command(days):
+    """刪除超過保留期限的已結束工作"""
+    queue = _queue()
+    if queue is None:
+        raise click.ClickException('JOBS_ENABLED 未啟用')
+    days = days if days is not None else current_app.config.get('JOB_RETENTION_DAYS', 7)
+    count = queue.purge(time.time() - days * 86400)
+    click.echo(f'已刪除 {count} 筆工作')
@@ -1,16 +1,86 @@
-from flask import Blueprint, jsonify, request, redirect
+from flask import Blueprint, jsonify, request, redirect, current_app
 from models.product import Product, ProductImage
 from models.category import MainCategory, SubCategory
+from utils.catalog import get_catalog
+from utils.image_cache import proxy_enabled, serve_image
+from utils.response_cache import cached_response
+from utils.singleflight import coalesce_request
+from utils.suggest import get_suggest_index, record_product_view
 
 products_bp = Blueprint('products', __name__)
 
+# 產品列表回應依賴的集合，任一集合變更即讓快取失效
+PRODUCT_LISTING_TAGS = ('products', 'product_images', 'main_categories', 'sub_categories')
+
+def _split_ids(value):
+    """將逗號分隔的 ID 字串轉為列表"""
+    return [v.strip() for v in value.split(',') if v.strip()] if value else []
+
+def _parse_bool(value):
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+@products_bp.route('', methods=['GET'])
+@products_bp.route('/', methods=['GET'])
+def get_products_by_ids():
+    """依多個 ID 取得產品詳細信息（?ids=a,b,c），順序與輸入相同並列出不存在的 ID"""
+    try:
+        ids = list(dict.fromkeys(_split_ids(request.args.get('ids'))))
+        if not ids:
+            return jsonify({"error": "請提供 ids 參數"}), 400
+        max_ids = current_app.config.get('PRODUCT_IDS_MAX', 50)
+        if len(ids) > max_ids:
+            return jsonify({"error": f"單次最多查詢 {max_ids} 個產品"}), 400
+
+        # 產品一次 get_all、圖片拆批 in 查詢、分類去重後各一次 get_all
+        products = Product.get_many(ids)
+        images_by_product = {}
+        for img in ProductImage.query().all_in('product_id', list(products)):
+            images_by_product.setdefault(img.product_id, []).append(img)
+        sub_categories = SubCategory.get_many(p.sub_category_id for p in products.values())
+        main_categories = MainCategory.get_many(s.main_category_id for s in sub_categories.values())
+
+        result = []
+        for product_id in ids:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            sub_category = sub_categories.get(str(product.sub_category_id))
+            main_category = main_categories.get(str(sub_category.main_category_id)) if sub_category else None
+            result.append({
+                'id': product.id,
+                'name': product.name,
+                'model': product.model,
+                'price': float(product.price) if product.price else None,
+                'description': product.description,
+                'specifications': product.specifications,
+                'sub_category_id': product.sub_category_id,
+                'sub_category_name': sub_category.name if sub_category else None,
+                'main_category_id': main_category.id if main_category else None,
+                'main_category_name': main_category.name if main_category else None,
+                'images': [
+                    {
+                        'id': img.id,
+                        'url': img.image_url,
+                        'is_main': img.is_main
+                    } for img in images_by_product.get(product.id, [])
+                ]
+            })
+
+        missing = [product_id for product_id in ids if product_id not in products]
+        return jsonify({'products': result, 'missing': missing}), 200
+    except Exception as e:
+        return jsonify({"error": f"獲取產品失敗: {str(e)}"}), 500
+
 @products_bp.route('/featured', methods=['GET'])
+@cached_response(tags=PRODUCT_LISTING_TAGS)
+@coalesce_request
 def get_featured_products():
     """獲取特色產品（最多6個）"""
     try:
-        # Firebase 查詢
-        featured_products = Product.filter_by(is_featured=True)
-        featured_products = featured_products[:6]  # 限制6個
+        # Firebase 查詢（限制6個）
+        featured_products = Product.query().filter_by(is_featured=True).limit(6).all()
 
         result = []
 
@@ -52,6 +122,7 @@ def get_featured_products():
         return jsonify({"error": f"獲取特色產品失敗: {str(e)}"}), 500
 
 @products_bp.route('/category/main/<main_id>', methods=['GET'])
+@cached_response(tags=PRODUCT_LISTING_TAGS)
 def get_products_by_main_category(main_id):
     """獲取指定主分類下的所有產品"""
     try:
@@ -99,6 +170,7 @@ def get_products_by_main_category(main_id):
         return jsonify({"error": f"獲取產品失敗: {str(e)}"}), 500
 
 @products_bp.route('/category/sub/<sub_id>', methods=['GET'])
+@cached_response(tags=PRODUCT_LISTING_TAGS)
 def get_products_by_sub_category(sub_id):
     """獲取指定子分類下的所有產品"""
     try:
@@ -132,7 +204,66 @@ def get_products_by_sub_category(sub_id):
     except Exception as e:
         return jsonify({"error": f"獲取產品失敗: {str(e)}"}), 500
 
+@products_bp.route('/catalog', methods=['GET'])
+def get_catalog_products():
+    """產品目錄：價格區間、多分類篩選、排序、分頁與分面統計（記憶體欄式快照）"""
+    try:
+        sort = request.args.get('sort', '-created_at')
+        descending = sort.startswith('-')
+        page = max(1, request.args.get('page', 1, type=int))
+        page_size = min(max(1, request.args.get('page_size', 20, type=int)), 100)
+
+        try:
+            result = get_catalog(current_app).query(
+                sub_category_ids=_split_ids(request.args.get('sub_category_id')),
+                main_category_ids=_split_ids(request.args.get('main_category_id')),
+                min_price=request.args.get('min_price', type=float),
+                max_price=request.args.get('max_price', type=float),
+                featured=_parse_bool(request.args.get('featured')),
+                sort=sort.lstrip('-'),
+                descending=descending,
+                page=page,
+                page_size=page_size
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # 只為當頁產品補上主圖片：一次 in 查詢取得整頁的圖片（無主圖片時用第一張）
+        main_images = {}
+        for img in ProductImage.query().all_in('product_id', [item['id'] for item in result['items']]):
+            current = main_images.get(img.product_id)
+            if current is None or (img.is_main and not current.is_main):
+                main_images[img.product_id] = img
+        for item in result['items']:
+            main_image = main_images.get(item['id'])
+            item['has_image'] = main_image is not None
+            item['image_id'] = main_image.id if main_image else None
+            item['image_url'] = main_image.image_url if main_image else None
+
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": f"獲取產品目錄失敗: {str(e)}"}), 500
+
+@products_bp.route('/suggest', methods=['GET'])
+def suggest_products():
+    """搜尋框自動完成：名稱或型號前綴符合的產品（記憶體前綴索引，依熱門度排序）"""
+    try:
+        query = request.args.get('q', '')
+        limit = request.args.get('limit', current_app.config.get('SUGGEST_LIMIT', 8), type=int)
+        limit = min(max(1, limit), current_app.config.get('SUGGEST_MAX_LIMIT', 20))
+        return jsonify(get_suggest_index(current_app).suggest(query, limit)), 200
+    except Exception as e:
+        return jsonify({"error": f"獲取搜尋建議失敗: {str(e)}"}), 500
+
+@products_bp.after_request
+def _record_detail_view(response):
+    """在回應快取之外記錄產品瀏覽（快取命中、STALE 與 304 也計入）"""
+    if request.endpoint == 'products.get_product_detail' and response.status_code in (200, 304):
+        record_product_view((request.view_args or {}).get('product_id'))
+    return response
+
 @products_bp.route('/<product_id>', methods=['GET'])
+@cached_response(tags=PRODUCT_LISTING_TAGS)
 def get_product_detail(product_id):
     """獲取產品詳細信息"""
     try:
@@ -179,6 +310,13 @@ def get_product_detail(product_id):
 def get_product_image(image_id):
     """獲取產品圖片 - 重定向到 Storage URL"""
     try:
+        if proxy_enabled():
+            response = serve_image(ProductImage.COLLECTION, image_id,
+                                   lambda: ProductImage.get(image_id))
+            if response is None:
+                return jsonify({"error": "找不到圖片"}), 404
+            return response
+
         image = ProductImage.get(image_id)
         if not image:
             return jsonify({"error": "找不到圖片"}), 404
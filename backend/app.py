@@ -1,3 +1,6 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -10,17 +13,29 @@ load_dotenv()
 # 初始化 JWT
 jwt = JWTManager()
 
+_IMPORT_FINISHED = time.perf_counter()
+
 def create_app():
+    from utils.startup import StartupState, LazyFirestoreClient, start_warmup
+
+    started = time.perf_counter()
+    state = StartupState()
+    state.add_phase('imports', _IMPORT_FINISHED - _IMPORT_STARTED)
+
     app = Flask(__name__)
+    app.extensions['startup'] = state
 
     # 環境設定
     config_name = os.getenv("FLASK_CONFIG", "development")
     from config import config as app_config
     app.config.from_object(app_config[config_name])
 
-    # 初始化 Firebase
+    # 初始化 Firebase（延遲到第一次使用或預熱時才建立 client）
     from config import Config
-    app.db = Config.init_firebase()
+    app.db = LazyFirestoreClient(Config.init_firebase)
+    # app context 以外（背景工作、腳本）也使用同一個 client
+    from models.database import set_default_db
+    set_default_db(app.db)
 
     # 初始化 JWT
     jwt.init_app(app)
@@ -28,10 +43,39 @@ def create_app():
 
     app.config['JWT_IDENTITY_CLAIM'] = 'sub'
 
+    # 負載卸除
+    from utils.load_shedding import init_load_shedding
+    init_load_shedding(app)
+
+    # 請求期限：傳入每次 Firestore 呼叫的逾時
+    from models.deadline import init_deadlines
+    init_deadlines(app)
+
+    # 熔斷器：資料層持續失敗時快速失敗，公開目錄端點改回傳最後可用快照
+    from utils.degraded import init_degraded_mode
+    init_degraded_mode(app)
+
+    # 背景工作佇列
+    from utils.jobs import init_job_queue
+    init_job_queue(app)
+
     # 註冊藍圖
     from api import register_blueprints
     register_blueprints(app)
 
+    # 熱門 URL 記錄：定期保存，預熱時重新播放以填入快取
+    from utils.access import init_access_tracking
+    init_access_tracking(app)
+
+    # 前端靜態檔（SERVE_FRONTEND）與 flask frontend 指令，需在 API 藍圖之後註冊
+    from utils.frontend import init_frontend
+    init_frontend(app)
+
+    state.add_phase('create_app', time.perf_counter() - started)
+
+    # 預熱：建立 gRPC channel、初始化 Storage 與各項快取
+    start_warmup(app)
+
     return app
 
 if __name__ == '__main__':
@@ -40,5 +84,5 @@ if __name__ == '__main__':
     port = app.config.get("PORT", 5000)
     debug = app.config["DEBUG"]
 
-    print("Firebase initialized successfully!")
+    print(f"App created, startup phases (ms): {app.extensions['startup'].phases}")
     app.run(host=host, port=port, debug=debug)
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""/api/batch 的冒煙測試：非 JSON 子請求與端點並行上限
+
+以本機替身（benchmarks/loadtest.py 的 create_standin_app）建立應用程式並檢查：
+- 圖片代理與文件下載（串流）作為子請求時，該項目回傳 400 / 415，整批仍為 200
+- 批次中的 /api/products/search 受端點並行上限限制，超過時該項目回傳 503
+
+執行：python benchmarks/batch_smoke.py（於 backend 目錄）；任何檢查失敗時以非 0 結束。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _statuses(client, paths):
+    response = client.post('/api/batch/', json={'requests': paths})
+    assert response.status_code == 200, (response.status_code, response.get_data(as_text=True))
+    return [item['status'] for item in response.get_json()['responses']]
+
+
+def main():
+    os.environ.setdefault('LOADTEST_DB_LATENCY_MS', '20')
+    os.environ.setdefault('LOADTEST_STORAGE_LATENCY_MS', '0')
+    os.environ.setdefault('LOADTEST_PRODUCTS', '50')
+    os.environ['DOCUMENT_DOWNLOAD_MODE'] = 'passthrough'
+    os.environ['IMAGE_PROXY_ENABLED'] = 'true'
+    from benchmarks.loadtest import create_standin_app
+    import api.batch
+
+    app = create_standin_app()
+    client = app.test_client()
+    checks = []
+
+    paths = ['/api/categories/', '/api/products/image/i0', '/api/documents/download/d0']
+    statuses = _statuses(client, paths)
+    checks.append(('non-JSON endpoints rejected per item', statuses == [200, 400, 400], statuses))
+
+    # 不預先排除時，由回應檢查擋下串流與二進位內容
+    excluded, api.batch.NON_JSON_ENDPOINTS = api.batch.NON_JSON_ENDPOINTS, ()
+    try:
+        statuses = _statuses(client, paths)
+    finally:
+        api.batch.NON_JSON_ENDPOINTS = excluded
+    checks.append(('streaming responses become 415', statuses == [200, 415, 415], statuses))
+
+    shedder = app.extensions.get('load_shedder')
+    if shedder is not None:
+        shedder.overrides['products.search_products'] = {
+            'initial_limit': 1, 'min_limit': 1, 'max_limit': 1, 'max_queue': 0}
+        statuses = _statuses(client, [f'/api/products/search?q=p{i}' for i in range(10)])
+        checks.append(('search limiter applies to batch items',
+                       503 in statuses and set(statuses) <= {200, 503}, statuses))
+
+    failures = 0
+    for name, ok, detail in checks:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {detail}")
+        failures += not ok
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""背景工作的冒煙測試：在沒有 Flask app context 的情況下匯入模型並執行內建工作
+
+先匯入 models（確認沒有循環匯入），再以本機替身（benchmarks/standin.py）與 set_default_db
+執行 blob 上傳 / 釋放與串聯刪除，模擬 flask jobs work 以外的獨立 worker 行程。
+
+執行：python benchmarks/jobs_smoke.py（於 backend 目錄）；任何工作失敗時以非 0 結束。
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 必須最先匯入：models 不能依賴 app 或 utils 的匯入順序
+import models  # noqa: E402,F401
+from models.blobs import blob_url  # noqa: E402
+from models.database import set_default_db  # noqa: E402
+from utils.jobs import JobQueue, _load_tasks  # noqa: E402
+
+
+def main():
+    from benchmarks import standin
+
+    db = standin.FakeFirestore(standin.LatencyModel())
+    bucket = standin.FakeBucket('smoke-bucket', standin.LatencyModel())
+    standin.install(db, bucket)
+    ids = standin.seed(db, bucket, main_categories=1, sub_categories=2, products=6, documents=0)
+    set_default_db(db)
+    _load_tasks()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(os.path.join(tmp, 'jobs.db'), max_attempts=1)
+        data = b'jobs smoke test'
+        url = blob_url(data, 'image/png')
+        queue.enqueue('blobs.store', {'content_type': 'image/png', 'op_key': 'smoke-store'}, data)
+        queue.enqueue('blobs.release', {'url': url, 'op_key': 'smoke-release'})
+        queue.enqueue('cascade.product_images', {'product_id': ids['products'][0]})
+        queue.enqueue('cascade.subcategory_products',
+                      {'sub_category_id': ids['sub'][0], 'main_category_id': ids['main'][0]})
+        queue.run_pending()
+
+        for job in reversed(queue.list()):
+            print(f"{job['kind']:<32} {job['status']:<10} {job['result'] or job['error']}")
+            failures += job['status'] != 'succeeded'
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
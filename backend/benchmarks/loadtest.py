@@ -0,0 +1,419 @@
+"""端到端壓力測試：以接近真實的流量組合對整個應用程式施壓，依路由回報吞吐量、延遲百分位與錯誤率
+
+預設在同一個行程內以本機 Firestore / Storage 替身（benchmarks/standin.py，可注入延遲與錯誤）
+建立應用程式；指定 --url 時改以 HTTP 對實際執行中的伺服器施壓，可用來比較不同的伺服器模式：
+
+    gunicorn -w 4 -k gthread --threads 8 'benchmarks.loadtest:create_standin_app()'
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --rate 200 --duration 60
+
+快取等設定可用 --env KEY=VALUE 切換（在建立應用程式前寫入環境變數），例如
+--env RESPONSE_CACHE_ENABLED=false；--json 將結果寫入檔案供不同設定之間比較。
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 流量組合：情境 -> 權重
+DEFAULT_MIX = {
+    'home': 20,
+    'categories': 8,
+    'browse_main': 10,
+    'browse_sub': 14,
+    'search': 10,
+    'product': 25,
+    'product_image': 5,
+    'login': 3,
+    'document': 5,
+}
+
+# 搜尋詞（含部分字詞與型號前綴）
+SEARCH_TERMS = ('交換器', '電源', '光纖', '路由', 'Switch', 'router', 'AX-', 'BY-10', 'poe', '不存在的詞')
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def create_standin_app(seed_data=True):
+    """以本機替身建立應用程式（gunicorn 等伺服器也可直接載入此工廠）
+
+    替身的延遲與資料規模由環境變數 LOADTEST_DB_LATENCY_MS、LOADTEST_DB_SIGMA、
+    LOADTEST_DB_ERROR_RATE、LOADTEST_STORAGE_LATENCY_MS、LOADTEST_PRODUCTS 設定。
+    """
+    from benchmarks import standin
+
+    os.environ.setdefault('JWT_SECRET_KEY', 'loadtest-secret-key-loadtest-secret-key')
+    os.environ.setdefault('FIREBASE_STORAGE_BUCKET', 'loadtest-bucket')
+    # 同步預熱，避免把冷啟動算進測量結果
+    os.environ.setdefault('WARMUP_MODE', 'sync')
+
+    db = standin.FakeFirestore(standin.LatencyModel(
+        _env_float('LOADTEST_DB_LATENCY_MS', 8), _env_float('LOADTEST_DB_SIGMA', 0.6),
+        _env_float('LOADTEST_DB_ERROR_RATE', 0)))
+    bucket = standin.FakeBucket(os.environ['FIREBASE_STORAGE_BUCKET'], standin.LatencyModel(
+        _env_float('LOADTEST_STORAGE_LATENCY_MS', 25), _env_float('LOADTEST_DB_SIGMA', 0.6)))
+    standin.install(db, bucket)
+    if seed_data:
+        # 建立資料時不注入延遲
+        latency, db.latency = db.latency, standin.LatencyModel()
+        storage_latency, bucket.latency = bucket.latency, standin.LatencyModel()
+        standin.seed(db, bucket, products=int(os.getenv('LOADTEST_PRODUCTS', 500)))
+        db.latency, bucket.latency = latency, storage_latency
+
+    from app import create_app
+    return create_app()
+
+
+class InProcessTransport:
+    """直接呼叫 WSGI 應用程式（每個執行緒一個 test client）"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers or {})
+        data = response.get_data()
+        response.close()
+        return response.status_code, data
+
+
+class HTTPTransport:
+    """對執行中的伺服器送出 HTTP 請求（每個執行緒一條 keep-alive 連線，不跟隨轉址）"""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                 else http.client.HTTPConnection)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = self.connection_class(
+                    self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, self.prefix + path, body=payload, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # 伺服器關閉了閒置連線時重連一次
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+class Workload:
+    """依權重產生請求；資料 id 透過 API 探索，因此替身與實際部署都適用"""
+
+    def __init__(self, transport, mix, username, password, rng):
+        self.transport = transport
+        self.mix = {name: weight for name, weight in mix.items() if weight > 0}
+        self.username = username
+        self.password = password
+        self.rng = rng
+        self.main_ids, self.sub_ids, self.product_ids, self.image_ids = [], [], [], []
+        self.document_ids, self.token = [], None
+
+    def _get_json(self, path, headers=None):
+        status, data = self.transport.request('GET', path, headers=headers)
+        if status != 200:
+            raise RuntimeError(f'{path} 回傳 {status}')
+        return json.loads(data)
+
+    def discover(self):
+        for main in self._get_json('/api/categories/'):
+            self.main_ids.append(main['id'])
+            self.sub_ids.extend(sub['id'] for sub in main.get('subcategories', []))
+        for main_id in self.main_ids:
+            for product in self._get_json(f'/api/products/category/main/{quote(str(main_id))}'):
+                self.product_ids.append(product['id'])
+                if product.get('image_id'):
+                    self.image_ids.append(product['image_id'])
+        self.document_ids = [doc['id'] for doc in self._get_json('/api/documents/public')]
+
+        status, data = self.transport.request('POST', '/api/auth/login', body={
+            'username': self.username, 'password': self.password})
+        if status == 200:
+            self.token = json.loads(data)['access_token']
+            private = self._get_json('/api/documents/private', headers=self._auth())
+            self.document_ids.extend(doc['id'] for doc in private)
+        else:
+            print(f'登入失敗（{status}），略過 login 情境與私人文件', file=sys.stderr)
+            self.mix.pop('login', None)
+
+        for name, ids in (('browse_main', self.main_ids), ('browse_sub', self.sub_ids),
+                          ('product', self.product_ids), ('product_image', self.image_ids),
+                          ('document', self.document_ids)):
+            if not ids:
+                self.mix.pop(name, None)
+        self._names = list(self.mix)
+        self._weights = [self.mix[name] for name in self._names]
+
+    def _auth(self):
+        return {'Authorization': f'Bearer {self.token}'} if self.token else {}
+
+    def _popular(self, ids):
+        """熱門度近似 Zipf：少數項目占多數流量"""
+        index = min(int(self.rng.paretovariate(1.2)) - 1, len(ids) - 1)
+        return ids[index]
+
+    def next_request(self):
+        """回傳 (情境, 路由, method, path, body, headers)"""
+        name = self.rng.choices(self._names, self._weights)[0]
+        rng = self.rng
+        if name == 'home':
+            return name, '/api/home/', 'GET', '/api/home/', None, None
+        if name == 'categories':
+            return name, '/api/categories/', 'GET', '/api/categories/', None, None
+        if name == 'browse_main':
+            main_id = rng.choice(self.main_ids)
+            return (name, '/api/products/category/main/<main_id>', 'GET',
+                    f'/api/products/category/main/{quote(str(main_id))}', None, None)
+        if name == 'browse_sub':
+            sub_id = rng.choice(self.sub_ids)
+            return (name, '/api/products/category/sub/<sub_id>', 'GET',
+                    f'/api/products/category/sub/{quote(str(sub_id))}', None, None)
+        if name == 'search':
+            term = rng.choice(SEARCH_TERMS)
+            return (name, '/api/products/search', 'GET',
+                    f'/api/products/search?q={quote(term)}', None, None)
+        if name == 'product':
+            product_id = self._popular(self.product_ids)
+            return (name, '/api/products/<product_id>', 'GET',
+                    f'/api/products/{quote(str(product_id))}', None, None)
+        if name == 'product_image':
+            image_id = self._popular(self.image_ids)
+            return (name, '/api/products/image/<image_id>', 'GET',
+                    f'/api/products/image/{quote(str(image_id))}', None, None)
+        if name == 'login':
+            return (name, '/api/auth/login', 'POST', '/api/auth/login',
+                    {'username': self.username, 'password': self.password}, None)
+        doc_id = rng.choice(self.document_ids)
+        return (name, '/api/documents/download/<doc_id>', 'GET',
+                f'/api/documents/download/{quote(str(doc_id))}', None, self._auth())
+
+
+class Recorder:
+    """依路由累計延遲、狀態碼與錯誤"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.active = False
+        self.started = self.finished = None
+
+    def record(self, route, latency, status):
+        if not self.active:
+            return
+        with self._lock:
+            self.latencies[route].append(latency)
+            self.statuses[route][status] += 1
+            # 5xx 與例外視為錯誤；轉址與 304 為正常回應
+            if status == 'error' or status >= 500:
+                self.errors[route] += 1
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.active = True
+
+    def stop(self):
+        self.active = False
+        self.finished = time.perf_counter()
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(recorder):
+    elapsed = max(recorder.finished - recorder.started, 1e-9)
+    rows = {}
+    everything = []
+    for route, latencies in recorder.latencies.items():
+        values = sorted(latencies)
+        everything.extend(values)
+        rows[route] = _row(values, recorder.errors[route], elapsed)
+        rows[route]['statuses'] = {str(k): v for k, v in sorted(recorder.statuses[route].items(),
+                                                                 key=lambda item: str(item[0]))}
+    total = _row(sorted(everything), sum(recorder.errors.values()), elapsed)
+    return {'duration_s': round(elapsed, 3), 'routes': rows, 'total': total}
+
+
+def _row(values, errors, elapsed):
+    count = len(values)
+    return {
+        'requests': count,
+        'throughput_rps': round(count / elapsed, 2),
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'p50_ms': round(_percentile(values, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(values, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(values, 0.99) * 1000, 2),
+        'max_ms': round((values[-1] if values else 0) * 1000, 2),
+    }
+
+
+def print_report(summary):
+    header = f'{"route":<40} {"req":>7} {"rps":>8} {"err%":>6} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}'
+    print(header)
+    print('-' * len(header))
+    rows = sorted(summary['routes'].items(), key=lambda item: -item[1]['requests'])
+    for route, row in rows + [('TOTAL', summary['total'])]:
+        print(f'{route:<40} {row["requests"]:>7} {row["throughput_rps"]:>8.1f} '
+              f'{row["error_rate"] * 100:>6.2f} {row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f} '
+              f'{row["p99_ms"]:>8.1f} {row["max_ms"]:>8.1f}')
+    print(f'（延遲單位 ms，測量 {summary["duration_s"]} 秒）')
+
+
+def _send(transport, workload_request, recorder, scheduled):
+    _, route, method, path, body, headers = workload_request
+    try:
+        status, _ = transport.request(method, path, body=body, headers=headers)
+    except Exception:
+        status = 'error'
+    # 開放模式從預定送出時間起算，避免伺服器變慢時少算排隊時間（coordinated omission）
+    recorder.record(route, time.perf_counter() - scheduled, status)
+
+
+def run_closed(transport, workload, recorder, concurrency, warmup, duration):
+    """封閉模式：固定 concurrency 個使用者，每個收到回應後立即送出下一個請求"""
+    lock = threading.Lock()
+    deadline = time.perf_counter() + warmup + duration
+
+    def user():
+        while time.perf_counter() < deadline:
+            with lock:
+                item = workload.next_request()
+            _send(transport, item, recorder, time.perf_counter())
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    recorder.start()
+    time.sleep(duration)
+    recorder.stop()
+    for thread in threads:
+        thread.join()
+
+
+def run_open(transport, workload, recorder, rate, concurrency, warmup, duration):
+    """開放模式：請求依 Poisson 過程以固定平均速率抵達，與伺服器回應速度無關"""
+    started = time.perf_counter()
+    measure_at, deadline = started + warmup, started + warmup + duration
+    scheduled = started
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadtest') as pool:
+        while scheduled < deadline:
+            scheduled += workload.rng.expovariate(rate)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if not recorder.active and scheduled >= measure_at:
+                recorder.start()
+            pool.submit(_send, transport, workload.next_request(), recorder, scheduled)
+        recorder.stop()
+
+
+def _parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (text or '').split(',')):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f'未知的情境: {name}（可用: {", ".join(DEFAULT_MIX)}）')
+        mix[name] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='對執行中的伺服器施壓（預設在行程內使用本機替身）')
+    parser.add_argument('--duration', type=float, default=30, help='測量秒數')
+    parser.add_argument('--warmup', type=float, default=5, help='開始測量前的暖機秒數')
+    parser.add_argument('--concurrency', type=int, default=16, help='封閉模式的使用者數 / 開放模式的最大並行數')
+    parser.add_argument('--rate', type=float, help='開放模式的平均抵達速率（req/s）；未指定則為封閉模式')
+    parser.add_argument('--mix', help='覆寫情境權重，例如 home=40,search=0')
+    parser.add_argument('--username', default='loadtest0')
+    parser.add_argument('--password', default='loadtest')
+    parser.add_argument('--seed', type=int, default=1, help='亂數種子（相同種子產生相同請求序列）')
+    parser.add_argument('--db-latency-ms', type=float, help='替身 Firestore 延遲中位數')
+    parser.add_argument('--db-error-rate', type=float, help='替身 Firestore 錯誤率')
+    parser.add_argument('--storage-latency-ms', type=float, help='替身 Storage 延遲中位數')
+    parser.add_argument('--products', type=int, help='替身產品筆數')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='建立應用程式前設定的環境變數（可重複）')
+    parser.add_argument('--json', help='將結果寫入 JSON 檔')
+    args = parser.parse_args(argv)
+
+    overrides = {
+        'LOADTEST_DB_LATENCY_MS': args.db_latency_ms,
+        'LOADTEST_DB_ERROR_RATE': args.db_error_rate,
+        'LOADTEST_STORAGE_LATENCY_MS': args.storage_latency_ms,
+        'LOADTEST_PRODUCTS': args.products,
+    }
+    for item in args.env:
+        key, _, value = item.partition('=')
+        overrides[key] = value
+    for key, value in overrides.items():
+        if value is not None:
+            os.environ[key] = str(value)
+
+    if args.url:
+        transport = HTTPTransport(args.url)
+    else:
+        transport = InProcessTransport(create_standin_app())
+
+    workload = Workload(transport, _parse_mix(args.mix), args.username, args.password,
+                        random.Random(args.seed))
+    workload.discover()
+    print(f'{len(workload.product_ids)} products, {len(workload.sub_ids)} subcategories, '
+          f'{len(workload.document_ids)} documents; mix {workload.mix}')
+
+    recorder = Recorder()
+    if args.rate:
+        run_open(transport, workload, recorder, args.rate, args.concurrency, args.warmup, args.duration)
+    else:
+        run_closed(transport, workload, recorder, args.concurrency, args.warmup, args.duration)
+
+    summary = summarize(recorder)
+    print_report(summary)
+    if args.json:
+        summary['config'] = {
+            'url': args.url, 'mode': 'open' if args.rate else 'closed', 'rate': args.rate,
+            'concurrency': args.concurrency, 'mix': workload.mix,
+            'env': {key: str(value) for key, value in overrides.items() if value is not None},
+        }
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(summary, fh, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
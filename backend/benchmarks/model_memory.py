@@ -0,0 +1,112 @@
+"""比較載入 10k 筆產品時，舊版（__dict__ + 逐欄複製）與 __slots__ 模型的記憶體與耗時
+
+執行：python benchmarks/model_memory.py [筆數]（於 backend 目錄）
+
+記憶體為 snapshot 與模型一起計算後、只保留模型時的用量；耗時只計算 _from_doc（取 3 次中最快的一次）。
+"""
+import copy
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.product import Product  # noqa: E402
+
+
+class _Snapshot:
+    """模擬 DocumentSnapshot：to_dict() / get() 每次回傳深拷貝（與 Firestore client 相同）"""
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = True
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return copy.deepcopy(self._data[field])
+
+
+class LegacyProduct:
+    """改版前的產品模型（每個物件一個 __dict__，_from_doc 逐欄複製）"""
+
+    def __init__(self):
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+
+    @classmethod
+    def _from_doc(cls, doc):
+        data = doc.to_dict()
+        obj = cls.__new__(cls)
+        obj.id = doc.id
+        obj.sub_category_id = data.get('sub_category_id')
+        obj.name = data.get('name')
+        obj.model = data.get('model')
+        obj.price = float(data.get('price', 0)) if data.get('price') else None
+        obj.description = data.get('description')
+        obj.specifications = data.get('specifications')
+        obj.is_featured = data.get('is_featured', False)
+        obj.created_at = data.get('created_at')
+        obj.updated_at = data.get('updated_at')
+        return obj
+
+
+def _snapshots(count):
+    base = datetime(2024, 1, 1)
+    return [_Snapshot(f'p{i}', {
+        'sub_category_id': f's{i % 40}',
+        'name': f'工業交換器 {i}',
+        'model': f'SW-{i:05d}',
+        'price': 1000 + i,
+        'description': '高可靠度工業級乙太網路交換器，支援寬溫與冗餘電源。' * 4,
+        'specifications': {'ports': 8 + i % 16, 'poe': i % 2 == 0, 'temperature': '-40~75°C'},
+        'is_featured': i % 50 == 0,
+        'created_at': base + timedelta(minutes=i),
+        'updated_at': base + timedelta(minutes=i),
+    }) for i in range(count)]
+
+
+def _measure(label, load, count, repeat=3):
+    gc.collect()
+    tracemalloc.start()
+    objects = [load(doc) for doc in _snapshots(count)]
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+
+    snapshots = _snapshots(count)
+    elapsed = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        objects = [load(doc) for doc in snapshots]
+        elapsed = min(elapsed, time.perf_counter() - started)
+        del objects
+    print(f'{label:<32} retained {current / 1024 / 1024:7.2f} MiB  '
+          f'peak {peak / 1024 / 1024:7.2f} MiB  {elapsed * 1000:8.1f} ms')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(f'{count} products')
+    _measure('legacy (__dict__)', LegacyProduct._from_doc, count)
+    _measure('slotted (__slots__)', Product._from_doc, count)
+
+    started = time.perf_counter()
+    for _ in range(count):
+        LegacyProduct()
+    legacy_init = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(count):
+        Product()
+    print(f'__init__ x{count}: legacy {legacy_init * 1000:.1f} ms, '
+          f'slotted {(time.perf_counter() - started) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
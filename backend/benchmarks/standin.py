@@ -0,0 +1,628 @@
+"""壓力測試用的 Firestore / Storage 本機替身（含延遲與錯誤注入）
+
+只實作本專案用到的介面子集；install() 讓 firebase_admin / google.cloud.storage 的呼叫改用替身，
+seed() 建立指定規模的測試資料。
+"""
+import copy
+import sys
+import types
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+
+class LatencyModel:
+    """以對數常態分佈模擬 RPC 延遲（秒）"""
+
+    def __init__(self, median_ms=0.0, sigma=0.5, error_rate=0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+
+    def sleep(self):
+        if self.median_ms > 0:
+            time.sleep(random.lognormvariate(0, self.sigma) * self.median_ms / 1000.0)
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError('injected backend error')
+
+
+class Increment:
+    """firestore.Increment 的替身"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _apply_updates(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, Increment):
+            target[key] = (target.get(key) or 0) + value.value
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, read_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.read_time = read_time
+        self.update_time = read_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = self._data
+        for part in field.split('.'):
+            value = value[part]
+        return copy.deepcopy(value)
+
+
+class FakeDocumentRef:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+        self.path = f'{collection}/{doc_id}'
+
+    def collection(self, name):
+        return FakeCollection(self._client, f'{self.path}/{name}')
+
+    def get(self, timeout=None, retry=None, transaction=None, **kwargs):
+        self._client.latency.sleep()
+        with self._client._lock:
+            data = self._client._store.get(self._collection, {}).get(self.id)
+            return FakeSnapshot(self, copy.deepcopy(data), self._client._now())
+
+    def set(self, data, merge=False, timeout=None, retry=None):
+        self._client.latency.sleep()
+        self._client._write(self._collection, self.id, data, merge=merge)
+
+    def update(self, data, timeout=None, retry=None):
+        self._client.latency.sleep()
+        with self._client._lock:
+            if self.id not in self._client._store.get(self._collection, {}):
+                raise KeyError(f'No document to update: {self.path}')
+        self._client._write(self._collection, self.id, data, merge=True)
+
+    def delete(self, timeout=None, retry=None):
+        self._client.latency.sleep()
+        self._client._delete(self._collection, self.id)
+
+
+class _Aggregation:
+    def __init__(self, query, kind='count', field=None, alias=None):
+        self._query = query
+        self._kind = kind
+        self._field = field
+        self.alias = alias or 'field_1'
+
+    def get(self, timeout=None, retry=None, **kwargs):
+        docs = list(self._query.stream())
+        if self._kind == 'count':
+            value = len(docs)
+        else:
+            value = sum((d.to_dict() or {}).get(self._field) or 0 for d in docs)
+        return [[type('AggregationResult', (), {'alias': self.alias, 'value': value})()]]
+
+
+class FakeQuery:
+    def __init__(self, client, collection, filters=(), orders=(), limit=None,
+                 cursor=None, fields=None):
+        self._client = client
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **kwargs):
+        params = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                      cursor=self._cursor, fields=self._fields)
+        params.update(kwargs)
+        return FakeQuery(self._client, self._collection, **params)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((str(field_path), direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def count(self, alias=None):
+        return _Aggregation(self, 'count', alias=alias)
+
+    def sum(self, field_ref, alias=None):
+        return _Aggregation(self, 'sum', field=field_ref, alias=alias)
+
+    @staticmethod
+    def _field(data, doc_id, field):
+        if field == '__name__':
+            return doc_id
+        return data.get(field)
+
+    def _match(self, data, doc_id):
+        for field, op, value in self._filters:
+            current = self._field(data, doc_id, field)
+            if op == '==' and current != value:
+                return False
+            if op == '!=' and (current == value or current is None):
+                return False
+            if op == 'in' and current not in value:
+                return False
+            if op == 'not-in' and (current in value or current is None):
+                return False
+            if op == 'array-contains' and value not in (current or []):
+                return False
+            if op in ('<', '<=', '>', '>='):
+                if current is None:
+                    return False
+                try:
+                    ok = {'<': current < value, '<=': current <= value,
+                          '>': current > value, '>=': current >= value}[op]
+                except TypeError:
+                    return False
+                if not ok:
+                    return False
+        return True
+
+    def _sort_key(self, item):
+        doc_id, data = item
+        key = []
+        for field, _ in self._orders:
+            value = self._field(data, doc_id, field)
+            key.append((value is None, value))
+        return key
+
+    def stream(self, timeout=None, retry=None, transaction=None, **kwargs):
+        self._client.latency.sleep()
+        with self._client._lock:
+            items = [(doc_id, copy.deepcopy(data)) for doc_id, data in
+                     self._client._store.get(self._collection, {}).items()]
+        items = [(i, d) for i, d in items if self._match(d, i)]
+        for field, _ in self._orders:
+            if field != '__name__':
+                items = [(i, d) for i, d in items if field in d]
+        orders = list(self._orders)
+        for field, direction in reversed(orders):
+            items.sort(key=lambda it, f=field: (self._field(it[1], it[0], f) is None,
+                                                self._field(it[1], it[0], f)),
+                       reverse=(str(direction).upper().endswith('DESCENDING')))
+        if self._cursor is not None:
+            cursor = self._cursor
+            if isinstance(cursor, FakeSnapshot):
+                cursor_values = [self._field(cursor._data, cursor.id, f) for f, _ in orders]
+            else:
+                cursor_values = [cursor.get(f) for f, _ in orders]
+            start = 0
+            for index, (doc_id, data) in enumerate(items):
+                values = [self._field(data, doc_id, f) for f, _ in orders]
+                if self._after(values, cursor_values, orders):
+                    start = index
+                    break
+            else:
+                start = len(items)
+            items = items[start:]
+        if self._limit is not None:
+            items = items[:self._limit]
+        read_time = self._client._now()
+        for doc_id, data in items:
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            yield FakeSnapshot(FakeDocumentRef(self._client, self._collection, doc_id),
+                               data, read_time)
+
+    @staticmethod
+    def _after(values, cursor_values, orders):
+        for value, cursor_value, (_, direction) in zip(values, cursor_values, orders):
+            if value == cursor_value:
+                continue
+            descending = str(direction).upper().endswith('DESCENDING')
+            return (value < cursor_value) if descending else (value > cursor_value)
+        return False
+
+    def get(self, timeout=None, retry=None, **kwargs):
+        return list(self.stream(timeout=timeout))
+
+    def on_snapshot(self, callback):
+        return self._client._watch(self._collection, callback)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        return FakeDocumentRef(self._client, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data, document_id=None, timeout=None, retry=None):
+        ref = self.document(document_id)
+        ref.set(data)
+        return self._client._now(), ref
+
+    def list_documents(self):
+        with self._client._lock:
+            ids = list(self._client._store.get(self._collection, {}))
+        return [FakeDocumentRef(self._client, self._collection, i) for i in ids]
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(('set', ref, data, merge))
+
+    def update(self, ref, data):
+        self._ops.append(('update', ref, data, True))
+
+    def delete(self, ref):
+        self._ops.append(('delete', ref, None, False))
+
+    def commit(self, timeout=None, retry=None):
+        self._client.latency.sleep()
+        for op, ref, data, merge in self._ops:
+            if op == 'delete':
+                self._client._delete(ref._collection, ref.id)
+            else:
+                self._client._write(ref._collection, ref.id, data, merge=merge)
+        self._ops = []
+
+
+class FakeTransaction(FakeBatch):
+    def __init__(self, client):
+        super().__init__(client)
+        self._id = None
+        self._max_attempts = 5
+        self.in_progress = False
+
+    def _begin(self, retry_id=None):
+        self.in_progress = True
+
+    def _rollback(self):
+        self._ops = []
+        self.in_progress = False
+
+    def _commit(self):
+        self.commit()
+        self.in_progress = False
+        return []
+
+    def get(self, ref_or_query):
+        return ref_or_query.get()
+
+
+class _Watch:
+    def __init__(self, client, collection, callback):
+        self._client = client
+        self._collection = collection
+        self._callback = callback
+
+    def unsubscribe(self):
+        with self._client._lock:
+            if self in self._client._watches:
+                self._client._watches.remove(self)
+
+
+class FakeFirestore:
+    """支援本專案用到的 Firestore 介面子集"""
+
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyModel()
+        self._store = {}
+        self._lock = threading.RLock()
+        self._watches = []
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def collection_group(self, name):
+        return FakeCollection(self, name)
+
+    def document(self, path):
+        collection, doc_id = path.rsplit('/', 1)
+        return FakeDocumentRef(self, collection, doc_id)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None, timeout=None, retry=None):
+        self.latency.sleep()
+        for ref in references:
+            with self._lock:
+                data = self._store.get(ref._collection, {}).get(ref.id)
+            yield FakeSnapshot(ref, copy.deepcopy(data), self._now())
+
+    def _write(self, collection, doc_id, data, merge=False):
+        with self._lock:
+            docs = self._store.setdefault(collection, {})
+            existed = doc_id in docs
+            target = dict(docs.get(doc_id) or {}) if merge else {}
+            _apply_updates(target, data)
+            docs[doc_id] = target
+            self._notify(collection, doc_id, 'MODIFIED' if existed else 'ADDED')
+
+    def _delete(self, collection, doc_id):
+        with self._lock:
+            removed = self._store.get(collection, {}).pop(doc_id, None)
+            if removed is not None:
+                self._notify(collection, doc_id, 'REMOVED', removed)
+
+    def _notify(self, collection, doc_id, change_type, old=None):
+        watches = [w for w in self._watches if w._collection == collection]
+        if not watches:
+            return
+        data = old if change_type == 'REMOVED' else self._store[collection].get(doc_id)
+        snap = FakeSnapshot(FakeDocumentRef(self, collection, doc_id),
+                            copy.deepcopy(data), self._now())
+        change = type('DocumentChange', (), {
+            'type': type('ChangeType', (), {'name': change_type})(),
+            'document': snap,
+        })()
+        for watch in watches:
+            watch._callback([], [change], self._now())
+
+    def _watch(self, collection, callback):
+        watch = _Watch(self, collection, callback)
+        with self._lock:
+            docs = list(self._store.get(collection, {}).items())
+            self._watches.append(watch)
+        changes = []
+        for doc_id, data in docs:
+            snap = FakeSnapshot(FakeDocumentRef(self, collection, doc_id),
+                                copy.deepcopy(data), self._now())
+            changes.append(type('DocumentChange', (), {
+                'type': type('ChangeType', (), {'name': 'ADDED'})(),
+                'document': snap,
+            })())
+        callback([], changes, self._now())
+        return watch
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.cache_control = None
+        self.content_type = None
+        self.metadata = None
+
+    @property
+    def _entry(self):
+        return self.bucket._blobs.get(self.name)
+
+    @property
+    def size(self):
+        entry = self._entry
+        return len(entry['data']) if entry else None
+
+    @property
+    def etag(self):
+        entry = self._entry
+        return entry['etag'] if entry else None
+
+    @property
+    def generation(self):
+        entry = self._entry
+        return entry['generation'] if entry else None
+
+    @property
+    def public_url(self):
+        return f'https://storage.googleapis.com/{self.bucket.name}/{self.name}'
+
+    def exists(self, **kwargs):
+        self.bucket.latency.sleep()
+        return self.name in self.bucket._blobs
+
+    def reload(self, **kwargs):
+        self.bucket.latency.sleep()
+        entry = self._entry
+        if entry is None:
+            raise FileNotFoundError(self.name)
+        self.content_type = entry['content_type']
+        self.cache_control = entry.get('cache_control')
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        self.bucket.latency.sleep()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.bucket._blobs[self.name] = {
+            'data': bytes(data), 'content_type': content_type or self.content_type,
+            'etag': uuid.uuid4().hex, 'generation': int(time.time() * 1e6),
+            'cache_control': self.cache_control,
+        }
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        with open(filename, 'rb') as fh:
+            self.upload_from_string(fh.read(), content_type=content_type)
+
+    def patch(self, **kwargs):
+        entry = self._entry
+        if entry is not None:
+            entry['cache_control'] = self.cache_control
+
+    def make_public(self, **kwargs):
+        return None
+
+    def download_as_bytes(self, start=None, end=None, **kwargs):
+        self.bucket.latency.sleep()
+        entry = self._entry
+        if entry is None:
+            raise FileNotFoundError(self.name)
+        data = entry['data']
+        start = start or 0
+        end = len(data) - 1 if end is None else end
+        return data[start:end + 1]
+
+    def download_to_filename(self, filename, **kwargs):
+        with open(filename, 'wb') as fh:
+            fh.write(self.download_as_bytes())
+
+    def delete(self, **kwargs):
+        self.bucket.latency.sleep()
+        if self.bucket._blobs.pop(self.name, None) is None:
+            raise FileNotFoundError(self.name)
+
+    def generate_signed_url(self, **kwargs):
+        return self.public_url + '?signed=1'
+
+
+class FakeBucket:
+    def __init__(self, name='fake-bucket', latency=None):
+        self.name = name
+        self.latency = latency or LatencyModel()
+        self._blobs = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        return FakeBlob(self, name) if name in self._blobs else None
+
+
+class FakeStorageClient:
+    """google.cloud.storage.Client 的替身（所有 bucket 名稱都對應同一個替身 bucket）"""
+
+    def __init__(self, bucket):
+        self._bucket = bucket
+
+    def bucket(self, name=None):
+        return self._bucket
+
+
+def _transactional(fn):
+    def wrapper(transaction, *args, **kwargs):
+        result = fn(transaction, *args, **kwargs)
+        transaction.commit()
+        return result
+    return wrapper
+
+
+def install(db, bucket):
+    """讓 firebase_admin 的 firestore / storage 與 documents 的 GCS client 改用替身
+
+    需在 create_app() 之前呼叫（會覆蓋 sys.modules 中的 firebase_admin）。
+    """
+    import config
+
+    package = types.ModuleType('firebase_admin')
+    package._apps = {'[DEFAULT]': None}
+    package.initialize_app = lambda *args, **kwargs: None
+
+    firestore = types.ModuleType('firebase_admin.firestore')
+    firestore.client = lambda *args, **kwargs: db
+    firestore.Increment = Increment
+    firestore.SERVER_TIMESTAMP = object()
+    firestore.transactional = _transactional
+    firestore.Query = type('Query', (), {'ASCENDING': 'ASCENDING', 'DESCENDING': 'DESCENDING'})
+
+    storage = types.ModuleType('firebase_admin.storage')
+    storage.bucket = lambda name=None, app=None: bucket
+
+    credentials = types.ModuleType('firebase_admin.credentials')
+    credentials.Certificate = lambda path: path
+
+    package.firestore, package.storage, package.credentials = firestore, storage, credentials
+    sys.modules.update({
+        'firebase_admin': package,
+        'firebase_admin.firestore': firestore,
+        'firebase_admin.storage': storage,
+        'firebase_admin.credentials': credentials,
+    })
+    config.Config.init_firebase = staticmethod(lambda: db)
+
+    import api.documents
+    api.documents._gcs_client = FakeStorageClient(bucket)
+
+
+SEARCH_WORDS = ('交換器', '電源供應器', '光纖', '路由器', '網路卡', 'Switch', 'Router', 'Media Converter')
+
+
+def seed(db, bucket, main_categories=5, sub_categories=6, products=500, documents=20,
+         password='loadtest'):
+    """建立壓力測試資料，回傳各類 id 供流量產生器使用"""
+    from werkzeug.security import generate_password_hash
+
+    base = datetime(2024, 1, 1)
+    image = bytes(range(256)) * 200
+    ids = {'main': [], 'sub': [], 'products': [], 'documents': [], 'users': []}
+    for m in range(main_categories):
+        main_id = f'm{m}'
+        ids['main'].append(main_id)
+        db.collection('main_categories').document(main_id).set({
+            'name': f'主分類 {m}', 'description': '主分類說明', 'created_at': base, 'updated_at': base})
+        for s in range(sub_categories):
+            sub_id = f's{m}_{s}'
+            ids['sub'].append(sub_id)
+            db.collection('sub_categories').document(sub_id).set({
+                'main_category_id': main_id, 'name': f'子分類 {m}-{s}', 'description': '子分類說明',
+                'created_at': base, 'updated_at': base})
+    for p in range(products):
+        product_id = f'p{p}'
+        created = base + timedelta(minutes=p)
+        ids['products'].append(product_id)
+        db.collection('products').document(product_id).set({
+            'sub_category_id': ids['sub'][p % len(ids['sub'])],
+            'name': f'{SEARCH_WORDS[p % len(SEARCH_WORDS)]} {p}',
+            'model': f'{"ABCDEFGH"[p % 8]}{"XYZ"[p % 3]}-{1000 + p}',
+            'price': float(500 + (p * 37) % 20000),
+            'description': '高可靠度工業級網路設備，支援寬溫與冗餘電源。' * 3,
+            'specifications': {'ports': 4 + p % 24, 'poe': p % 2 == 0},
+            'is_featured': p % 25 == 0,
+            'created_at': created, 'updated_at': created})
+        blob_name = f'products/{product_id}/main.jpg'
+        bucket.blob(blob_name).upload_from_string(image, content_type='image/jpeg')
+        db.collection('product_images').document(f'i{p}').set({
+            'product_id': product_id, 'image_url': bucket.blob(blob_name).public_url,
+            'image_type': 'image/jpeg', 'is_main': True, 'created_at': created, 'updated_at': created})
+    for c in range(5):
+        blob_name = f'carousels/c{c}.jpg'
+        bucket.blob(blob_name).upload_from_string(image, content_type='image/jpeg')
+        db.collection('carousels').document(f'c{c}').set({
+            'title': f'輪播 {c}', 'description': '', 'image_url': bucket.blob(blob_name).public_url,
+            'image_type': 'image/jpeg', 'link_url': '', 'order_num': c, 'is_active': True,
+            'created_at': base, 'updated_at': base})
+    for d in range(documents):
+        doc_id = f'd{d}'
+        blob_name = f'documents/{doc_id}.pdf'
+        data = bytes(range(256)) * 400
+        bucket.blob(blob_name).upload_from_string(data, content_type='application/pdf')
+        ids['documents'].append(doc_id)
+        db.collection('documents').document(doc_id).set({
+            'title': f'型錄 {d}', 'file_url': blob_name, 'file_size': len(data),
+            'file_type': 'application/pdf', 'requires_login': d % 4 == 3,
+            'created_at': base, 'updated_at': base})
+    password_hash = generate_password_hash(password)
+    for u in range(3):
+        username = f'loadtest{u}'
+        ids['users'].append(username)
+        db.collection('users').document(f'u{u}').set({
+            'username': username, 'password_hash': password_hash,
+            'email': f'{username}@example.com', 'is_admin': False,
+            'created_at': base, 'updated_at': base})
+    ids['password'] = password
+    return ids
@@ -1,8 +1,6 @@
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore, storage as firebase_storage
 
 # 載入環境變數
 env = os.getenv('FLASK_ENV', 'development')
@@ -23,9 +21,173 @@ class Config:
     HOST = os.getenv("FLASK_HOST", "127.0.0.1")
     PORT = int(os.getenv("FLASK_PORT", 5000))
 
+    # 啟動預熱：sync（預熱完成才回傳 app）、background（背景預熱）、off（不預熱）
+    WARMUP_MODE = os.getenv('WARMUP_MODE', 'background')
+    WARMUP_RETRY_INTERVAL = int(os.getenv('WARMUP_RETRY_INTERVAL', 5))
+
+    # 產品目錄欄式快照的重新載入間隔（秒），用於同步其他 worker 的寫入
+    CATALOG_REFRESH_INTERVAL = int(os.getenv('CATALOG_REFRESH_INTERVAL', 300))
+
+    # 產品、分類與圖片端點的存取頻率（count-min sketch，每 ACCESS_HALF_LIFE 秒減半）
+    # 熱門 URL 每 ACCESS_PERSIST_INTERVAL 秒保存，啟動預熱時重新播放前 ACCESS_PREWARM_COUNT 個
+    ACCESS_TRACKING_ENABLED = os.getenv('ACCESS_TRACKING_ENABLED', 'true').lower() == 'true'
+    ACCESS_HOT_SET_PATH = os.getenv('ACCESS_HOT_SET_PATH', 'hot_set.json')
+    ACCESS_HOT_SET_SIZE = int(os.getenv('ACCESS_HOT_SET_SIZE', 500))
+    ACCESS_HALF_LIFE = int(os.getenv('ACCESS_HALF_LIFE', 3600))
+    ACCESS_PERSIST_INTERVAL = int(os.getenv('ACCESS_PERSIST_INTERVAL', 60))
+    ACCESS_PREWARM_COUNT = int(os.getenv('ACCESS_PREWARM_COUNT', 100))
+    ACCESS_PREWARM_TIMEOUT = float(os.getenv('ACCESS_PREWARM_TIMEOUT', 10))
+
+    # /api/products/suggest 預設與最多回傳的建議數
+    SUGGEST_LIMIT = int(os.getenv('SUGGEST_LIMIT', 8))
+    SUGGEST_MAX_LIMIT = int(os.getenv('SUGGEST_MAX_LIMIT', 20))
+
+    # 執行查詢時輸出所需的複合索引（開發用）
+    QUERY_EXPLAIN = os.getenv('QUERY_EXPLAIN', 'false').lower() == 'true'
+
+    # in 查詢：每批上限、並行執行緒數與整體期限（秒）
+    FIRESTORE_IN_LIMIT = int(os.getenv('FIRESTORE_IN_LIMIT', 30))
+    IN_QUERY_WORKERS = int(os.getenv('IN_QUERY_WORKERS', 8))
+    IN_QUERY_TIMEOUT = float(os.getenv('IN_QUERY_TIMEOUT', 10))
+
+    # Firestore 呼叫逾時（秒）與整個請求的期限（秒，0 表示不限制）；呼叫逾時取兩者剩餘較小者
+    FIRESTORE_TIMEOUT = float(os.getenv('FIRESTORE_TIMEOUT', 10))
+    REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', 15))
+    # 依 collection 覆寫：timeout（秒）、hedge（單一文件讀取是否對沖）
+    FIRESTORE_COLLECTION_POLICIES = {
+        'products': {'timeout': 5, 'hedge': True},
+        'product_images': {'timeout': 5, 'hedge': True},
+        'main_categories': {'timeout': 5, 'hedge': True},
+        'sub_categories': {'timeout': 5, 'hedge': True},
+    }
+    # 對沖讀取：第一次讀取超過近期 p95（樣本不足時用 HEDGE_DEFAULT_DELAY）仍未回應就再送一次
+    HEDGED_READS_ENABLED = os.getenv('HEDGED_READS_ENABLED', 'false').lower() == 'true'
+    HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', 0.05))
+    HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 0.005))
+    HEDGE_WORKERS = int(os.getenv('HEDGE_WORKERS', 32))
+
+    # 熔斷器：最近 window 秒內錯誤率或慢呼叫（slow_call_seconds 以上）比例超過門檻即開啟，
+    # 開啟期間不呼叫 Firestore，背景每 probe_interval 秒探測一次，成功才關閉
+    CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+    CIRCUIT_BREAKER = {'window': 30, 'min_calls': 20, 'error_rate': 0.5,
+                       'slow_call_seconds': 3.0, 'slow_call_rate': 0.8, 'probe_interval': 5.0}
+    # 熔斷或 5xx 時改回傳的最後可用快照（本機 SQLite，重新啟動後仍保留）
+    LAST_KNOWN_GOOD_PATH = os.getenv('LAST_KNOWN_GOOD_PATH', 'last_known_good.db')
+    LAST_KNOWN_GOOD_WRITE_INTERVAL = int(os.getenv('LAST_KNOWN_GOOD_WRITE_INTERVAL', 60))
+    # 最多保存的快照數，超過時刪除最久未寫入的快照
+    LAST_KNOWN_GOOD_MAX_ENTRIES = int(os.getenv('LAST_KNOWN_GOOD_MAX_ENTRIES', 1000))
+    # 保存快照的端點 -> 快照 key 包含的查詢參數（其他參數不影響 key）
+    LAST_KNOWN_GOOD_ENDPOINTS = {
+        'categories.get_all_categories': (),
+        'categories.get_main_categories': (),
+        'categories.get_subcategories': (),
+        'carousel.get_carousel_items': (),
+        'products.get_featured_products': (),
+        'products.get_products_by_main_category': (),
+        'products.get_products_by_sub_category': (),
+        'products.get_product_detail': (),
+        'products.get_products_by_ids': ('ids',),
+        'documents_bp.list_public_documents': (),
+    }
+
+    # 本機 SQLite 讀取副本：讀取走副本、寫入仍送 Firestore
+    READ_REPLICA_ENABLED = os.getenv('READ_REPLICA_ENABLED', 'false').lower() == 'true'
+    READ_REPLICA_PATH = os.getenv('READ_REPLICA_PATH', 'read_replica.db')
+    READ_REPLICA_SYNC_TIMEOUT = float(os.getenv('READ_REPLICA_SYNC_TIMEOUT', 30))
+    READ_REPLICA_TAKEOVER_INTERVAL = float(os.getenv('READ_REPLICA_TAKEOVER_INTERVAL', 30))
+
+    # 負載卸除：每個端點的自適應並行上限與短佇列，超載回傳 503 + Retry-After
+    LOAD_SHEDDING_ENABLED = os.getenv('LOAD_SHEDDING_ENABLED', 'true').lower() == 'true'
+    GLOBAL_CONCURRENCY = {'initial_limit': 100, 'min_limit': 10, 'max_limit': 500,
+                          'max_queue': 50, 'queue_timeout': 1.0}
+    ENDPOINT_CONCURRENCY_DEFAULT = {'initial_limit': 20, 'min_limit': 2, 'max_limit': 200,
+                                    'max_queue': 10, 'queue_timeout': 0.5}
+    ENDPOINT_CONCURRENCY = {
+        # 全表掃描，限制最嚴
+        'products.search_products': {'initial_limit': 4, 'min_limit': 1, 'max_limit': 16,
+                                     'max_queue': 4, 'queue_timeout': 0.25},
+    }
+    # 便宜或核心的端點可使用全域保留額度（PRIORITY_RESERVE）
+    PRIORITY_ENDPOINTS = ('auth.login', 'carousel.get_carousel_items',
+                          'categories.get_all_categories', 'categories.get_main_categories',
+                          'categories.get_subcategories', 'frontend.serve_frontend', 'home.get_home',
+                          'products.suggest_products')
+    PRIORITY_RESERVE = 0.2
+
+    # 並行的相同讀取只送一次 Firestore 查詢
+    SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+
+    # 公開端點的完整回應快取（stale-while-revalidate / stale-if-error）
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    # 依端點覆寫新鮮期（秒）；也可給 {'ttl', 'stale_while_revalidate', 'stale_if_error'}
+    RESPONSE_CACHE_TTLS = {
+        'categories.get_all_categories': 300,
+        'categories.get_main_categories': 300,
+        'categories.get_subcategories': 300,
+        'carousel.get_carousel_items': 120,
+        'products.get_featured_products': 60,
+        'products.get_products_by_main_category': 60,
+        'products.get_products_by_sub_category': 60,
+        'documents_bp.list_public_documents': 120,
+    }
+
+    # 圖片代理：直接回傳圖片位元組（本機磁碟 LRU 快取），取代 302 到 Storage
+    IMAGE_PROXY_ENABLED = os.getenv('IMAGE_PROXY_ENABLED', 'false').lower() == 'true'
+    IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', 'image_cache')
+    IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    # 代理圖片重新比對紀錄的間隔，也是瀏覽器快取的 max-age（秒）
+    IMAGE_PROXY_REVALIDATE = int(os.getenv('IMAGE_PROXY_REVALIDATE', 300))
+
+    # 文件下載：redirect（簽名 URL）或 passthrough（由後端分段串流，支援 Range 續傳）
+    DOCUMENT_DOWNLOAD_MODE = os.getenv('DOCUMENT_DOWNLOAD_MODE', 'redirect')
+    DOCUMENT_STREAM_CHUNK_SIZE = int(os.getenv('DOCUMENT_STREAM_CHUNK_SIZE', 1024 * 1024))
+
+    # 由 Flask 直接提供 Vue 建置結果（先執行 flask frontend precompress；未安裝 brotli 時只提供 gzip）
+    SERVE_FRONTEND = os.getenv('SERVE_FRONTEND', 'false').lower() == 'true'
+    FRONTEND_DIST_DIR = os.getenv('FRONTEND_DIST_DIR', os.path.join('..', 'vue', 'dist'))
+    # 產品與分類頁的預渲染 HTML 快照（需 SERVE_FRONTEND；flask frontend prerender 產生全部）
+    PRERENDER_ENABLED = os.getenv('PRERENDER_ENABLED', 'false').lower() == 'true'
+    PRERENDER_DIR = os.getenv('PRERENDER_DIR', 'prerender')
+
+    # 內部子請求（/api/home 等）的執行緒數與首頁整體期限（秒）
+    SUBREQUEST_WORKERS = int(os.getenv('SUBREQUEST_WORKERS', 16))
+    HOME_TIMEOUT = float(os.getenv('HOME_TIMEOUT', 10))
+    # /api/batch：每批子請求上限與整批期限（秒）
+    BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+    BATCH_TIMEOUT = float(os.getenv('BATCH_TIMEOUT', 5))
+
+    # GET /api/products?ids= 每次最多查詢的產品數
+    PRODUCT_IDS_MAX = int(os.getenv('PRODUCT_IDS_MAX', 50))
+
+    # 上傳圖片的內容定址路徑前綴（<前綴>/<sha256 前兩碼>/<sha256>.<副檔名>，參照計數在 blob_refs）
+    CONTENT_BLOB_PREFIX = os.getenv('CONTENT_BLOB_PREFIX', 'content')
+
+    # 背景工作佇列（本機 SQLite）：上傳、Storage 刪除與連鎖刪除在請求之外執行
+    # JOB_WORKERS=0 時本行程只加入工作，由 flask jobs work 執行
+    JOBS_ENABLED = os.getenv('JOBS_ENABLED', 'true').lower() == 'true'
+    JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'jobs.db')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+    JOB_RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', 2.0))
+    JOB_RETRY_MAX_DELAY = float(os.getenv('JOB_RETRY_MAX_DELAY', 300))
+    JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 300))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+    JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))
+
+    # 分片計數器（分類產品數、文件統計）的分片數；只能增加，減少會漏讀舊分片
+    COUNTER_SHARDS = int(os.getenv('COUNTER_SHARDS', 10))
+
+    # 增量同步：每頁上限、寫入緩衝秒數與刪除紀錄保留天數
+    SYNC_PAGE_MAX = int(os.getenv('SYNC_PAGE_MAX', 500))
+    SYNC_SETTLE_SECONDS = int(os.getenv('SYNC_SETTLE_SECONDS', 5))
+    TOMBSTONE_RETENTION_DAYS = int(os.getenv('TOMBSTONE_RETENTION_DAYS', 30))
+
     @staticmethod
     def init_firebase():
-        """初始化 Firebase"""
+        """初始化 Firebase（firebase_admin 延遲到此時才載入）"""
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
         cred_path = Config.FIREBASE_CREDENTIALS_PATH
         storage_bucket = Config.FIREBASE_STORAGE_BUCKET
 
@@ -39,6 +201,7 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    QUERY_EXPLAIN = os.getenv('QUERY_EXPLAIN', 'true').lower() == 'true'
 
 class ProductionConfig(Config):
     DEBUG = False
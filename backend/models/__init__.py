@@ -1,12 +1,8 @@
 from flask_jwt_extended import JWTManager
-from flask import current_app
+from .database import get_db, set_default_db
 
 jwt = JWTManager()
 
-def get_db():
-    """取得 Firestore 客戶端"""
-    return current_app.db
-
 # 導入所有模型
 from .user import User
 from .category import MainCategory, SubCategory
@@ -0,0 +1,178 @@
+import hashlib
+import mimetypes
+import uuid
+from datetime import datetime
+from flask import current_app, has_app_context
+from .database import get_bucket, get_db
+from .deadline import call_timeout
+from utils.jobs import enqueue
+
+# 內容定址 blob 的參照計數：blob_refs/<sha256>
+BLOB_REFS_COLLECTION = 'blob_refs'
+# 已套用的參照增減（背景工作重試時以 op_key 判斷是否已執行過）：blob_ops/<op_key>
+BLOB_OPS_COLLECTION = 'blob_ops'
+# 路徑即內容雜湊，同一路徑的內容永遠不變
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _prefix():
+    if has_app_context():
+        return current_app.config.get('CONTENT_BLOB_PREFIX', 'content')
+    return 'content'
+
+
+def content_path(digest, content_type):
+    """內容定址路徑：<CONTENT_BLOB_PREFIX>/<前兩碼>/<sha256><副檔名>"""
+    ext = mimetypes.guess_extension(content_type or '') or ''
+    if ext in ('.jpe', '.jpeg'):
+        ext = '.jpg'
+    return f'{_prefix()}/{digest[:2]}/{digest}{ext}'
+
+
+def _blob_path(bucket, url):
+    """由公開 URL 取得 bucket 內的路徑"""
+    return url.split(bucket.name + '/')[-1].split('?')[0]
+
+
+def _digest_of(path):
+    """內容定址路徑的 sha256；舊的 uuid 路徑回傳 None"""
+    if not path.startswith(_prefix() + '/'):
+        return None
+    name = path.rsplit('/', 1)[-1].split('.', 1)[0]
+    return name if len(name) == 64 else None
+
+
+def blob_url(data, content_type):
+    """內容定址 blob 的公開 URL（不需上傳即可得知，背景上傳前先寫入紀錄）"""
+    path = content_path(hashlib.sha256(data).hexdigest(), content_type)
+    return get_bucket().blob(path).public_url
+
+
+def _delete_blob(blob, generation=None):
+    """刪除 Storage 檔案；檔案已不存在（重試時）視為成功
+
+    generation 不為 None 時只刪除該版本：之後重新上傳（新的 generation）的檔案會保留。
+    """
+    try:
+        if generation is None:
+            blob.delete()
+        else:
+            blob.delete(if_generation_match=generation)
+    except Exception as e:
+        if type(e).__name__ not in ('NotFound', 'PreconditionFailed'):
+            raise
+
+
+def _apply_once(db, transaction, op_key):
+    """op_key 已套用過時回傳 False，否則在 transaction 中記錄並回傳 True（需在寫入之前呼叫）"""
+    if op_key is None:
+        return True
+    ref = db.collection(BLOB_OPS_COLLECTION).document(op_key)
+    if ref.get(transaction=transaction, timeout=call_timeout(BLOB_OPS_COLLECTION)).exists:
+        return False
+    transaction.set(ref, {'created_at': datetime.utcnow()})
+    return True
+
+
+def store_blob(data, content_type, op_key=None):
+    """增加參照數並以內容雜湊上傳（已有其他參照且檔案存在時不重新上傳），回傳公開 URL
+
+    是否已有參照在增加參照的 transaction 中判斷：有其他參照時，釋放必須先扣掉本次的參照才會
+    歸零刪除，檔案不會在回傳前被刪除；參照原本為 0 時一律重新上傳（並行中的釋放只刪除舊版本）。
+    op_key 不為 None 時同一個 op_key 只會增加一次參照（背景工作重試不會重複計數）。
+    """
+    from firebase_admin import firestore
+
+    db = get_db()
+    bucket = get_bucket()
+    digest = hashlib.sha256(data).hexdigest()
+    path = content_path(digest, content_type)
+    ref = db.collection(BLOB_REFS_COLLECTION).document(digest)
+
+    @firestore.transactional
+    def increment(transaction):
+        snapshot = ref.get(transaction=transaction, timeout=call_timeout(BLOB_REFS_COLLECTION))
+        referenced = snapshot.exists and (snapshot.to_dict() or {}).get('refs', 0) > 0
+        if not _apply_once(db, transaction, op_key):
+            # 已增加過（重試）：參照包含本次，確認檔案存在即可
+            return referenced
+        transaction.set(ref, {
+            'path': path,
+            'size': len(data),
+            'content_type': content_type,
+            'refs': firestore.Increment(1),
+            'updated_at': datetime.utcnow()
+        }, merge=True)
+        return referenced
+
+    referenced = increment(db.transaction())
+    blob = bucket.blob(path)
+    # 其他參照的上傳可能尚未完成，不存在時自行上傳（路徑由內容決定，重複上傳只會寫入相同的位元組）
+    if not (referenced and blob.exists()):
+        blob.cache_control = IMMUTABLE_CACHE_CONTROL
+        blob.metadata = {'sha256': digest}
+        blob.upload_from_string(data, content_type=content_type)
+        blob.make_public()
+    return blob.public_url
+
+
+def release_blob(url, op_key=None):
+    """減少 URL 對應 blob 的參照數，歸零才從 Storage 刪除；舊的非內容定址檔案直接刪除
+
+    op_key 不為 None 時同一個 op_key 只會減少一次參照。
+    """
+    from firebase_admin import firestore
+
+    db = get_db()
+    bucket = get_bucket()
+    path = _blob_path(bucket, url)
+    digest = _digest_of(path)
+    if digest is None:
+        _delete_blob(bucket.blob(path))
+        return True
+
+    ref = db.collection(BLOB_REFS_COLLECTION).document(digest)
+    # 在參照歸零之前記下目前的版本：歸零後並行的 store_blob 重新上傳的檔案不會被刪除
+    current = bucket.get_blob(path)
+    generation = current.generation if current is not None else None
+
+    @firestore.transactional
+    def decrement(transaction):
+        snapshot = ref.get(transaction=transaction, timeout=call_timeout(BLOB_REFS_COLLECTION))
+        refs = (snapshot.to_dict() or {}).get('refs', 0) if snapshot.exists else 0
+        if not _apply_once(db, transaction, op_key):
+            # 已減少過；前一次嘗試可能在刪除檔案前失敗，參照已歸零時補刪
+            return not snapshot.exists
+        if refs > 1:
+            transaction.update(ref, {'refs': refs - 1, 'updated_at': datetime.utcnow()})
+            return False
+        if snapshot.exists:
+            transaction.delete(ref)
+        return True
+
+    if decrement(db.transaction()):
+        if current is not None:
+            _delete_blob(bucket.blob(path), generation)
+        return True
+    return False
+
+
+def enqueue_store(data, content_type):
+    """在背景上傳 blob 並增加參照，立即回傳之後可用的公開 URL"""
+    op_key = f'store-{uuid.uuid4().hex}'
+    enqueue('blobs.store', {'content_type': content_type, 'op_key': op_key}, data,
+            idempotency_key=op_key)
+    return blob_url(data, content_type)
+
+
+def enqueue_release(url, collection, record_id, version):
+    """在背景釋放紀錄對 blob 的參照
+
+    version 為紀錄最後寫入的時間（updated_at）：同一次寫入的 URL 只會釋放一次，
+    紀錄之後重新掛回相同 URL 再釋放時則是新的操作。
+    """
+    if isinstance(version, datetime):
+        version = version.isoformat()
+    digest = hashlib.sha1(f'{url}:{version}'.encode()).hexdigest()[:16]
+    op_key = f'release-{collection}-{record_id}-{digest}'
+    enqueue('blobs.release', {'url': url, 'op_key': op_key}, idempotency_key=op_key)
@@ -1,11 +1,17 @@
 from datetime import datetime
-from flask import current_app
-from firebase_admin import storage
-import uuid
-
-class Carousel:
+from .blobs import enqueue_release, enqueue_store
+from .database import get_db
+from .deadline import call_timeout
+from .hooks import notify
+from .record import Record, record_slots
+from .tombstones import delete_with_tombstone
+
+class Carousel(Record):
     """輪播圖模型 - 使用 Firebase Storage"""
     COLLECTION = 'carousels'
+    FIELDS = (('title', None), ('description', None), ('image_url', None), ('image_type', None),
+              ('link_url', None), ('order_num', 0), ('is_active', True))
+    __slots__ = record_slots(FIELDS)
 
     def __init__(self, title=None, description=None, image_url=None,
                  image_type=None, link_url=None, order_num=0,
@@ -18,20 +24,18 @@ class Carousel:
         self.link_url = link_url
         self.order_num = order_num
         self.is_active = is_active
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self._touch()
 
     @staticmethod
     def get_db():
-        return current_app.db
+        return get_db()
 
     @classmethod
     def get(cls, carousel_id):
         """根據ID獲取輪播圖"""
         if not carousel_id:
             return None
-        db = cls.get_db()
-        doc = db.collection(cls.COLLECTION).document(str(carousel_id)).get()
+        doc = cls._get_document(carousel_id)
         if doc.exists:
             return cls._from_doc(doc)
         return None
@@ -39,45 +43,17 @@ class Carousel:
     @classmethod
     def filter_by(cls, **kwargs):
         """根據條件查詢輪播圖"""
-        db = cls.get_db()
-        query = db.collection(cls.COLLECTION)
-
-        for key, value in kwargs.items():
-            query = query.where(key, '==', value)
-
-        docs = query.stream()
-        return [cls._from_doc(doc) for doc in docs]
+        return cls.query().filter_by(**kwargs).all()
 
     @classmethod
     def order_by(cls, field):
         """根據欄位排序"""
-        db = cls.get_db()
-        docs = db.collection(cls.COLLECTION).order_by(field).stream()
-        return [cls._from_doc(doc) for doc in docs]
+        return cls.query().order_by(field).all()
 
     @classmethod
     def all(cls):
         """獲取所有輪播圖"""
-        db = cls.get_db()
-        docs = db.collection(cls.COLLECTION).stream()
-        return [cls._from_doc(doc) for doc in docs]
-
-    @classmethod
-    def _from_doc(cls, doc):
-        """從 Firestore 文檔創建對象"""
-        data = doc.to_dict()
-        obj = cls.__new__(cls)
-        obj.id = doc.id
-        obj.title = data.get('title')
-        obj.description = data.get('description')
-        obj.image_url = data.get('image_url')
-        obj.image_type = data.get('image_type')
-        obj.link_url = data.get('link_url')
-        obj.order_num = data.get('order_num', 0)
-        obj.is_active = data.get('is_active', True)
-        obj.created_at = data.get('created_at')
-        obj.updated_at = data.get('updated_at')
-        return obj
+        return cls.query().all()
 
     def save(self):
         """儲存輪播圖"""
@@ -95,12 +71,13 @@ class Carousel:
             }
 
             if self.id:
-                db.collection(self.COLLECTION).document(str(self.id)).update(data)
+                db.collection(self.COLLECTION).document(str(self.id)).update(data, timeout=call_timeout(self.COLLECTION))
             else:
                 data['created_at'] = self.created_at
-                _, doc_ref = db.collection(self.COLLECTION).add(data)
+                _, doc_ref = db.collection(self.COLLECTION).add(data, timeout=call_timeout(self.COLLECTION))
                 self.id = doc_ref.id
 
+            notify(self.COLLECTION, 'save', self)
             return True
         except Exception as e:
             print(f"Error saving carousel: {str(e)}")
@@ -115,7 +92,8 @@ class Carousel:
                 if self.image_url:
                     self.delete_from_storage()
 
-                db.collection(self.COLLECTION).document(str(self.id)).delete()
+                delete_with_tombstone(db, self.COLLECTION, self.id)
+                notify(self.COLLECTION, 'delete', self)
                 return True
             return False
         except Exception as e:
@@ -123,15 +101,9 @@ class Carousel:
             return False
 
     def upload_to_storage(self, image_data, content_type):
-        """上傳圖片到 Firebase Storage"""
+        """在背景上傳圖片到 Firebase Storage（內容定址：相同內容只存一份，URL 可永久快取）"""
         try:
-            bucket = storage.bucket()
-            filename = f'carousels/{uuid.uuid4()}.jpg'
-            blob = bucket.blob(filename)
-            blob.upload_from_string(image_data, content_type=content_type)
-            blob.make_public()
-
-            self.image_url = blob.public_url
+            self.image_url = enqueue_store(image_data, content_type)
             self.image_type = content_type
             return True
         except Exception as e:
@@ -139,13 +111,10 @@ class Carousel:
             return False
 
     def delete_from_storage(self):
-        """從 Firebase Storage 刪除圖片"""
+        """在背景釋放圖片參照；沒有其他紀錄使用相同內容時才從 Firebase Storage 刪除"""
         try:
             if self.image_url:
-                bucket = storage.bucket()
-                path = self.image_url.split(bucket.name + '/')[-1].split('?')[0]
-                blob = bucket.blob(path)
-                blob.delete()
+                enqueue_release(self.image_url, self.COLLECTION, self.id, self.updated_at)
             return True
         except Exception as e:
             print(f"Error deleting from storage: {str(e)}")
@@ -1,28 +1,35 @@
 from datetime import datetime
-from flask import current_app
-
-class MainCategory:
+from .database import get_db
+from .deadline import call_timeout
+from .hooks import notify
+from .record import Record, record_slots
+from .tombstones import delete_with_tombstone
+from utils.jobs import enqueue
+from utils.singleflight import coalesce_method
+
+class MainCategory(Record):
     """產品大分類模型"""
     COLLECTION = 'main_categories'
+    FIELDS = (('name', None), ('description', None))
+    __slots__ = record_slots(FIELDS)
 
     def __init__(self, name=None, description=None, category_id=None):
         self.id = category_id
         self.name = name
         self.description = description
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self._touch()
 
     @staticmethod
     def get_db():
-        return current_app.db
+        return get_db()
 
     @classmethod
+    @coalesce_method
     def get(cls, category_id):
         """根據ID獲取主分類"""
         if not category_id:
             return None
-        db = cls.get_db()
-        doc = db.collection(cls.COLLECTION).document(str(category_id)).get()
+        doc = cls._get_document(category_id)
         if doc.exists:
             return cls._from_doc(doc)
         return None
@@ -30,21 +37,7 @@ class MainCategory:
     @classmethod
     def all(cls):
         """獲取所有主分類"""
-        db = cls.get_db()
-        docs = db.collection(cls.COLLECTION).stream()
-        return [cls._from_doc(doc) for doc in docs]
-
-    @classmethod
-    def _from_doc(cls, doc):
-        """從 Firestore 文檔創建對象"""
-        data = doc.to_dict()
-        obj = cls.__new__(cls)
-        obj.id = doc.id
-        obj.name = data.get('name')
-        obj.description = data.get('description')
-        obj.created_at = data.get('created_at')
-        obj.updated_at = data.get('updated_at')
-        return obj
+        return cls.query().all()
 
     def save(self):
         """儲存主分類"""
@@ -57,12 +50,13 @@ class MainCategory:
             }
 
             if self.id:
-                db.collection(self.COLLECTION).document(str(self.id)).update(data)
+                db.collection(self.COLLECTION).document(str(self.id)).update(data, timeout=call_timeout(self.COLLECTION))
             else:
                 data['created_at'] = self.created_at
-                _, doc_ref = db.collection(self.COLLECTION).add(data)
+                _, doc_ref = db.collection(self.COLLECTION).add(data, timeout=call_timeout(self.COLLECTION))
                 self.id = doc_ref.id
 
+            notify(self.COLLECTION, 'save', self)
             return True
         except Exception as e:
             print(f"Error saving category: {str(e)}")
@@ -73,12 +67,11 @@ class MainCategory:
         try:
             if self.id:
                 db = self.get_db()
-                # 先刪除所有子分類
-                subcategories = SubCategory.filter_by(main_category_id=self.id)
-                for subcat in subcategories:
-                    subcat.delete()
-
-                db.collection(self.COLLECTION).document(str(self.id)).delete()
+                delete_with_tombstone(db, self.COLLECTION, self.id)
+                # 所有子分類（及其產品）在背景刪除
+                enqueue('cascade.main_category_subcategories', {'main_category_id': self.id},
+                        idempotency_key=f'cascade-main-category-subcategories-{self.id}')
+                notify(self.COLLECTION, 'delete', self)
                 return True
             return False
         except Exception as e:
@@ -96,64 +89,45 @@ class MainCategory:
         }
 
 
-class SubCategory:
+class SubCategory(Record):
     """產品子分類模型"""
     COLLECTION = 'sub_categories'
+    STRING_FIELDS = ('main_category_id',)
+    FIELDS = (('main_category_id', None), ('name', None), ('description', None))
+    __slots__ = record_slots(FIELDS)
 
     def __init__(self, main_category_id=None, name=None, description=None, category_id=None):
         self.id = category_id
         self.main_category_id = main_category_id
         self.name = name
         self.description = description
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self._touch()
 
     @staticmethod
     def get_db():
-        return current_app.db
+        return get_db()
 
     @classmethod
+    @coalesce_method
     def get(cls, category_id):
         """根據ID獲取子分類"""
         if not category_id:
             return None
-        db = cls.get_db()
-        doc = db.collection(cls.COLLECTION).document(str(category_id)).get()
+        doc = cls._get_document(category_id)
         if doc.exists:
             return cls._from_doc(doc)
         return None
 
     @classmethod
+    @coalesce_method
     def filter_by(cls, **kwargs):
         """根據條件查詢子分類 - 返回列表"""
-        db = cls.get_db()
-        query = db.collection(cls.COLLECTION)
-
-        for key, value in kwargs.items():
-            query = query.where(key, '==', str(value))
-
-        docs = query.stream()
-        return [cls._from_doc(doc) for doc in docs]
+        return cls.query().filter_by(**kwargs).all()
 
     @classmethod
     def all(cls):
         """獲取所有子分類"""
-        db = cls.get_db()
-        docs = db.collection(cls.COLLECTION).stream()
-        return [cls._from_doc(doc) for doc in docs]
-
-    @classmethod
-    def _from_doc(cls, doc):
-        """從 Firestore 文檔創建對象"""
-        data = doc.to_dict()
-        obj = cls.__new__(cls)
-        obj.id = doc.id
-        obj.main_category_id = data.get('main_category_id')
-        obj.name = data.get('name')
-        obj.description = data.get('description')
-        obj.created_at = data.get('created_at')
-        obj.updated_at = data.get('updated_at')
-        return obj
+        return cls.query().all()
 
     def save(self):
         """儲存子分類"""
@@ -167,12 +141,13 @@ class SubCategory:
             }
 
             if self.id:
-                db.collection(self.COLLECTION).document(str(self.id)).update(data)
+                db.collection(self.COLLECTION).document(str(self.id)).update(data, timeout=call_timeout(self.COLLECTION))
             else:
                 data['created_at'] = self.created_at
-                _, doc_ref = db.collection(self.COLLECTION).add(data)
+                _, doc_ref = db.collection(self.COLLECTION).add(data, timeout=call_timeout(self.COLLECTION))
                 self.id = doc_ref.id
 
+            notify(self.COLLECTION, 'save', self)
             return True
         except Exception as e:
             print(f"Error saving subcategory: {str(e)}")
@@ -183,13 +158,12 @@ class SubCategory:
         try:
             if self.id:
                 db = self.get_db()
-                # 刪除相關產品
-                from .product import Product
-                products = Product.filter_by(sub_category_id=self.id)
-                for product in products:
-                    product.delete()
-
-                db.collection(self.COLLECTION).document(str(self.id)).delete()
+                delete_with_tombstone(db, self.COLLECTION, self.id)
+                # 相關產品在背景刪除
+                enqueue('cascade.subcategory_products',
+                        {'sub_category_id': self.id, 'main_category_id': self.main_category_id},
+                        idempotency_key=f'cascade-subcategory-products-{self.id}')
+                notify(self.COLLECTION, 'delete', self)
                 return True
             return False
         except Exception as e:
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+
+# 熔斷器開啟時被拒絕的請求在 WSGI environ 中的標記（不計入錯誤率）
+CIRCUIT_REJECTED_ENVIRON_KEY = 'myweb.circuit_rejected'
+# 本次請求是否呼叫過 Firestore
+DATA_CALL_ENVIRON_KEY = 'myweb.data_call'
+
+
+class CircuitOpenError(Exception):
+    """熔斷器開啟中，不送出 Firestore 呼叫"""
+
+
+class CircuitBreaker:
+    """資料層熔斷器
+
+    以最近 window 秒（1 秒一格）的請求結果計算錯誤率與慢呼叫比例，
+    呼叫數達 min_calls 且任一比例超過門檻即開啟。開啟後所有 Firestore 呼叫立即失敗，
+    由背景執行緒每 probe_interval 秒執行 probe 一次，成功才關閉。
+    """
+
+    def __init__(self, probe, window=30, min_calls=20, error_rate=0.5,
+                 slow_call_seconds=3.0, slow_call_rate=0.8, probe_interval=5.0):
+        self.probe = probe
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.probe_interval = probe_interval
+        self.state = 'closed'
+        self.opened_at = None
+        self.reason = None
+        self.trips = 0
+        self.rejected = 0
+        self.probes = 0
+        self._buckets = deque()   # [second, calls, failures, slow]
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.state == 'open'
+
+    def check(self):
+        """開啟中時拋出 CircuitOpenError"""
+        if self.state == 'open':
+            self.rejected += 1
+            raise CircuitOpenError("資料服務暫時無法使用（熔斷器開啟中）")
+
+    def _expire(self, now):
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+
+    def record(self, success, seconds):
+        """記錄一次用到資料層的請求結果"""
+        now = int(time.time())
+        with self._lock:
+            if self.state == 'open':
+                return
+            self._expire(now)
+            if not self._buckets or self._buckets[-1][0] != now:
+                self._buckets.append([now, 0, 0, 0])
+            bucket = self._buckets[-1]
+            bucket[1] += 1
+            bucket[2] += 0 if success else 1
+            bucket[3] += 1 if seconds >= self.slow_call_seconds else 0
+
+            calls = sum(b[1] for b in self._buckets)
+            if calls < self.min_calls:
+                return
+            failures = sum(b[2] for b in self._buckets) / calls
+            slow = sum(b[3] for b in self._buckets) / calls
+            if failures >= self.error_rate:
+                reason = f'錯誤率 {failures:.0%}'
+            elif slow >= self.slow_call_rate:
+                reason = f'慢呼叫比例 {slow:.0%}'
+            else:
+                return
+            self._open(reason)
+
+    def _open(self, reason):
+        self.state = 'open'
+        self.opened_at = time.time()
+        self.reason = reason
+        self.trips += 1
+        self._buckets.clear()
+        print(f"Circuit breaker opened: {reason}")
+        threading.Thread(target=self._probe_loop, name='circuit-probe', daemon=True).start()
+
+    def trip(self, reason='手動開啟'):
+        with self._lock:
+            if self.state != 'open':
+                self._open(reason)
+
+    def _probe_loop(self):
+        while self.state == 'open':
+            time.sleep(self.probe_interval)
+            self.probes += 1
+            try:
+                self.probe()
+            except Exception as e:
+                print(f"Circuit breaker probe failed: {str(e)}")
+                continue
+            with self._lock:
+                self.state = 'closed'
+                self.opened_at = None
+                self.reason = None
+            print("Circuit breaker closed: probe succeeded")
+
+    def stats(self):
+        with self._lock:
+            self._expire(int(time.time()))
+            calls = sum(b[1] for b in self._buckets)
+            failures = sum(b[2] for b in self._buckets)
+            slow = sum(b[3] for b in self._buckets)
+        return {
+            'state': self.state,
+            'reason': self.reason,
+            'open_for': round(time.time() - self.opened_at, 1) if self.opened_at else None,
+            'window_calls': calls,
+            'window_failures': failures,
+            'window_slow': slow,
+            'trips': self.trips,
+            'rejected': self.rejected,
+            'probes': self.probes
+        }
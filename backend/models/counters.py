@@ -0,0 +1,204 @@
+import random
+import threading
+from datetime import datetime
+from flask import current_app, has_app_context
+from .deadline import call_timeout
+
+# 分片計數器：counters/<名稱>-<分片>，每個分片文件以欄位保存多個計數（欄位名稱即計數 key）
+COUNTER_COLLECTION = 'counters'
+# 計數器已由 reconcile_counters 建立初始值的標記：counters/_seeded
+SEED_MARKER = '_seeded'
+
+_seeded = False
+_seed_lock = threading.Lock()
+
+
+class ShardedCounter:
+    """分片計數器群組
+
+    寫入時隨機選一個分片遞增，分散同一文件的寫入頻率；讀取時以一次 get_all 加總所有分片。
+    遞增由呼叫端的 transaction / batch 寫入，與模型本身的寫入同時提交。
+    """
+
+    def __init__(self, name, shards=None):
+        self.name = name
+        self._shards = shards
+
+    @property
+    def shards(self):
+        if self._shards is not None:
+            return self._shards
+        return current_app.config.get('COUNTER_SHARDS', 10) if has_app_context() else 10
+
+    def _ref(self, db, index):
+        return db.collection(COUNTER_COLLECTION).document(f'{self.name}-{index}')
+
+    def increment(self, writer, db, deltas, shard=None):
+        """在 writer（transaction 或 batch）中遞增 deltas（key -> 增量）；增量為 0 的 key 略過"""
+        from firebase_admin import firestore
+
+        deltas = {key: amount for key, amount in deltas.items() if amount}
+        if not deltas:
+            return
+        index = random.randrange(self.shards) if shard is None else shard
+        data = {key: firestore.Increment(amount) for key, amount in deltas.items()}
+        data['counter'] = self.name
+        writer.set(self._ref(db, index), data, merge=True)
+
+    def values(self, db):
+        """所有分片加總後的 {key: 值}"""
+        refs = [self._ref(db, index) for index in range(self.shards)]
+        totals = {}
+        for doc in db.get_all(refs, timeout=call_timeout(COUNTER_COLLECTION)):
+            if not doc.exists:
+                continue
+            for key, value in (doc.to_dict() or {}).items():
+                if key != 'counter' and isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def reconcile(self, db, expected):
+        """將目前加總校正為 expected：差額寫入第 0 個分片（以遞增寫入，不覆蓋並行中的更新）
+
+        expected 沒有列出、但目前不為 0 的 key 會校正為 0。回傳 {key: 差額}。
+        """
+        current = self.values(db)
+        corrections = {key: expected.get(key, 0) - current.get(key, 0)
+                       for key in set(current) | set(expected)}
+        corrections = {key: amount for key, amount in corrections.items() if amount}
+        if corrections:
+            batch = db.batch()
+            self.increment(batch, db, corrections, shard=0)
+            batch.commit(timeout=call_timeout(COUNTER_COLLECTION))
+        return corrections
+
+
+# 產品數：'sub:<子分類 id>' 與 'main:<主分類 id>'
+CATEGORY_PRODUCT_COUNTS = ShardedCounter('category_products')
+# 文件數與檔案大小總和：'count'、'file_size'，以及 'public_count'、'public_file_size'
+DOCUMENT_STATS = ShardedCounter('document_stats')
+
+
+def _main_category_id(db, transaction, sub_category_id):
+    from .category import SubCategory
+
+    snapshot = db.collection(SubCategory.COLLECTION).document(str(sub_category_id)).get(
+        transaction=transaction, timeout=call_timeout(SubCategory.COLLECTION))
+    if not snapshot.exists:
+        return None
+    return (snapshot.to_dict() or {}).get('main_category_id')
+
+
+def category_product_deltas(db, transaction, old_sub_category_id, new_sub_category_id):
+    """產品從 old 子分類移到 new 子分類（新增時 old 為 None、刪除時 new 為 None）的計數變化
+
+    需在 transaction 寫入之前呼叫（會讀取子分類取得主分類）。
+    """
+    deltas = {}
+    if str(old_sub_category_id) == str(new_sub_category_id):
+        return deltas
+    for sub_category_id, amount in ((old_sub_category_id, -1), (new_sub_category_id, 1)):
+        if not sub_category_id or sub_category_id == 'None':
+            continue
+        deltas[f'sub:{sub_category_id}'] = deltas.get(f'sub:{sub_category_id}', 0) + amount
+        main_category_id = _main_category_id(db, transaction, sub_category_id)
+        if main_category_id:
+            deltas[f'main:{main_category_id}'] = deltas.get(f'main:{main_category_id}', 0) + amount
+    return deltas
+
+
+def is_public_document(data):
+    """統計上視為公開的文件：requires_login 未設定或為 False（reconcile 使用相同規則）"""
+    return not data.get('requires_login')
+
+
+def document_stat_deltas(old, new):
+    """文件資料由 old 變為 new（dict，新增時 old 為 None、刪除時 new 為 None）的統計變化"""
+    deltas = {}
+    for data, sign in ((old, -1), (new, 1)):
+        if data is None:
+            continue
+        size = data.get('file_size') or 0
+        deltas['count'] = deltas.get('count', 0) + sign
+        deltas['file_size'] = deltas.get('file_size', 0) + sign * size
+        if is_public_document(data):
+            deltas['public_count'] = deltas.get('public_count', 0) + sign
+            deltas['public_file_size'] = deltas.get('public_file_size', 0) + sign * size
+    return deltas
+
+
+def _aggregate(query, field=None):
+    """以聚合查詢計數或加總；舊版 client 則退回只讀取該欄位的串流"""
+    timeout = call_timeout(COUNTER_COLLECTION)
+    if field is None and hasattr(query, 'count'):
+        return int(query.count().get(timeout=timeout)[0][0].value)
+    if field is not None and hasattr(query, 'sum'):
+        return query.sum(field).get(timeout=timeout)[0][0].value or 0
+    docs = query.select([field] if field else []).stream(timeout=timeout)
+    if field is None:
+        return sum(1 for _ in docs)
+    return sum((doc.to_dict() or {}).get(field) or 0 for doc in docs)
+
+
+def reconcile_counters(db):
+    """以聚合查詢重新計算所有計數並校正漂移，回傳各計數器的校正值"""
+    from .category import SubCategory
+    from .document import Document
+    from .product import Product
+
+    products = db.collection(Product.COLLECTION)
+    expected = {}
+    for doc in db.collection(SubCategory.COLLECTION).stream(timeout=call_timeout(SubCategory.COLLECTION)):
+        count = _aggregate(products.where('sub_category_id', '==', doc.id))
+        main_category_id = (doc.to_dict() or {}).get('main_category_id')
+        expected[f'sub:{doc.id}'] = count
+        if main_category_id:
+            key = f'main:{main_category_id}'
+            expected[key] = expected.get(key, 0) + count
+
+    # 與 is_public_document 相同：沒有 requires_login 欄位的文件也算公開，因此以總數減去私人文件
+    documents = db.collection(Document.COLLECTION)
+    private = documents.where('requires_login', '==', True)
+    count = _aggregate(documents)
+    file_size = _aggregate(documents, 'file_size')
+    document_stats = {
+        'count': count,
+        'file_size': file_size,
+        'public_count': count - _aggregate(private),
+        'public_file_size': file_size - _aggregate(private, 'file_size'),
+    }
+    return {
+        CATEGORY_PRODUCT_COUNTS.name: CATEGORY_PRODUCT_COUNTS.reconcile(db, expected),
+        DOCUMENT_STATS.name: DOCUMENT_STATS.reconcile(db, document_stats),
+    }
+
+
+def ensure_counters_seeded(db):
+    """第一次使用計數器時以 reconcile_counters 建立初始值（既有資料不必手動執行 reconcile-counters）
+
+    以 transaction 寫入 SEED_MARKER，多個行程同時啟動時只有一個會執行；失敗時移除標記，下次使用時重試。
+    """
+    global _seeded
+    if _seeded:
+        return
+    with _seed_lock:
+        if _seeded:
+            return
+        from firebase_admin import firestore
+
+        marker = db.collection(COUNTER_COLLECTION).document(SEED_MARKER)
+
+        @firestore.transactional
+        def claim(transaction):
+            if marker.get(transaction=transaction, timeout=call_timeout(COUNTER_COLLECTION)).exists:
+                return False
+            transaction.set(marker, {'seeded_at': datetime.utcnow()})
+            return True
+
+        if claim(db.transaction()):
+            try:
+                reconcile_counters(db)
+            except Exception:
+                marker.delete(timeout=call_timeout(COUNTER_COLLECTION))
+                raise
+        _seeded = True
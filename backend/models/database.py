@@ -0,0 +1,33 @@
+from flask import current_app, has_app_context
+
+# 沒有 Flask app context 時使用的 Firestore client（背景工作、命令列腳本）
+_default_db = None
+
+
+def set_default_db(db):
+    """設定 app context 以外使用的 Firestore client（create_app 時設為 app.db）"""
+    global _default_db
+    _default_db = db
+
+
+def get_db():
+    """取得 Firestore 客戶端：app context 中為 current_app.db，否則為 set_default_db 設定的 client"""
+    if has_app_context():
+        return current_app.db
+    if _default_db is None:
+        raise RuntimeError("不在 app context 中，且尚未以 set_default_db 設定 Firestore client")
+    return _default_db
+
+
+def get_bucket():
+    """取得預設的 Storage bucket；先確保 Firestore client（及 firebase_admin.initialize_app）已建立
+
+    app.db 為延遲建立的 client，背景工作與未預熱（WARMUP_MODE=off）時可能還沒有初始化 Firebase。
+    """
+    from firebase_admin import storage
+
+    db = get_db()
+    resolve = getattr(type(db), 'resolve', None)
+    if resolve is not None:
+        resolve(db)
+    return storage.bucket()
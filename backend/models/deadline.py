@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app, has_app_context, has_request_context, request
+from .circuit import CIRCUIT_REJECTED_ENVIRON_KEY, DATA_CALL_ENVIRON_KEY, CircuitOpenError
+
+# 請求期限（time.monotonic() 值）在 WSGI environ 中的鍵；子請求沿用父請求的期限
+DEADLINE_ENVIRON_KEY = 'myweb.deadline'
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    """請求期限已過或 Firestore 呼叫逾時"""
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def _start_deadline():
+    seconds = current_app.config.get('REQUEST_DEADLINE', 0)
+    if seconds and DEADLINE_ENVIRON_KEY not in request.environ:
+        request.environ[DEADLINE_ENVIRON_KEY] = time.monotonic() + seconds
+
+
+def init_deadlines(app):
+    """每個請求開始時設定期限（REQUEST_DEADLINE 秒，0 表示不限制）"""
+    app.before_request(_start_deadline)
+
+
+def request_deadline():
+    """目前請求的期限；不在請求中或未設定時為 None"""
+    if has_request_context():
+        return request.environ.get(DEADLINE_ENVIRON_KEY)
+    return None
+
+
+def deadline_environ():
+    """傳給子請求的 environ，讓子請求沿用目前請求的期限"""
+    deadline = request_deadline()
+    return {DEADLINE_ENVIRON_KEY: deadline} if deadline is not None else {}
+
+
+def collection_policy(collection):
+    """collection 的呼叫設定（FIRESTORE_COLLECTION_POLICIES 覆寫預設值）"""
+    policy = {'timeout': _setting('FIRESTORE_TIMEOUT', 10), 'hedge': False}
+    policy.update(_setting('FIRESTORE_COLLECTION_POLICIES', {}).get(collection, {}))
+    return policy
+
+
+def _check_circuit():
+    if has_request_context():
+        request.environ[DATA_CALL_ENVIRON_KEY] = True
+    breaker = current_app.extensions.get('circuit_breaker') if has_app_context() else None
+    if breaker is None:
+        return
+    try:
+        breaker.check()
+    except CircuitOpenError:
+        if has_request_context():
+            request.environ[CIRCUIT_REJECTED_ENVIRON_KEY] = True
+        raise
+
+
+def call_timeout(collection):
+    """單次 Firestore 呼叫的逾時秒數：collection 設定與請求剩餘時間取較小者
+
+    熔斷器開啟時拋出 CircuitOpenError；請求期限已過時拋出 DeadlineExceeded，不再送出呼叫。
+    """
+    _check_circuit()
+    timeout = collection_policy(collection)['timeout']
+    deadline = request_deadline()
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"請求期限已過，取消 {collection} 的讀寫")
+        timeout = min(timeout, remaining)
+    return timeout
+
+
+class LatencyTracker:
+    """最近的單一文件讀取延遲，用於決定對沖延遲（p95）"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 20:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def to_dict(self):
+        p95 = self.percentile(0.95)
+        return {
+            'calls': self.calls,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'p95_ms': round(p95 * 1000, 2) if p95 is not None else None
+        }
+
+
+def _tracker(collection):
+    tracker = _trackers.get(collection)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.setdefault(collection, LatencyTracker())
+    return tracker
+
+
+def hedge_stats():
+    return {collection: tracker.to_dict() for collection, tracker in sorted(_trackers.items())}
+
+
+def _get_hedge_pool():
+    """對沖讀取共用的有界執行緒池"""
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=_setting('HEDGE_WORKERS', 16),
+                                                 thread_name_prefix='hedged-read')
+    return _hedge_pool
+
+
+def hedged_call(collection, fn):
+    """對冪等讀取送出對沖請求：第一個呼叫超過近期 p95 仍未回應時再送一次，採用先完成的結果
+
+    fn(timeout) 在執行緒池中執行，不能依賴 Flask context。
+    樣本不足時以 HEDGE_DEFAULT_DELAY 為延遲；兩次都失敗時拋出最後的例外。
+    """
+    timeout = call_timeout(collection)
+    tracker = _tracker(collection)
+    tracker.calls += 1
+    deadline = time.monotonic() + timeout
+    pool = _get_hedge_pool()
+
+    def attempt(hedge):
+        started = time.monotonic()
+        result = fn(max(0.001, deadline - started))
+        tracker.add(time.monotonic() - started)
+        return result, hedge
+
+    delay = tracker.percentile(0.95)
+    if delay is None:
+        delay = _setting('HEDGE_DEFAULT_DELAY', 0.05)
+    delay = max(delay, _setting('HEDGE_MIN_DELAY', 0.005))
+
+    pending = {pool.submit(attempt, False)}
+    done, pending = wait(pending, timeout=min(delay, timeout))
+    if not done:
+        tracker.hedged += 1
+        pending.add(pool.submit(attempt, True))
+
+    error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                result, hedge = future.result()
+                if hedge:
+                    tracker.hedge_wins += 1
+                return result
+            error = future.exception()
+        if not pending:
+            raise error
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{collection} 的讀取超過 {timeout:.2f} 秒")
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
@@ -1,12 +1,20 @@
 from datetime import datetime
-from flask import current_app
-from firebase_admin import storage
+from .counters import DOCUMENT_STATS, document_stat_deltas
+from .database import get_bucket, get_db
+from .deadline import call_timeout
+from .hooks import notify
+from .record import Record, record_slots
+from .tombstones import write_tombstone
+from utils.jobs import enqueue
 import uuid
 import os
 
-class Document:
+class Document(Record):
     """文檔模型 - 使用 Firebase Storage"""
     COLLECTION = 'documents'
+    FIELDS = (('title', None), ('file_url', None), ('file_size', None), ('file_type', None),
+              ('requires_login', False))
+    __slots__ = record_slots(FIELDS)
 
     def __init__(self, title=None, file_url=None, file_size=None,
                  file_type=None, requires_login=False, doc_id=None):
@@ -16,20 +24,18 @@ class Document:
         self.file_size = file_size
         self.file_type = file_type
         self.requires_login = requires_login
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self._touch()
 
     @staticmethod
     def get_db():
-        return current_app.db
+        return get_db()
 
     @classmethod
     def get(cls, doc_id):
         """根據ID獲取文檔"""
         if not doc_id:
             return None
-        db = cls.get_db()
-        doc = db.collection(cls.COLLECTION).document(str(doc_id)).get()
+        doc = cls._get_document(doc_id)
         if doc.exists:
             return cls._from_doc(doc)
         return None
@@ -37,40 +43,17 @@ class Document:
     @classmethod
     def filter_by(cls, **kwargs):
         """根據條件查詢文檔"""
-        db = cls.get_db()
-        query = db.collection(cls.COLLECTION)
-
-        for key, value in kwargs.items():
-            query = query.where(key, '==', value)
-
-        docs = query.stream()
-        return [cls._from_doc(doc) for doc in docs]
+        return cls.query().filter_by(**kwargs).all()
 
     @classmethod
     def all(cls):
         """獲取所有文檔"""
-        db = cls.get_db()
-        docs = db.collection(cls.COLLECTION).stream()
-        return [cls._from_doc(doc) for doc in docs]
-
-    @classmethod
-    def _from_doc(cls, doc):
-        """從 Firestore 文檔創建對象"""
-        data = doc.to_dict()
-        obj = cls.__new__(cls)
-        obj.id = doc.id
-        obj.title = data.get('title')
-        obj.file_url = data.get('file_url')
-        obj.file_size = data.get('file_size')
-        obj.file_type = data.get('file_type')
-        obj.requires_login = data.get('requires_login', False)
-        obj.created_at = data.get('created_at')
-        obj.updated_at = data.get('updated_at')
-        return obj
+        return cls.query().all()
 
     def save(self):
-        """儲存文檔"""
+        """儲存文檔（與文件統計在同一個 transaction 更新）"""
         try:
+            from firebase_admin import firestore
             db = self.get_db()
             data = {
                 'title': self.title,
@@ -80,14 +63,27 @@ class Document:
                 'requires_login': self.requires_login,
                 'updated_at': datetime.utcnow()
             }
-
-            if self.id:
-                db.collection(self.COLLECTION).document(str(self.id)).update(data)
-            else:
-                data['created_at'] = self.created_at
-                _, doc_ref = db.collection(self.COLLECTION).add(data)
-                self.id = doc_ref.id
-
+            collection = db.collection(self.COLLECTION)
+            ref = collection.document(str(self.id)) if self.id else collection.document()
+
+            @firestore.transactional
+            def write(transaction):
+                old = None
+                if self.id:
+                    snapshot = ref.get(transaction=transaction, timeout=call_timeout(self.COLLECTION))
+                    if not snapshot.exists:
+                        raise ValueError(f"找不到文檔 {self.id}")
+                    old = snapshot.to_dict() or {}
+                if self.id:
+                    transaction.update(ref, data)
+                else:
+                    transaction.set(ref, dict(data, created_at=self.created_at))
+                DOCUMENT_STATS.increment(transaction, db, document_stat_deltas(old, data))
+
+            write(db.transaction())
+            self.id = ref.id
+
+            notify(self.COLLECTION, 'save', self)
             return True
         except Exception as e:
             print(f"Error saving document: {str(e)}")
@@ -102,7 +98,20 @@ class Document:
                 if self.file_url:
                     self.delete_from_storage()
 
-                db.collection(self.COLLECTION).document(str(self.id)).delete()
+                from firebase_admin import firestore
+                ref = db.collection(self.COLLECTION).document(str(self.id))
+
+                @firestore.transactional
+                def remove(transaction):
+                    snapshot = ref.get(transaction=transaction, timeout=call_timeout(self.COLLECTION))
+                    if not snapshot.exists:
+                        return
+                    write_tombstone(transaction, db, self.COLLECTION, self.id)
+                    DOCUMENT_STATS.increment(transaction, db,
+                                             document_stat_deltas(snapshot.to_dict() or {}, None))
+
+                remove(db.transaction())
+                notify(self.COLLECTION, 'delete', self)
                 return True
             return False
         except Exception as e:
@@ -110,29 +119,26 @@ class Document:
             return False
 
     def upload_to_storage(self, file_data, filename):
-        """上傳文件到 Firebase Storage"""
+        """在背景上傳文件到 Firebase Storage（路徑先決定，file_url 立即可寫入紀錄）"""
         try:
-            bucket = storage.bucket()
+            bucket = get_bucket()
             ext = os.path.splitext(filename)[1]
             storage_path = f'documents/{uuid.uuid4()}{ext}'
-            blob = bucket.blob(storage_path)
-            blob.upload_from_string(file_data, content_type=self.file_type)
-            blob.make_public()
+            enqueue('storage.upload', {'path': storage_path, 'content_type': self.file_type},
+                    file_data, idempotency_key=f'upload-{storage_path}')
 
-            self.file_url = blob.public_url
+            self.file_url = bucket.blob(storage_path).public_url
             return True
         except Exception as e:
             print(f"Error uploading document: {str(e)}")
             return False
 
     def delete_from_storage(self):
-        """從 Firebase Storage 刪除文件"""
+        """在背景從 Firebase Storage 刪除文件"""
         try:
             if self.file_url:
-                bucket = storage.bucket()
-                path = self.file_url.split(bucket.name + '/')[-1].split('?')[0]
-                blob = bucket.blob(path)
-                blob.delete()
+                enqueue('storage.delete', {'url': self.file_url},
+                        idempotency_key=f'delete-{self.file_url}')
             return True
         except Exception as e:
             print(f"Error deleting from storage: {str(e)}")
@@ -0,0 +1,36 @@
+# 模型變更監聽：collection -> [fn(action, obj)]，action 為 'save' 或 'delete'
+_LISTENERS = {}
+# 讀取副本套用遠端變更後的監聽：collection -> [fn()]
+_REPLICA_LISTENERS = {}
+
+
+def on_change(collection, fn):
+    """註冊某個 collection 的變更監聽"""
+    listeners = _LISTENERS.setdefault(collection, [])
+    if fn not in listeners:
+        listeners.append(fn)
+
+
+def notify(collection, action, obj):
+    """通知監聽者；監聽者的錯誤不影響寫入結果"""
+    for fn in list(_LISTENERS.get(collection, ())):
+        try:
+            fn(action, obj)
+        except Exception as e:
+            print(f"Error in {collection} change listener: {str(e)}")
+
+
+def on_replicated(collection, fn):
+    """註冊讀取副本套用某個 collection 的變更後呼叫的監聽"""
+    listeners = _REPLICA_LISTENERS.setdefault(collection, [])
+    if fn not in listeners:
+        listeners.append(fn)
+
+
+def notify_replicated(collection):
+    """讀取副本已套用變更（寫入後副本追上之前讀到的可能是舊資料）"""
+    for fn in list(_REPLICA_LISTENERS.get(collection, ())):
+        try:
+            fn()
+        except Exception as e:
+            print(f"Error in {collection} replica listener: {str(e)}")
@@ -1,11 +1,21 @@
 from datetime import datetime
-from flask import current_app
-from firebase_admin import storage
-import uuid
-
-class Product:
+from .blobs import enqueue_release, enqueue_store
+from .counters import CATEGORY_PRODUCT_COUNTS, category_product_deltas
+from .database import get_db
+from .deadline import call_timeout
+from .hooks import notify
+from .record import Record, record_slots
+from .tombstones import delete_with_tombstone, write_tombstone
+from utils.jobs import enqueue
+from utils.singleflight import coalesce_method
+
+class Product(Record):
     """產品模型"""
     COLLECTION = 'products'
+    STRING_FIELDS = ('sub_category_id',)
+    FIELDS = (('sub_category_id', None), ('name', None), ('model', None), ('price', None),
+              ('description', None), ('specifications', None), ('is_featured', False))
+    __slots__ = record_slots(FIELDS)
 
     def __init__(self, sub_category_id=None, name=None, model=None,
                  price=None, description=None, specifications=None,
@@ -18,20 +28,19 @@ class Product:
         self.description = description
         self.specifications = specifications
         self.is_featured = is_featured
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self._touch()
 
     @staticmethod
     def get_db():
-        return current_app.db
+        return get_db()
 
     @classmethod
+    @coalesce_method
     def get(cls, product_id):
         """根據ID獲取產品"""
         if not product_id:
             return None
-        db = cls.get_db()
-        doc = db.collection(cls.COLLECTION).document(str(product_id)).get()
+        doc = cls._get_document(product_id)
         if doc.exists:
             return cls._from_doc(doc)
         return None
@@ -39,44 +48,18 @@ class Product:
     @classmethod
     def filter_by(cls, **kwargs):
         """根據條件查詢產品 - 返回列表"""
-        db = cls.get_db()
-        query = db.collection(cls.COLLECTION)
-
-        for key, value in kwargs.items():
-            if key == 'sub_category_id':
-                query = query.where(key, '==', str(value))
-            else:
-                query = query.where(key, '==', value)
-
-        docs = query.stream()
-        return [cls._from_doc(doc) for doc in docs]
+        return cls.query().filter_by(**kwargs).all()
 
     @classmethod
     def filter_by_subcategories(cls, sub_category_ids):
-        """根據多個子分類ID查詢產品"""
-        db = cls.get_db()
-        # Firestore 的 in 查詢限制為10個元素
-        str_ids = [str(sid) for sid in sub_category_ids]
-
-        if not str_ids:
-            return []
-
-        products = []
-        # 分批查詢,每批最多10個
-        for i in range(0, len(str_ids), 10):
-            batch = str_ids[i:i+10]
-            query = db.collection(cls.COLLECTION).where('sub_category_id', 'in', batch)
-            docs = query.stream()
-            products.extend([cls._from_doc(doc) for doc in docs])
-
-        return products
+        """根據多個子分類ID查詢產品（in 查詢自動拆批並行）"""
+        return cls.query().all_in('sub_category_id', sub_category_ids)
 
     @classmethod
     def search(cls, search_query):
         """搜尋產品 - 注意: Firestore 不支持 LIKE 查詢,需要全文檢索"""
         # 這是簡化版本,實際應用建議使用 Algolia 或 Elasticsearch
-        db = cls.get_db()
-        all_docs = db.collection(cls.COLLECTION).stream()
+        all_docs = cls.query()._documents()
 
         results = []
         search_lower = search_query.lower()
@@ -87,37 +70,26 @@ class Product:
             if (search_lower in str(data.get('name', '')).lower() or
                 search_lower in str(data.get('model', '')).lower() or
                 search_lower in str(data.get('description', '')).lower()):
-                results.append(cls._from_doc(doc))
+                results.append(cls._from_doc(doc, data))
 
         return results
 
     @classmethod
     def limit(cls, limit_num):
         """限制查詢結果數量"""
-        db = cls.get_db()
-        docs = db.collection(cls.COLLECTION).limit(limit_num).stream()
-        return [cls._from_doc(doc) for doc in docs]
+        return cls.query().limit(limit_num).all()
 
     @classmethod
-    def _from_doc(cls, doc):
+    def _from_doc(cls, doc, data=None):
         """從 Firestore 文檔創建對象"""
-        data = doc.to_dict()
-        obj = cls.__new__(cls)
-        obj.id = doc.id
-        obj.sub_category_id = data.get('sub_category_id')
-        obj.name = data.get('name')
-        obj.model = data.get('model')
-        obj.price = float(data.get('price', 0)) if data.get('price') else None
-        obj.description = data.get('description')
-        obj.specifications = data.get('specifications')
-        obj.is_featured = data.get('is_featured', False)
-        obj.created_at = data.get('created_at')
-        obj.updated_at = data.get('updated_at')
+        obj = super()._from_doc(doc, data)
+        obj.price = float(obj.price) if obj.price else None
         return obj
 
     def save(self):
-        """儲存產品"""
+        """儲存產品（與分類產品數在同一個 transaction 更新）"""
         try:
+            from firebase_admin import firestore
             db = self.get_db()
             data = {
                 'sub_category_id': str(self.sub_category_id),
@@ -129,14 +101,29 @@ class Product:
                 'is_featured': self.is_featured,
                 'updated_at': datetime.utcnow()
             }
-
-            if self.id:
-                db.collection(self.COLLECTION).document(str(self.id)).update(data)
-            else:
-                data['created_at'] = self.created_at
-                _, doc_ref = db.collection(self.COLLECTION).add(data)
-                self.id = doc_ref.id
-
+            collection = db.collection(self.COLLECTION)
+            ref = collection.document(str(self.id)) if self.id else collection.document()
+
+            @firestore.transactional
+            def write(transaction):
+                old_sub_category_id = None
+                if self.id:
+                    snapshot = ref.get(transaction=transaction, timeout=call_timeout(self.COLLECTION))
+                    if not snapshot.exists:
+                        raise ValueError(f"找不到產品 {self.id}")
+                    old_sub_category_id = (snapshot.to_dict() or {}).get('sub_category_id')
+                deltas = category_product_deltas(db, transaction, old_sub_category_id,
+                                                 data['sub_category_id'])
+                if self.id:
+                    transaction.update(ref, data)
+                else:
+                    transaction.set(ref, dict(data, created_at=self.created_at))
+                CATEGORY_PRODUCT_COUNTS.increment(transaction, db, deltas)
+
+            write(db.transaction())
+            self.id = ref.id
+
+            notify(self.COLLECTION, 'save', self)
             return True
         except Exception as e:
             print(f"Error saving product: {str(e)}")
@@ -147,12 +134,24 @@ class Product:
         try:
             if self.id:
                 db = self.get_db()
-                # 刪除相關圖片
-                images = ProductImage.filter_by(product_id=self.id)
-                for image in images:
-                    image.delete()
-
-                db.collection(self.COLLECTION).document(str(self.id)).delete()
+                from firebase_admin import firestore
+                ref = db.collection(self.COLLECTION).document(str(self.id))
+
+                @firestore.transactional
+                def remove(transaction):
+                    snapshot = ref.get(transaction=transaction, timeout=call_timeout(self.COLLECTION))
+                    if not snapshot.exists:
+                        return
+                    deltas = category_product_deltas(
+                        db, transaction, (snapshot.to_dict() or {}).get('sub_category_id'), None)
+                    write_tombstone(transaction, db, self.COLLECTION, self.id)
+                    CATEGORY_PRODUCT_COUNTS.increment(transaction, db, deltas)
+
+                remove(db.transaction())
+                # 相關圖片在背景刪除
+                enqueue('cascade.product_images', {'product_id': self.id},
+                        idempotency_key=f'cascade-product-images-{self.id}')
+                notify(self.COLLECTION, 'delete', self)
                 return True
             return False
         except Exception as e:
@@ -175,9 +174,12 @@ class Product:
         }
 
 
-class ProductImage:
+class ProductImage(Record):
     """產品圖片模型 - 使用 Firebase Storage"""
     COLLECTION = 'product_images'
+    STRING_FIELDS = ('product_id',)
+    FIELDS = (('product_id', None), ('image_url', None), ('image_type', None), ('is_main', False))
+    __slots__ = record_slots(FIELDS)
 
     def __init__(self, product_id=None, image_url=None, image_type=None,
                  is_main=False, image_id=None):
@@ -186,50 +188,27 @@ class ProductImage:
         self.image_url = image_url  # 改用 URL 而非 BLOB
         self.image_type = image_type
         self.is_main = is_main
-        self.created_at = datetime.utcnow()
+        self._touch()
 
     @staticmethod
     def get_db():
-        return current_app.db
+        return get_db()
 
     @classmethod
     def get(cls, image_id):
         """根據ID獲取圖片"""
         if not image_id:
             return None
-        db = cls.get_db()
-        doc = db.collection(cls.COLLECTION).document(str(image_id)).get()
+        doc = cls._get_document(image_id)
         if doc.exists:
             return cls._from_doc(doc)
         return None
 
     @classmethod
+    @coalesce_method
     def filter_by(cls, **kwargs):
         """根據條件查詢圖片"""
-        db = cls.get_db()
-        query = db.collection(cls.COLLECTION)
-
-        for key, value in kwargs.items():
-            if key == 'product_id':
-                query = query.where(key, '==', str(value))
-            else:
-                query = query.where(key, '==', value)
-
-        docs = query.stream()
-        return [cls._from_doc(doc) for doc in docs]
-
-    @classmethod
-    def _from_doc(cls, doc):
-        """從 Firestore 文檔創建對象"""
-        data = doc.to_dict()
-        obj = cls.__new__(cls)
-        obj.id = doc.id
-        obj.product_id = data.get('product_id')
-        obj.image_url = data.get('image_url')
-        obj.image_type = data.get('image_type')
-        obj.is_main = data.get('is_main', False)
-        obj.created_at = data.get('created_at')
-        return obj
+        return cls.query().filter_by(**kwargs).all()
 
     def save(self):
         """儲存圖片信息"""
@@ -239,16 +218,18 @@ class ProductImage:
                 'product_id': str(self.product_id),
                 'image_url': self.image_url,
                 'image_type': self.image_type,
-                'is_main': self.is_main
+                'is_main': self.is_main,
+                'updated_at': datetime.utcnow()
             }
 
             if self.id:
-                db.collection(self.COLLECTION).document(str(self.id)).update(data)
+                db.collection(self.COLLECTION).document(str(self.id)).update(data, timeout=call_timeout(self.COLLECTION))
             else:
                 data['created_at'] = self.created_at
-                _, doc_ref = db.collection(self.COLLECTION).add(data)
+                _, doc_ref = db.collection(self.COLLECTION).add(data, timeout=call_timeout(self.COLLECTION))
                 self.id = doc_ref.id
 
+            notify(self.COLLECTION, 'save', self)
             return True
         except Exception as e:
             print(f"Error saving image: {str(e)}")
@@ -263,7 +244,8 @@ class ProductImage:
                 if self.image_url:
                     self.delete_from_storage()
 
-                db.collection(self.COLLECTION).document(str(self.id)).delete()
+                delete_with_tombstone(db, self.COLLECTION, self.id)
+                notify(self.COLLECTION, 'delete', self)
                 return True
             return False
         except Exception as e:
@@ -271,15 +253,9 @@ class ProductImage:
             return False
 
     def upload_to_storage(self, image_data, content_type):
-        """上傳圖片到 Firebase Storage"""
+        """在背景上傳圖片到 Firebase Storage（內容定址：相同內容只存一份，URL 可永久快取）"""
         try:
-            bucket = storage.bucket()
-            filename = f'products/{self.product_id}/{uuid.uuid4()}.jpg'
-            blob = bucket.blob(filename)
-            blob.upload_from_string(image_data, content_type=content_type)
-            blob.make_public()
-
-            self.image_url = blob.public_url
+            self.image_url = enqueue_store(image_data, content_type)
             self.image_type = content_type
             return True
         except Exception as e:
@@ -287,14 +263,10 @@ class ProductImage:
             return False
 
     def delete_from_storage(self):
-        """從 Firebase Storage 刪除圖片"""
+        """在背景釋放圖片參照；沒有其他紀錄使用相同內容時才從 Firebase Storage 刪除"""
         try:
             if self.image_url:
-                bucket = storage.bucket()
-                # 從 URL 提取檔案路徑
-                path = self.image_url.split(bucket.name + '/')[-1].split('?')[0]
-                blob = bucket.blob(path)
-                blob.delete()
+                enqueue_release(self.image_url, self.COLLECTION, self.id, self.updated_at)
             return True
         except Exception as e:
             print(f"Error deleting from storage: {str(e)}")
@@ -308,5 +280,6 @@ class ProductImage:
             'image_url': self.image_url,
             'image_type': self.image_type,
             'is_main': self.is_main,
-            'created_at': self.created_at.isoformat() if isinstance(self.created_at, datetime) else self.created_at
+            'created_at': self.created_at.isoformat() if isinstance(self.created_at, datetime) else self.created_at,
+            'updated_at': self.updated_at.isoformat() if isinstance(self.updated_at, datetime) else self.updated_at
         }
\ No newline at end of file
@@ -0,0 +1,452 @@
+import base64
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from datetime import datetime
+from flask import current_app, has_app_context, has_request_context, request
+from .deadline import call_timeout, collection_policy, hedged_call
+from .replica import get_replica
+
+EQUALITY_OPERATORS = ('==', 'in', 'array-contains', 'array-contains-any')
+RANGE_OPERATORS = ('<', '<=', '>', '>=', '!=', 'not-in')
+OPERATORS = EQUALITY_OPERATORS + RANGE_OPERATORS
+LIST_OPERATORS = ('in', 'not-in', 'array-contains-any')
+DOCUMENT_ID = '__name__'
+# 批次請求（/api/batch）放在 WSGI environ 中、供各子請求共用的模型快取
+REQUEST_CACHE_ENVIRON_KEY = 'myweb.model_cache'
+
+_in_query_pool = None
+_in_query_pool_lock = threading.Lock()
+
+
+class QueryTimeout(TimeoutError):
+    """查詢超過整體期限"""
+
+
+class RequestModelCache:
+    """單一批次請求內共用的文件快照快取（子請求並行讀取相同文件時只查詢一次）"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        """同一個 key 同時未命中時只由第一個呼叫者執行 loader，其他呼叫者等待同一個結果"""
+        with self._lock:
+            future = self._data.get(key)
+            if future is not None:
+                self.hits += 1
+                loading = False
+            else:
+                self.misses += 1
+                future = self._data[key] = Future()
+                loading = True
+        if not loading:
+            return future.result()
+        try:
+            future.set_result(loader())
+        except BaseException as e:
+            # 失敗不快取：等待中的呼叫者收到相同例外，之後的呼叫重新讀取
+            with self._lock:
+                self._data.pop(key, None)
+            future.set_exception(e)
+            raise
+        return future.result()
+
+
+def _request_cache():
+    if has_request_context():
+        return request.environ.get(REQUEST_CACHE_ENVIRON_KEY)
+    return None
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def _get_in_query_pool():
+    """IN 查詢共用的有界執行緒池"""
+    global _in_query_pool
+    if _in_query_pool is None:
+        with _in_query_pool_lock:
+            if _in_query_pool is None:
+                _in_query_pool = ThreadPoolExecutor(
+                    max_workers=_setting('IN_QUERY_WORKERS', 8),
+                    thread_name_prefix='in-query'
+                )
+    return _in_query_pool
+
+
+def _sort_models(items, orders):
+    """依 orders 在記憶體中排序模型物件（None 排最後）"""
+    for field, direction in reversed(orders):
+        def key(obj, field=field):
+            value = obj.id if field == DOCUMENT_ID else getattr(obj, field, None)
+            return (value is None, value) if direction == 'ASCENDING' else (value is not None, value)
+        items.sort(key=key, reverse=(direction == 'DESCENDING'))
+    return items
+
+
+def execute_in_chunks(query, field, values, dedup=True, timeout=None):
+    """將 in 查詢依 Firestore 上限拆批，於執行緒池並行執行後合併
+
+    query 上的其他條件、排序與 limit 會套用到每一批，合併後再依相同排序整理並截斷。
+    超過 timeout（預設 IN_QUERY_TIMEOUT）秒仍未完成時拋出 QueryTimeout。
+    """
+    values = list(dict.fromkeys(query._coerce(field, list(values))))
+    if not values:
+        return []
+
+    # 讀取副本沒有 in 數量限制，直接一次查詢
+    replica = get_replica(query.collection)
+    whole = query.where(field, 'in', values)
+    if replica is not None and replica.can_serve(whole):
+        return [query.model._from_doc(doc) for doc in replica.execute(whole)]
+
+    chunk_size = _setting('FIRESTORE_IN_LIMIT', 30)
+    timeout = timeout if timeout is not None else _setting('IN_QUERY_TIMEOUT', 10)
+    # 每批 RPC 也受 collection 逾時與請求期限限制
+    rpc_timeout = min(timeout, call_timeout(query.collection))
+    db = query.model.get_db()
+    query._log_explain()
+
+    # 在呼叫端執行緒建好查詢，worker 只負責 RPC，不需要 Flask context
+    chunks = [query.where(field, 'in', values[i:i + chunk_size])._build(db)
+              for i in range(0, len(values), chunk_size)]
+    if len(chunks) == 1:
+        docs_per_chunk = [list(chunks[0].stream(timeout=rpc_timeout))]
+    else:
+        deadline = time.monotonic() + rpc_timeout
+        pool = _get_in_query_pool()
+        futures = [pool.submit(lambda q=q: list(q.stream(timeout=rpc_timeout))) for q in chunks]
+        done, pending = wait(futures, timeout=max(0, deadline - time.monotonic()),
+                             return_when=FIRST_EXCEPTION)
+        for future in done:
+            if future.exception() is not None:
+                for other in pending:
+                    other.cancel()
+                raise future.exception()
+        if pending:
+            for future in pending:
+                future.cancel()
+            raise QueryTimeout(f"{query.collection} 的 in 查詢超過 {rpc_timeout:.2f} 秒")
+        docs_per_chunk = [future.result() for future in futures]
+
+    results, seen = [], set()
+    for docs in docs_per_chunk:
+        for doc in docs:
+            if dedup:
+                if doc.id in seen:
+                    continue
+                seen.add(doc.id)
+            results.append(query.model._from_doc(doc))
+
+    if len(chunks) > 1 and query.orders:
+        _sort_models(results, query.orders)
+    if query.limit_count is not None:
+        results = results[:query.limit_count]
+    return results
+
+
+def encode_cursor(values):
+    """將排序欄位值編碼為不透明的分頁游標"""
+    def _default(value):
+        if isinstance(value, datetime):
+            return {'$dt': value.isoformat()}
+        raise TypeError(f"無法編碼游標值: {value!r}")
+    raw = json.dumps(values, default=_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解碼分頁游標，格式錯誤時拋出 ValueError"""
+    def _hook(obj):
+        if set(obj) == {'$dt'}:
+            return datetime.fromisoformat(obj['$dt'])
+        return obj
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')), object_hook=_hook)
+    except Exception:
+        raise ValueError("無效的分頁游標")
+
+
+class Query:
+    """可串接的 Firestore 查詢：where / order_by / limit / 游標分頁 / count / explain"""
+
+    def __init__(self, model):
+        self.model = model
+        self.collection = model.COLLECTION
+        self.filters = []      # (field, op, value)
+        self.orders = []       # (field, 'ASCENDING' | 'DESCENDING')
+        self.limit_count = None
+        self.cursor = None     # {field: value}，含 __name__
+
+    def _clone(self):
+        other = Query(self.model)
+        other.filters = list(self.filters)
+        other.orders = list(self.orders)
+        other.limit_count = self.limit_count
+        other.cursor = dict(self.cursor) if self.cursor else None
+        return other
+
+    def _coerce(self, field, value):
+        if field in getattr(self.model, 'STRING_FIELDS', ()):
+            if isinstance(value, (list, tuple, set)):
+                return [str(v) for v in value]
+            return str(value)
+        return value
+
+    # ---- 條件 ----
+
+    def where(self, field, op, value):
+        if op not in OPERATORS:
+            raise ValueError(f"不支援的查詢運算子: {op}")
+        if op in LIST_OPERATORS:
+            value = list(value)
+        query = self._clone()
+        query.filters.append((field, op, self._coerce(field, value)))
+        return query
+
+    def filter_by(self, **kwargs):
+        """等值條件（AND）"""
+        query = self
+        for key, value in kwargs.items():
+            query = query.where(key, '==', value)
+        return query
+
+    def order_by(self, field, descending=False):
+        """排序；field 以 '-' 開頭表示遞減"""
+        if field.startswith('-'):
+            field, descending = field[1:], True
+        query = self._clone()
+        query.orders.append((field, 'DESCENDING' if descending else 'ASCENDING'))
+        return query
+
+    def limit(self, count):
+        query = self._clone()
+        query.limit_count = int(count)
+        return query
+
+    def start_after(self, cursor):
+        """從 page() 回傳的游標之後繼續"""
+        query = self._clone()
+        query.cursor = decode_cursor(cursor) if cursor else None
+        return query
+
+    # ---- 執行 ----
+
+    def _paging_orders(self):
+        orders = list(self.orders)
+        if not any(field == DOCUMENT_ID for field, _ in orders):
+            direction = orders[-1][1] if orders else 'ASCENDING'
+            orders.append((DOCUMENT_ID, direction))
+        return orders
+
+    def _build(self, db=None, with_cursor=True):
+        db = db if db is not None else self.model.get_db()
+        query = db.collection(self.collection)
+        for field, op, value in self.filters:
+            query = query.where(field, op, value)
+        orders = self._paging_orders() if (with_cursor and self.cursor) else self.orders
+        for field, direction in orders:
+            query = query.order_by(field, direction=direction)
+        if with_cursor and self.cursor:
+            query = query.start_after({field: self.cursor.get(field) for field, _ in orders})
+        if self.limit_count is not None:
+            query = query.limit(self.limit_count)
+        return query
+
+    def _log_explain(self):
+        if has_app_context() and current_app.config.get('QUERY_EXPLAIN'):
+            plan = self.explain()
+            if plan['needs_composite_index']:
+                print(f"[query] {self.collection} needs composite index: {plan['index']['fields']}")
+
+    def _cache_key(self):
+        return ('query', self.collection, repr(self.filters), tuple(self.orders),
+                self.limit_count, repr(self.cursor))
+
+    def _documents(self):
+        """文件快照來源：批次請求快取 → 讀取副本 → Firestore"""
+        cache = _request_cache()
+        if cache is not None:
+            return iter(cache.get_or_load(self._cache_key(), lambda: list(self._load_documents())))
+        return self._load_documents()
+
+    def _load_documents(self):
+        replica = get_replica(self.collection)
+        if replica is not None and replica.can_serve(self):
+            return replica.execute(self)
+        self._log_explain()
+        return self._build().stream(timeout=call_timeout(self.collection))
+
+    def stream(self):
+        for doc in self._documents():
+            yield self.model._from_doc(doc)
+
+    def all(self):
+        return list(self.stream())
+
+    def raw(self):
+        """原始文件資料（dict，含 id），保留模型未定義的欄位"""
+        for doc in self._documents():
+            yield dict(doc.to_dict() or {}, id=doc.id)
+
+    def all_in(self, field, values, dedup=True, timeout=None):
+        """field in values，自動拆批並行查詢（見 execute_in_chunks）"""
+        return execute_in_chunks(self, field, values, dedup=dedup, timeout=timeout)
+
+    def first(self):
+        for obj in self.limit(1).stream():
+            return obj
+        return None
+
+    def page(self, page_size):
+        """游標分頁（不使用 offset）；回傳 (items, next_cursor)"""
+        query = self._clone()
+        query.orders = query._paging_orders()
+        query.limit_count = int(page_size)
+        query._log_explain()
+
+        items, last_doc = [], None
+        for doc in query._build().stream(timeout=call_timeout(self.collection)):
+            items.append(self.model._from_doc(doc))
+            last_doc = doc
+
+        next_cursor = None
+        if last_doc is not None and len(items) == page_size:
+            data = last_doc.to_dict() or {}
+            next_cursor = encode_cursor({
+                field: (last_doc.id if field == DOCUMENT_ID else data.get(field))
+                for field, _ in query.orders
+            })
+        return items, next_cursor
+
+    def count(self):
+        """使用 Firestore 聚合查詢計數；舊版 client 則退回只讀 ID 的串流"""
+        replica = get_replica(self.collection)
+        if replica is not None and replica.can_serve(self):
+            return replica.count(self)
+        query = self._build()
+        timeout = call_timeout(self.collection)
+        if hasattr(query, 'count'):
+            result = query.count().get(timeout=timeout)
+            return int(result[0][0].value)
+        return sum(1 for _ in query.select([]).stream(timeout=timeout))
+
+    # ---- 索引分析 ----
+
+    def explain(self):
+        """說明查詢需要的索引（單欄位自動索引或需手動建立的複合索引）"""
+        equality = []
+        contains = []
+        ranges = []
+        for field, op, _ in self.filters:
+            if op in ('array-contains', 'array-contains-any'):
+                contains.append(field)
+            elif op in EQUALITY_OPERATORS:
+                if field not in equality:
+                    equality.append(field)
+            elif field not in ranges:
+                ranges.append(field)
+        orders = [(f, d) for f, d in self.orders if f != DOCUMENT_ID]
+
+        warnings = []
+        if ranges and orders and orders[0][0] != ranges[0]:
+            warnings.append(f"不等式欄位 {ranges[0]} 必須是第一個排序欄位")
+
+        needs_index = bool(
+            len(ranges) > 1 or
+            len(orders) > 1 or
+            (contains and (equality or ranges or orders)) or
+            (equality and (ranges or orders)) or
+            (ranges and orders and orders[0][0] != ranges[0])
+        )
+
+        index = None
+        if needs_index:
+            fields = [{'fieldPath': f, 'arrayConfig': 'CONTAINS'} for f in contains]
+            fields += [{'fieldPath': f, 'order': 'ASCENDING'} for f in equality]
+            seen = set(contains) | set(equality)
+            for field, direction in orders:
+                if field not in seen:
+                    fields.append({'fieldPath': field, 'order': direction})
+                    seen.add(field)
+            for field in ranges:
+                if field not in seen:
+                    fields.append({'fieldPath': field, 'order': 'ASCENDING'})
+                    seen.add(field)
+            index = {'collectionGroup': self.collection, 'queryScope': 'COLLECTION', 'fields': fields}
+
+        return {
+            'collection': self.collection,
+            'filters': [{'field': f, 'op': op} for f, op, _ in self.filters],
+            'order_by': [{'field': f, 'direction': d} for f, d in self.orders],
+            'limit': self.limit_count,
+            'needs_composite_index': needs_index,
+            'index': index,
+            'warnings': warnings
+        }
+
+
+class QueryMixin:
+    """為模型提供 query() 入口"""
+    __slots__ = ()
+
+    @classmethod
+    def query(cls):
+        return Query(cls)
+
+    @classmethod
+    def _get_document(cls, doc_id):
+        """讀取單一文件快照（批次請求快取 → 讀取副本 → Firestore）"""
+        cache = _request_cache()
+        if cache is not None:
+            return cache.get_or_load(('document', cls.COLLECTION, str(doc_id)),
+                                     lambda: cls._load_document(doc_id))
+        return cls._load_document(doc_id)
+
+    @classmethod
+    def get_raw(cls, doc_id):
+        """單一文件的原始資料（dict，含 id）；不存在時回傳 None"""
+        doc = cls._get_document(doc_id)
+        if doc is None or not doc.exists:
+            return None
+        return dict(doc.to_dict() or {}, id=doc.id)
+
+    @classmethod
+    def _load_document(cls, doc_id):
+        replica = get_replica(cls.COLLECTION)
+        if replica is not None:
+            return replica.get_document(cls.COLLECTION, doc_id)
+        ref = cls.get_db().collection(cls.COLLECTION).document(str(doc_id))
+        if _setting('HEDGED_READS_ENABLED', False) and collection_policy(cls.COLLECTION)['hedge']:
+            return hedged_call(cls.COLLECTION, lambda timeout: ref.get(timeout=timeout))
+        return ref.get(timeout=call_timeout(cls.COLLECTION))
+
+    @classmethod
+    def _get_documents(cls, doc_ids):
+        """一次讀取多個文件快照（Firestore get_all，一次 RPC）；順序與 doc_ids 相同"""
+        doc_ids = [str(i) for i in doc_ids]
+        replica = get_replica(cls.COLLECTION)
+        if replica is not None:
+            return replica.get_documents(cls.COLLECTION, doc_ids)
+        db = cls.get_db()
+        refs = [db.collection(cls.COLLECTION).document(doc_id) for doc_id in doc_ids]
+        by_id = {doc.id: doc for doc in db.get_all(refs, timeout=call_timeout(cls.COLLECTION))}
+        return [by_id.get(doc_id) for doc_id in doc_ids]
+
+    @classmethod
+    def get_many(cls, ids):
+        """依 ID 批次取得模型；回傳 {id: obj}，不存在的 ID 不列入"""
+        ids = list(dict.fromkeys(str(i) for i in ids if i))
+        if not ids:
+            return {}
+        return {doc.id: cls._from_doc(doc) for doc in cls._get_documents(ids)
+                if doc is not None and doc.exists}
@@ -0,0 +1,34 @@
+from datetime import datetime
+from .query import QueryMixin
+
+
+def record_slots(fields):
+    """由欄位 schema 產生 __slots__"""
+    return tuple(name for name, _ in fields)
+
+
+class Record(QueryMixin):
+    """以 __slots__ 儲存的精簡模型基底
+
+    子類別以 FIELDS（(欄位, 預設值) 的 tuple，同一 collection 的物件共用）描述欄位。
+    """
+    __slots__ = ('id', 'created_at', 'updated_at')
+    FIELDS = ()
+
+    def _touch(self):
+        """新物件的建立與更新時間（同一個時間點）"""
+        self.created_at = self.updated_at = datetime.utcnow()
+
+    @classmethod
+    def _from_doc(cls, doc, data=None):
+        """從 Firestore 文檔創建對象；data 為已取出的 doc.to_dict() 時不再重複解碼"""
+        if data is None:
+            data = doc.to_dict()
+        obj = cls.__new__(cls)
+        obj.id = doc.id
+        get = data.get
+        for name, default in cls.FIELDS:
+            setattr(obj, name, get(name, default))
+        obj.created_at = get('created_at')
+        obj.updated_at = get('updated_at')
+        return obj
@@ -0,0 +1,346 @@
+import copy
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app, has_app_context
+from utils.startup import register_warmup
+from .hooks import notify_replicated
+
+# 同步的 collection 與藍圖常用的篩選欄位（建立 json_extract 表達式索引）
+REPLICATED_COLLECTIONS = {
+    'products': ('sub_category_id', 'is_featured'),
+    'product_images': ('product_id', 'is_main'),
+    'main_categories': (),
+    'sub_categories': ('main_category_id',),
+    'carousels': ('is_active', 'order_num'),
+    'documents': ('requires_login',),
+}
+
+_FIELD_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_SQL_OPERATORS = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _encode(data):
+    def _default(value):
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return {'$dt': value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')}
+        return str(value)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def _decode(raw):
+    def _hook(obj):
+        if len(obj) == 1 and '$dt' in obj:
+            return datetime.fromisoformat(obj['$dt'])
+        return obj
+    return json.loads(raw, object_hook=_hook)
+
+
+def _json_path(field):
+    return f"json_extract(doc, '$.{field}')"
+
+
+class ReplicaDocument:
+    """模擬 Firestore DocumentSnapshot 的最小介面"""
+
+    def __init__(self, doc_id, raw):
+        self.id = doc_id
+        self.reference = None
+        self._raw = raw
+        self._data = None
+        self.exists = raw is not None
+
+    def to_dict(self):
+        return _decode(self._raw) if self._raw is not None else None
+
+    def get(self, field):
+        # 與 Firestore 相同：欄位不存在時 KeyError；解碼結果保留給之後的欄位讀取
+        if self._data is None:
+            self._data = self.to_dict() or {}
+        return copy.deepcopy(self._data[field])
+
+
+class ReadReplica:
+    """Firestore -> 本機 SQLite 的讀取副本
+
+    每個 collection 以 on_snapshot 監聽持續同步；同一個資料庫檔案由多個 worker 共用，
+    透過檔案鎖只讓一個 worker 負責同步，其他 worker 只讀取並定期嘗試接手。
+    """
+
+    def __init__(self, path, collections=None):
+        self.path = path
+        self.collections = dict(collections or REPLICATED_COLLECTIONS)
+        self.is_syncer = False
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._watches = []
+        self._lock_file = None
+        self._ready = set()
+        self._init_schema()
+
+    # ---- 連線與結構 ----
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS sync_state (
+                collection TEXT PRIMARY KEY,
+                docs INTEGER NOT NULL DEFAULT 0,
+                events INTEGER NOT NULL DEFAULT 0,
+                initial_sync_at REAL,
+                last_read_time REAL,
+                last_applied_at REAL,
+                last_lag REAL,
+                last_write_lag REAL,
+                max_write_lag REAL NOT NULL DEFAULT 0
+            )''')
+            for collection, fields in self.collections.items():
+                conn.execute(f'CREATE TABLE IF NOT EXISTS "{collection}" '
+                             '(id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+                for field in fields:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{collection}_{field}" '
+                                 f'ON "{collection}" ({_json_path(field)})')
+
+    # ---- 同步 ----
+
+    def _try_become_syncer(self):
+        import fcntl
+        if self.is_syncer:
+            return True
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.is_syncer = True
+        return True
+
+    def start(self, db, takeover_interval=30):
+        """取得同步權就開始監聽；否則於背景定期嘗試接手"""
+        if self._try_become_syncer():
+            self._subscribe(db)
+            return
+
+        def _takeover_loop():
+            while not self._try_become_syncer():
+                time.sleep(takeover_interval)
+            self._subscribe(db)
+
+        threading.Thread(target=_takeover_loop, name='replica-takeover', daemon=True).start()
+
+    def _subscribe(self, db):
+        # 重新同步期間由 Firestore 提供讀取
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute('UPDATE sync_state SET initial_sync_at = NULL')
+        self._ready.clear()
+
+        for collection in self.collections:
+            state = {'initial': True}
+
+            def _on_snapshot(col_snapshot, changes, read_time, collection=collection, state=state):
+                try:
+                    self.apply(collection, changes, read_time, initial=state['initial'])
+                    state['initial'] = False
+                except Exception as e:
+                    print(f"Error applying replica changes for {collection}: {str(e)}")
+
+            self._watches.append(db.collection(collection).on_snapshot(_on_snapshot))
+
+    def apply(self, collection, changes, read_time, initial=False):
+        """套用一批變更；初次快照會整表替換，以清掉停機期間刪除的文件"""
+        applied_at = time.time()
+        read_ts = read_time.timestamp() if isinstance(read_time, datetime) else applied_at
+        write_lags = []
+
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                if initial:
+                    conn.execute(f'DELETE FROM "{collection}"')
+                for change in changes:
+                    doc = change.document
+                    if change.type.name == 'REMOVED':
+                        conn.execute(f'DELETE FROM "{collection}" WHERE id = ?', (doc.id,))
+                        continue
+                    data = doc.to_dict() or {}
+                    conn.execute(f'INSERT OR REPLACE INTO "{collection}" (id, doc) VALUES (?, ?)',
+                                 (doc.id, _encode(data)))
+                    updated_at = data.get('updated_at')
+                    if not initial and isinstance(updated_at, datetime):
+                        if updated_at.tzinfo is None:
+                            updated_at = updated_at.replace(tzinfo=timezone.utc)
+                        write_lags.append(applied_at - updated_at.timestamp())
+
+                docs = conn.execute(f'SELECT COUNT(*) FROM "{collection}"').fetchone()[0]
+                write_lag = max(write_lags) if write_lags else None
+                conn.execute('''INSERT INTO sync_state (collection, docs, events, initial_sync_at,
+                        last_read_time, last_applied_at, last_lag, last_write_lag, max_write_lag)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, 0))
+                    ON CONFLICT(collection) DO UPDATE SET
+                        docs = excluded.docs,
+                        events = events + excluded.events,
+                        initial_sync_at = COALESCE(excluded.initial_sync_at, initial_sync_at),
+                        last_read_time = excluded.last_read_time,
+                        last_applied_at = excluded.last_applied_at,
+                        last_lag = excluded.last_lag,
+                        last_write_lag = COALESCE(excluded.last_write_lag, last_write_lag),
+                        max_write_lag = MAX(max_write_lag, COALESCE(excluded.last_write_lag, 0))''',
+                             (collection, docs, len(changes), applied_at if initial else None,
+                              read_ts, applied_at, applied_at - read_ts, write_lag, write_lag))
+        if changes:
+            notify_replicated(collection)
+
+    def wait_until_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(self.is_ready(c) for c in self.collections):
+                return True
+            time.sleep(0.1)
+        return False
+
+    # ---- 讀取 ----
+
+    def is_ready(self, collection):
+        """初次同步完成的 collection 才能由副本提供讀取"""
+        if collection in self._ready:
+            return True
+        if collection not in self.collections:
+            return False
+        row = self._connect().execute(
+            'SELECT initial_sync_at FROM sync_state WHERE collection = ?', (collection,)).fetchone()
+        if row and row[0]:
+            self._ready.add(collection)
+            return True
+        return False
+
+    def get_document(self, collection, doc_id):
+        row = self._connect().execute(
+            f'SELECT doc FROM "{collection}" WHERE id = ?', (str(doc_id),)).fetchone()
+        return ReplicaDocument(str(doc_id), row[0] if row else None)
+
+    def get_documents(self, collection, doc_ids):
+        doc_ids = [str(i) for i in doc_ids]
+        rows = {}
+        for i in range(0, len(doc_ids), 500):
+            chunk = doc_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows.update(self._connect().execute(
+                f'SELECT id, doc FROM "{collection}" WHERE id IN ({placeholders})', chunk).fetchall())
+        return [ReplicaDocument(doc_id, rows.get(doc_id)) for doc_id in doc_ids]
+
+    def can_serve(self, query):
+        """副本只處理純量條件；游標分頁、陣列運算子與日期比較交給 Firestore"""
+        if query.cursor or not self.is_ready(query.collection):
+            return False
+        for field, op, value in query.filters:
+            if not _FIELD_RE.match(field):
+                return False
+            if op in ('in', 'not-in'):
+                if not all(isinstance(v, _SCALAR_TYPES) for v in value):
+                    return False
+            elif op not in _SQL_OPERATORS or not isinstance(value, _SCALAR_TYPES):
+                return False
+        return all(field == '__name__' or _FIELD_RE.match(field) for field, _ in query.orders)
+
+    def _where(self, query):
+        clauses, params = [], []
+        for field, op, value in query.filters:
+            column = _json_path(field)
+            if op in ('in', 'not-in'):
+                if not value:
+                    clauses.append('0' if op == 'in' else f'{column} IS NOT NULL')
+                    continue
+                placeholders = ','.join('?' * len(value))
+                clauses.append(f"{column} {'IN' if op == 'in' else 'NOT IN'} ({placeholders})")
+                params.extend(value)
+            elif value is None and op in ('==', '!='):
+                clauses.append(f"{column} IS {'NOT ' if op == '!=' else ''}NULL")
+            else:
+                clauses.append(f'{column} {_SQL_OPERATORS[op]} ?')
+                params.append(value)
+        for field, _ in query.orders:
+            if field != '__name__':
+                # Firestore 排序會排除缺少該欄位的文件
+                clauses.append(f"json_type(doc, '$.{field}') IS NOT NULL")
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def execute(self, query):
+        where, params = self._where(query)
+        orders = [('id' if field == '__name__' else _json_path(field)) +
+                  (' DESC' if direction == 'DESCENDING' else '') for field, direction in query.orders]
+        sql = f'SELECT id, doc FROM "{query.collection}"{where} ORDER BY {", ".join(orders + ["id"])}'
+        if query.limit_count is not None:
+            sql += ' LIMIT ?'
+            params.append(query.limit_count)
+        return [ReplicaDocument(doc_id, raw) for doc_id, raw in self._connect().execute(sql, params)]
+
+    def count(self, query):
+        where, params = self._where(query)
+        sql = f'SELECT COUNT(*) FROM "{query.collection}"{where}'
+        if query.limit_count is not None:
+            sql = f'SELECT MIN(({sql}), ?)'
+            params.append(query.limit_count)
+        return self._connect().execute(sql, params).fetchone()[0]
+
+    # ---- 監控 ----
+
+    def stats(self):
+        now = time.time()
+        result = {'path': self.path, 'is_syncer': self.is_syncer, 'collections': {}}
+        cursor = self._connect().execute('SELECT * FROM sync_state')
+        columns = [c[0] for c in cursor.description]
+        for row in cursor.fetchall():
+            item = dict(zip(columns, row))
+            collection = item.pop('collection')
+            item['ready'] = bool(item['initial_sync_at'])
+            item['seconds_since_last_event'] = (
+                round(now - item['last_applied_at'], 3) if item['last_applied_at'] else None)
+            result['collections'][collection] = item
+        return result
+
+
+def get_replica(collection):
+    """讀取副本啟用且該 collection 已同步時回傳副本，否則回傳 None"""
+    if not has_app_context():
+        return None
+    replica = current_app.extensions.get('read_replica')
+    if replica is None or not replica.is_ready(collection):
+        return None
+    return replica
+
+
+def init_replica(app):
+    """READ_REPLICA_ENABLED 時建立副本並開始同步（於預熱階段呼叫）"""
+    if not app.config.get('READ_REPLICA_ENABLED'):
+        return
+    replica = app.extensions.get('read_replica')
+    if replica is None:
+        path = app.config.get('READ_REPLICA_PATH', 'read_replica.db')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        replica = ReadReplica(path)
+        app.extensions['read_replica'] = replica
+        replica.start(app.db, app.config.get('READ_REPLICA_TAKEOVER_INTERVAL', 30))
+    replica.wait_until_ready(app.config.get('READ_REPLICA_SYNC_TIMEOUT', 30))
+
+
+register_warmup('read_replica', init_replica)
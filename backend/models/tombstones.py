@@ -0,0 +1,38 @@
+from datetime import datetime
+from .deadline import call_timeout
+
+# 刪除紀錄（增量同步用）：document id 為 "<collection>:<doc_id>"
+TOMBSTONE_COLLECTION = 'tombstones'
+
+
+def write_tombstone(writer, db, collection, doc_id):
+    """在 writer（batch 或 transaction）中刪除文件並寫入刪除紀錄"""
+    doc_id = str(doc_id)
+    writer.delete(db.collection(collection).document(doc_id))
+    writer.set(db.collection(TOMBSTONE_COLLECTION).document(f'{collection}:{doc_id}'), {
+        'collection': collection,
+        'doc_id': doc_id,
+        'deleted_at': datetime.utcnow()
+    })
+
+
+def delete_with_tombstone(db, collection, doc_id):
+    """刪除文件並在同一個 batch 寫入刪除紀錄"""
+    batch = db.batch()
+    write_tombstone(batch, db, collection, doc_id)
+    batch.commit(timeout=call_timeout(collection))
+
+
+def purge_tombstones(db, before):
+    """刪除 before 之前的刪除紀錄，回傳刪除筆數"""
+    count = 0
+    while True:
+        docs = list(db.collection(TOMBSTONE_COLLECTION)
+                    .where('deleted_at', '<', before).limit(500).stream())
+        if not docs:
+            return count
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        count += len(docs)
@@ -1,10 +1,15 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-from flask import current_app
+from .database import get_db
+from .deadline import call_timeout
+from .hooks import notify
+from .record import Record, record_slots
 
-class User:
+class User(Record):
     """用戶模型"""
     COLLECTION = 'users'
+    FIELDS = (('username', None), ('password_hash', None), ('email', None), ('is_admin', False))
+    __slots__ = record_slots(FIELDS)
 
     def __init__(self, username=None, password=None, email=None, is_admin=False, user_id=None):
         self.id = user_id
@@ -12,20 +17,18 @@ class User:
         self.password_hash = generate_password_hash(password) if password else None
         self.email = email
         self.is_admin = is_admin
-        self.created_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self._touch()
 
     @staticmethod
     def get_db():
-        return current_app.db
+        return get_db()
 
     @classmethod
     def get(cls, user_id):
         """根據ID獲取用戶"""
         if not user_id:
             return None
-        db = cls.get_db()
-        doc = db.collection(cls.COLLECTION).document(str(user_id)).get()
+        doc = cls._get_document(user_id)
         if doc.exists:
             return cls._from_doc(doc)
         return None
@@ -33,30 +36,7 @@ class User:
     @classmethod
     def filter_by(cls, **kwargs):
         """根據條件查詢用戶 - 返回單個用戶"""
-        db = cls.get_db()
-        query = db.collection(cls.COLLECTION)
-
-        for key, value in kwargs.items():
-            query = query.where(key, '==', value)
-
-        docs = query.limit(1).stream()
-        for doc in docs:
-            return cls._from_doc(doc)
-        return None
-
-    @classmethod
-    def _from_doc(cls, doc):
-        """從 Firestore 文檔創建用戶對象"""
-        data = doc.to_dict()
-        user = cls.__new__(cls)
-        user.id = doc.id
-        user.username = data.get('username')
-        user.password_hash = data.get('password_hash')
-        user.email = data.get('email')
-        user.is_admin = data.get('is_admin', False)
-        user.created_at = data.get('created_at')
-        user.updated_at = data.get('updated_at')
-        return user
+        return cls.query().filter_by(**kwargs).first()
 
     def save(self):
         """儲存用戶"""
@@ -72,13 +52,14 @@ class User:
 
             if self.id:
                 # 更新現有用戶
-                db.collection(self.COLLECTION).document(str(self.id)).update(data)
+                db.collection(self.COLLECTION).document(str(self.id)).update(data, timeout=call_timeout(self.COLLECTION))
             else:
                 # 創建新用戶
                 data['created_at'] = self.created_at
-                _, doc_ref = db.collection(self.COLLECTION).add(data)
+                _, doc_ref = db.collection(self.COLLECTION).add(data, timeout=call_timeout(self.COLLECTION))
                 self.id = doc_ref.id
 
+            notify(self.COLLECTION, 'save', self)
             return True
         except Exception as e:
             print(f"Error saving user: {str(e)}")
@@ -90,6 +71,7 @@ class User:
             if self.id:
                 db = self.get_db()
                 db.collection(self.COLLECTION).document(str(self.id)).delete()
+                notify(self.COLLECTION, 'delete', self)
                 return True
             return False
         except Exception as e:
@@ -1 +1,6 @@
-from .auth import admin_required, get_current_user
\ No newline at end of file
+def __getattr__(name):
+    """admin_required / get_current_user 延遲載入：utils.auth 依賴 models，而 models 也會匯入 utils 的子模組"""
+    if name in ('admin_required', 'get_current_user'):
+        from . import auth
+        return getattr(auth, name)
+    raise AttributeError(f"module 'utils' has no attribute {name!r}")
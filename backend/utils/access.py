@@ -0,0 +1,233 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import wait
+
+import numpy as np
+from flask import current_app, request
+
+from utils.startup import register_warmup
+from utils.subrequest import get_subrequest_pool, run_subrequest
+
+# 預熱子請求在 WSGI environ 中的標記（不計入存取頻率）
+PREWARM_ENVIRON_KEY = 'myweb.prewarm'
+
+# 記錄存取頻率的端點：端點 -> (種類, 路由參數)
+TRACKED_ENDPOINTS = {
+    'products.get_product_detail': ('product', 'product_id'),
+    'products.get_products_by_main_category': ('main_category', 'main_id'),
+    'products.get_products_by_sub_category': ('sub_category', 'sub_id'),
+    'categories.get_subcategories': ('main_category', 'main_id'),
+    'products.get_product_image': ('product_image', 'image_id'),
+    'carousel.get_carousel_image': ('carousel_image', 'carousel_id'),
+}
+# 只有經過圖片代理時預熱才有效（否則只是轉址）
+_IMAGE_KINDS = ('product_image', 'carousel_image')
+
+
+class CountMinSketch:
+    """會衰減的 count-min sketch：depth 列各以不同雜湊計數，估計值取最小（只會高估）"""
+
+    def __init__(self, width=4096, depth=4):
+        self.width = width
+        self.depth = depth
+        self._table = np.zeros((depth, width), dtype=np.float32)
+        self._rows = np.arange(depth)
+
+    def _columns(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1.0):
+        """遞增並回傳新的估計值"""
+        columns = self._columns(key)
+        self._table[self._rows, columns] += count
+        return float(self._table[self._rows, columns].min())
+
+    def estimate(self, key):
+        return float(self._table[self._rows, self._columns(key)].min())
+
+    def decay(self, factor):
+        self._table *= factor
+
+
+class AccessTracker:
+    """產品、分類與圖片端點的存取頻率
+
+    以 count-min sketch 估計每個 URL 的次數，並保留估計值最高的 capacity 個 URL 作為熱門集合；
+    每 half_life 秒所有計數減半，讓熱門集合反映近期流量。
+    """
+
+    def __init__(self, capacity=500, half_life=3600, width=4096, depth=4):
+        self.capacity = capacity
+        self.half_life = half_life
+        self.recorded = 0
+        self._sketch = CountMinSketch(width, depth)
+        self._hot = {}            # url -> [估計值, 種類, id]
+        self._floor = 0.0         # 熱門集合已滿時的最小估計值
+        self._decayed_at = time.time()
+        self._lock = threading.Lock()
+
+    def _maybe_decay(self, now):
+        periods = int((now - self._decayed_at) // self.half_life)
+        if periods <= 0:
+            return
+        factor = 0.5 ** periods
+        self._sketch.decay(factor)
+        for item in self._hot.values():
+            item[0] *= factor
+        self._floor *= factor
+        self._decayed_at += periods * self.half_life
+
+    def _evict(self):
+        coldest = min(self._hot, key=lambda url: self._hot[url][0])
+        del self._hot[coldest]
+        self._floor = min(item[0] for item in self._hot.values())
+
+    def record(self, url, kind, item_id, count=1.0):
+        with self._lock:
+            self._maybe_decay(time.time())
+            estimate = self._sketch.add(url, count)
+            self.recorded += 1
+            if url in self._hot:
+                self._hot[url][0] = estimate
+                return
+            if len(self._hot) < self.capacity:
+                self._hot[url] = [estimate, kind, item_id]
+                if len(self._hot) == self.capacity:
+                    self._floor = min(item[0] for item in self._hot.values())
+            elif estimate > self._floor:
+                self._hot[url] = [estimate, kind, item_id]
+                self._evict()
+
+    def hot(self, limit=None):
+        """熱門集合，依估計次數由高到低：[{'url', 'kind', 'id', 'count'}]"""
+        with self._lock:
+            self._maybe_decay(time.time())
+            items = sorted(self._hot.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [{'url': url, 'kind': kind, 'id': item_id, 'count': round(count, 3)}
+                for url, (count, kind, item_id) in items[:limit]]
+
+    def seed(self, entries):
+        """以先前保存的熱門集合作為起始計數（不計入 recorded）"""
+        recorded = self.recorded
+        for entry in entries:
+            self.record(entry['url'], entry['kind'], entry['id'], entry['count'])
+        self.recorded = recorded
+
+    def stats(self):
+        return {
+            'recorded': self.recorded,
+            'hot_entries': len(self._hot),
+            'capacity': self.capacity,
+            'half_life': self.half_life,
+            'top': self.hot(10)
+        }
+
+
+def load_hot_set(path):
+    """讀取保存的熱門集合；依保存後經過的時間衰減計數"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    factor = 0.5 ** (max(0.0, time.time() - data.get('saved_at', 0)) / data.get('half_life', 3600))
+    return [dict(entry, count=entry['count'] * factor) for entry in data.get('entries', [])]
+
+
+def save_hot_set(tracker, path):
+    """保存熱門集合（與檔案中其他 worker 保存的項目合併，取較大的計數），以改名確保原子寫入"""
+    merged = {entry['url']: entry for entry in load_hot_set(path)}
+    for entry in tracker.hot():
+        previous = merged.get(entry['url'])
+        if previous is None or entry['count'] >= previous['count']:
+            merged[entry['url']] = entry
+    entries = sorted(merged.values(), key=lambda entry: entry['count'], reverse=True)
+    data = {'saved_at': time.time(), 'half_life': tracker.half_life,
+            'entries': entries[:tracker.capacity]}
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _after_request(response):
+    tracked = TRACKED_ENDPOINTS.get(request.endpoint)
+    if (tracked is None or request.method != 'GET' or response.status_code >= 400
+            or request.environ.get(PREWARM_ENVIRON_KEY)):
+        return response
+    kind, arg = tracked
+    item_id = (request.view_args or {}).get(arg)
+    url = request.full_path.rstrip('?')
+    current_app.extensions['access_tracker'].record(url, kind, item_id)
+    return response
+
+
+def _persist_loop(tracker, path, interval):
+    while True:
+        time.sleep(interval)
+        if not tracker.recorded:
+            continue
+        try:
+            save_hot_set(tracker, path)
+        except OSError as e:
+            print(f"Error saving hot set: {str(e)}")
+
+
+def _hot_set_path(app):
+    return os.path.join(app.root_path, app.config.get('ACCESS_HOT_SET_PATH', 'hot_set.json'))
+
+
+def prewarm(app):
+    """重新播放保存的熱門 URL（子請求），填入回應快取與圖片磁碟快取
+
+    以 ACCESS_PREWARM_TIMEOUT 秒為上限，逾時未完成的項目略過；單一項目失敗不影響預熱結果。
+    """
+    tracker = app.extensions.get('access_tracker')
+    if tracker is None:
+        return
+    entries = load_hot_set(_hot_set_path(app))
+    tracker.seed(entries)
+
+    proxy = app.config.get('IMAGE_PROXY_ENABLED', False)
+    urls = [entry['url'] for entry in entries
+            if proxy or entry['kind'] not in _IMAGE_KINDS]
+    urls = urls[:app.config.get('ACCESS_PREWARM_COUNT', 100)]
+    if not urls:
+        return
+
+    pool = get_subrequest_pool(app)
+    environ = {PREWARM_ENVIRON_KEY: True}
+    futures = [pool.submit(run_subrequest, app, url, environ=environ) for url in urls]
+    done, not_done = wait(futures, timeout=app.config.get('ACCESS_PREWARM_TIMEOUT', 10))
+    for future in not_done:
+        future.cancel()
+    failed = sum(1 for future in done
+                 if future.exception() is not None or future.result()[0].status_code >= 500)
+    print(f"Pre-warmed {len(done) - failed}/{len(urls)} hot URLs")
+
+
+def init_access_tracking(app):
+    """ACCESS_TRACKING_ENABLED 時記錄熱門 URL 並定期保存，預熱時重新播放"""
+    if not app.config.get('ACCESS_TRACKING_ENABLED', True):
+        return None
+    tracker = AccessTracker(capacity=app.config.get('ACCESS_HOT_SET_SIZE', 500),
+                            half_life=app.config.get('ACCESS_HALF_LIFE', 3600))
+    app.extensions['access_tracker'] = tracker
+    app.after_request(_after_request)
+
+    path = _hot_set_path(app)
+    threading.Thread(target=_persist_loop,
+                     args=(tracker, path, app.config.get('ACCESS_PERSIST_INTERVAL', 60)),
+                     name='hot-set-persist', daemon=True).start()
+    atexit.register(lambda: save_hot_set(tracker, path) if tracker.recorded else None)
+    return tracker
+
+
+register_warmup('hot_set', prewarm)
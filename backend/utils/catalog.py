@@ -0,0 +1,317 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from models.hooks import on_change
+from utils.startup import register_warmup
+
+SORT_FIELDS = ('price', 'name', 'created_at')
+
+
+def _timestamp(value):
+    """datetime 轉 epoch 秒；Firestore 回傳 UTC aware，模型新建的是 naive UTC"""
+    if not isinstance(value, datetime):
+        return np.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class CatalogSnapshot:
+    """products 的欄式記憶體快照：以 NumPy 陣列做篩選、排序與分面統計"""
+
+    def __init__(self, price_buckets=(0, 1000, 5000, 10000, 50000)):
+        self.price_buckets = np.asarray(price_buckets, dtype=np.float64)
+        self.loaded_at = None
+        self._lock = threading.RLock()
+        self._refreshing = False
+        self._reset(0)
+
+    def _reset(self, capacity):
+        self._size = 0
+        self._rows = {}          # product_id -> row
+        self._ids = np.empty(capacity, dtype=object)
+        self._names = np.empty(capacity, dtype=object)
+        self._models = np.empty(capacity, dtype=object)
+        self._price = np.full(capacity, np.nan)
+        self._created = np.full(capacity, np.nan)
+        self._sub = np.full(capacity, -1, dtype=np.int32)
+        self._main = np.full(capacity, -1, dtype=np.int32)
+        self._featured = np.zeros(capacity, dtype=bool)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._name_rank = None
+        # 分類代碼表
+        self._sub_codes, self._sub_ids = {}, []
+        self._main_codes, self._main_ids = {}, []
+        self._sub_to_main = {}
+
+    @property
+    def loaded(self):
+        return self.loaded_at is not None
+
+    # ---- 代碼表 ----
+
+    def _code(self, codes, ids, key):
+        if key is None:
+            return -1
+        key = str(key)
+        if key not in codes:
+            codes[key] = len(ids)
+            ids.append(key)
+        return codes[key]
+
+    def _main_code_for_sub(self, sub_category_id):
+        main_id = self._sub_to_main.get(str(sub_category_id))
+        return self._code(self._main_codes, self._main_ids, main_id)
+
+    # ---- 寫入 ----
+
+    def _grow(self):
+        capacity = max(64, len(self._alive) * 2)
+        for name in ('_ids', '_names', '_models', '_price', '_created',
+                     '_sub', '_main', '_featured', '_alive'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            if name in ('_price', '_created'):
+                new[len(old):] = np.nan
+            elif name in ('_sub', '_main'):
+                new[len(old):] = -1
+            elif name in ('_featured', '_alive'):
+                new[len(old):] = False
+            setattr(self, name, new)
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        for name in ('_ids', '_names', '_models', '_price', '_created',
+                     '_sub', '_main', '_featured', '_alive'):
+            arr = getattr(self, name)
+            arr[:len(keep)] = arr[keep]
+        self._size = len(keep)
+        self._alive[self._size:] = False
+        self._rows = {pid: i for i, pid in enumerate(self._ids[:self._size])}
+        self._name_rank = None
+
+    def upsert(self, product):
+        """新增或更新一筆產品（接受 Product 物件）"""
+        with self._lock:
+            row = self._rows.get(product.id)
+            if row is None:
+                if self._size == len(self._alive):
+                    self._grow()
+                row = self._size
+                self._size += 1
+                self._rows[product.id] = row
+            self._ids[row] = product.id
+            self._names[row] = product.name or ''
+            self._models[row] = product.model
+            self._price[row] = float(product.price) if product.price else np.nan
+            self._created[row] = _timestamp(product.created_at)
+            self._sub[row] = self._code(self._sub_codes, self._sub_ids, product.sub_category_id)
+            self._main[row] = self._main_code_for_sub(product.sub_category_id)
+            self._featured[row] = bool(product.is_featured)
+            self._alive[row] = True
+            self._name_rank = None
+
+    def remove(self, product_id):
+        with self._lock:
+            row = self._rows.pop(product_id, None)
+            if row is None:
+                return
+            self._alive[row] = False
+            self._name_rank = None
+            if self._size > 64 and len(self._rows) < self._size // 2:
+                self._compact()
+
+    def set_sub_category(self, sub_category_id, main_category_id):
+        """子分類搬移主分類時，更新所屬產品的主分類代碼"""
+        with self._lock:
+            sub_category_id = str(sub_category_id)
+            if main_category_id is None:
+                self._sub_to_main.pop(sub_category_id, None)
+            else:
+                self._sub_to_main[sub_category_id] = str(main_category_id)
+            code = self._sub_codes.get(sub_category_id)
+            if code is not None:
+                rows = self._sub[:self._size] == code
+                self._main[:self._size][rows] = self._main_code_for_sub(sub_category_id)
+
+    def load(self, db):
+        """從 Firestore 重建整份快照"""
+        from models.product import Product
+
+        sub_to_main = {}
+        for doc in db.collection('sub_categories').stream():
+            sub_to_main[doc.id] = str(doc.to_dict().get('main_category_id'))
+        products = [Product._from_doc(doc) for doc in db.collection(Product.COLLECTION).stream()]
+
+        with self._lock:
+            self._reset(max(64, len(products)))
+            self._sub_to_main = sub_to_main
+            for product in products:
+                self.upsert(product)
+            self.loaded_at = time.time()
+
+    def refresh_async(self, db, max_age):
+        """快照超過 max_age 秒時於背景重載（同一時間只跑一次）"""
+        with self._lock:
+            if self._refreshing or not self.loaded or time.time() - self.loaded_at < max_age:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self.load(db)
+            except Exception as e:
+                print(f"Error refreshing catalog snapshot: {str(e)}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=_run, name='catalog-refresh', daemon=True).start()
+
+    # ---- 查詢 ----
+
+    def _codes_for(self, codes, ids):
+        return [codes[str(i)] for i in ids if str(i) in codes]
+
+    def _sort_keys(self, rows, sort, descending):
+        if sort == 'name':
+            if self._name_rank is None:
+                names = np.asarray([str(n) for n in self._names[:self._size]], dtype=str)
+                rank = np.empty(self._size, dtype=np.int64)
+                rank[np.argsort(names, kind='stable')] = np.arange(self._size)
+                self._name_rank = rank
+            key = self._name_rank[rows].astype(np.float64)
+        else:
+            key = (self._price if sort == 'price' else self._created)[rows]
+        if descending:
+            key = -key
+        # 缺值（NaN）一律排在最後
+        return np.where(np.isnan(key), np.inf, key)
+
+    def _price_facets(self, mask):
+        price = self._price[:self._size]
+        valid = mask & ~np.isnan(price)
+        buckets = np.digitize(price[valid], self.price_buckets) - 1
+        counts = np.bincount(buckets[buckets >= 0], minlength=len(self.price_buckets))
+        edges = [int(e) for e in self.price_buckets]
+        result = []
+        for i, count in enumerate(counts):
+            upper = edges[i + 1] if i + 1 < len(edges) else None
+            result.append({'min': edges[i], 'max': upper, 'count': int(count)})
+        return result
+
+    def _code_facets(self, codes, ids, mask):
+        valid = mask & (codes >= 0)
+        counts = np.bincount(codes[valid], minlength=len(ids))
+        return {ids[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+    def query(self, sub_category_ids=None, main_category_ids=None, min_price=None,
+              max_price=None, featured=None, sort='created_at', descending=False,
+              page=1, page_size=20):
+        """篩選、排序與分頁；分面統計套用「除自身以外」的其他篩選條件"""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"不支援的排序欄位: {sort}")
+
+        with self._lock:
+            n = self._size
+            sub, main = self._sub[:n], self._main[:n]
+            price, featured_arr = self._price[:n], self._featured[:n]
+
+            masks = {}
+            if sub_category_ids:
+                masks['sub'] = np.isin(sub, self._codes_for(self._sub_codes, sub_category_ids))
+            if main_category_ids:
+                masks['main'] = np.isin(main, self._codes_for(self._main_codes, main_category_ids))
+            if min_price is not None or max_price is not None:
+                price_mask = ~np.isnan(price)
+                if min_price is not None:
+                    price_mask &= price >= min_price
+                if max_price is not None:
+                    price_mask &= price <= max_price
+                masks['price'] = price_mask
+            if featured is not None:
+                masks['featured'] = featured_arr == bool(featured)
+
+            def combined(exclude=None):
+                mask = self._alive[:n].copy()
+                for name, m in masks.items():
+                    if name != exclude:
+                        mask &= m
+                return mask
+
+            rows = np.flatnonzero(combined())
+            order = np.lexsort((rows, self._sort_keys(rows, sort, descending)))
+            start = (page - 1) * page_size
+            page_rows = rows[order][start:start + page_size]
+
+            featured_mask = combined('featured')
+            facets = {
+                'sub_categories': self._code_facets(sub, self._sub_ids, combined('sub')),
+                'main_categories': self._code_facets(main, self._main_ids, combined('main')),
+                'featured': {
+                    'true': int((featured_mask & featured_arr).sum()),
+                    'false': int((featured_mask & ~featured_arr).sum())
+                },
+                'price': self._price_facets(combined('price'))
+            }
+
+            items = []
+            for row in page_rows:
+                created = self._created[row]
+                items.append({
+                    'id': self._ids[row],
+                    'name': self._names[row],
+                    'model': self._models[row],
+                    'price': None if np.isnan(price[row]) else float(price[row]),
+                    'is_featured': bool(featured_arr[row]),
+                    'sub_category_id': self._sub_ids[sub[row]] if sub[row] >= 0 else None,
+                    'main_category_id': self._main_ids[main[row]] if main[row] >= 0 else None,
+                    'created_at': None if np.isnan(created) else
+                        datetime.fromtimestamp(created, timezone.utc).isoformat()
+                })
+
+            return {
+                'total': int(len(rows)),
+                'page': page,
+                'page_size': page_size,
+                'items': items,
+                'facets': facets
+            }
+
+
+catalog = CatalogSnapshot()
+
+
+def get_catalog(app):
+    """取得已載入的快照；首次使用時同步載入，過期則背景重載"""
+    if not catalog.loaded:
+        with catalog._lock:
+            if not catalog.loaded:
+                catalog.load(app.db)
+    else:
+        catalog.refresh_async(app.db, app.config.get('CATALOG_REFRESH_INTERVAL', 300))
+    return catalog
+
+
+def _on_product_change(action, product):
+    if not catalog.loaded or not product.id:
+        return
+    if action == 'delete':
+        catalog.remove(product.id)
+    else:
+        catalog.upsert(product)
+
+
+def _on_sub_category_change(action, sub_category):
+    if not catalog.loaded or not sub_category.id:
+        return
+    main_id = None if action == 'delete' else sub_category.main_category_id
+    catalog.set_sub_category(sub_category.id, main_id)
+
+
+on_change('products', _on_product_change)
+on_change('sub_categories', _on_sub_category_change)
+register_warmup('catalog', lambda app: get_catalog(app))
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from flask import current_app, g, jsonify, request
+
+from models.circuit import (CIRCUIT_REJECTED_ENVIRON_KEY, DATA_CALL_ENVIRON_KEY,
+                            CircuitBreaker)
+
+# 不隨最後可用快照保存的標頭（由當下回應重新產生）
+_SKIPPED_HEADERS = ('Content-Length', 'Set-Cookie', 'X-Cache', 'Age', 'X-Coalesced', 'Server-Timing')
+
+
+class LastKnownGoodStore:
+    """公開端點最後一次成功回應的本機快照（SQLite，重新啟動後仍可使用，多個 worker 共用）
+
+    相同內容在 write_interval 秒內不重複寫入。最多保存 max_entries 筆，超過時刪除最久未寫入的快照。
+    """
+
+    def __init__(self, path, write_interval=60, max_entries=1000):
+        self.path = path
+        self.write_interval = write_interval
+        self.max_entries = max_entries
+        self.writes = 0
+        self.served = 0
+        self.misses = 0
+        self._written = OrderedDict()   # key -> (寫入時間, 內容雜湊)，最多 max_entries 筆
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                stored_at REAL NOT NULL
+            )''')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def save(self, key, response):
+        body = response.get_data()
+        digest = hashlib.sha1(body).hexdigest()
+        now = time.time()
+        with self._lock:
+            previous = self._written.get(key)
+        if previous and previous[1] == digest and now - previous[0] < self.write_interval:
+            return
+        headers = [(k, v) for k, v in response.headers.items() if k not in _SKIPPED_HEADERS]
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO responses (key, status, headers, body, stored_at) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         (key, response.status_code, json.dumps(headers), body, now))
+            conn.execute('DELETE FROM responses WHERE key NOT IN '
+                         '(SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)',
+                         (self.max_entries,))
+        with self._lock:
+            self._written[key] = (now, digest)
+            self._written.move_to_end(key)
+            while len(self._written) > self.max_entries:
+                self._written.popitem(last=False)
+        self.writes += 1
+
+    def load(self, key):
+        row = self._connect().execute(
+            'SELECT status, headers, body, stored_at FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.served += 1
+        return row[0], json.loads(row[1]), row[2], row[3]
+
+    def stats(self):
+        count = self._connect().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {'entries': count, 'writes': self.writes, 'served': self.served, 'misses': self.misses}
+
+
+def _snapshot_key(params):
+    """快照的 key：路徑加上端點使用的查詢參數（其他參數忽略，任意參數不會產生新的快照）"""
+    query = '&'.join(f'{name}={request.args.get(name)}' for name in params if name in request.args)
+    return f'{request.path}?{query}'
+
+
+def _is_empty(response):
+    """空結果（空陣列，或 products 為空，例如 ids 全部不存在）不保存"""
+    data = response.get_json(silent=True)
+    if isinstance(data, dict) and 'products' in data:
+        data = data['products']
+    return not data
+
+
+def _stale_response(snapshot):
+    status, headers, body, stored_at = snapshot
+    response = current_app.response_class(body, status=status, headers=headers)
+    age = max(0, int(time.time() - stored_at))
+    response.headers['Age'] = str(age)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Warning'] = '110 - "Response is Stale"'
+    response.headers['X-Served-From'] = 'last-known-good'
+    response.headers['X-Last-Known-Good'] = format_datetime(
+        datetime.fromtimestamp(stored_at, tz=timezone.utc), usegmt=True)
+    return response
+
+
+def _before_request():
+    g.data_started = time.perf_counter()
+
+
+def _after_request(response):
+    breaker = current_app.extensions['circuit_breaker']
+    store = current_app.extensions['last_known_good']
+    environ = request.environ
+    rejected = environ.get(CIRCUIT_REJECTED_ENVIRON_KEY, False)
+
+    # 只有實際呼叫過資料層、且不是被熔斷器拒絕的請求才計入
+    if environ.get(DATA_CALL_ENVIRON_KEY) and not rejected:
+        started = g.get('data_started')
+        breaker.record(response.status_code < 500,
+                       time.perf_counter() - started if started is not None else 0.0)
+
+    params = current_app.config.get('LAST_KNOWN_GOOD_ENDPOINTS', {}).get(request.endpoint)
+    if request.method != 'GET' or params is None:
+        return response
+
+    if response.status_code == 200 and not response.direct_passthrough:
+        if _is_empty(response):
+            return response
+        try:
+            store.save(_snapshot_key(params), response)
+        except sqlite3.Error as e:
+            print(f"Error saving last-known-good response: {str(e)}")
+        return response
+
+    if response.status_code >= 500:
+        try:
+            snapshot = store.load(_snapshot_key(params))
+        except sqlite3.Error:
+            snapshot = None
+        if snapshot is not None:
+            return _stale_response(snapshot)
+        if rejected:
+            unavailable = jsonify({"error": "資料服務暫時無法使用，請稍後再試"})
+            unavailable.status_code = 503
+            unavailable.headers['Retry-After'] = str(int(breaker.probe_interval) or 1)
+            return unavailable
+    return response
+
+
+def _probe(app):
+    """熔斷器開啟時的背景探測：直接讀取一筆資料（不經過熔斷檢查）"""
+    db = app.db
+    list(db.collection('main_categories').limit(1).stream(
+        timeout=app.config.get('FIRESTORE_TIMEOUT', 10)))
+
+
+def init_degraded_mode(app):
+    """CIRCUIT_BREAKER_ENABLED 時建立熔斷器與最後可用快照，並掛上 hooks"""
+    if not app.config.get('CIRCUIT_BREAKER_ENABLED', True):
+        return None
+    breaker = CircuitBreaker(lambda: _probe(app), **app.config.get('CIRCUIT_BREAKER', {}))
+    path = app.config.get('LAST_KNOWN_GOOD_PATH', 'last_known_good.db')
+    store = LastKnownGoodStore(os.path.join(app.root_path, path),
+                               app.config.get('LAST_KNOWN_GOOD_WRITE_INTERVAL', 60),
+                               app.config.get('LAST_KNOWN_GOOD_MAX_ENTRIES', 1000))
+    app.extensions['circuit_breaker'] = breaker
+    app.extensions['last_known_good'] = store
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    return breaker
@@ -0,0 +1,221 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import click
+from flask import Blueprint, current_app, jsonify, request, send_file
+
+MANIFEST_NAME = 'asset-manifest.json'
+# 檔名含 8 碼以上內容雜湊（vue-cli 產物）即可長期快取
+HASHED_FILE = re.compile(r'\.[0-9a-f]{8,}\.[A-Za-z0-9]+$')
+REFERENCE = re.compile(r'(?:src|href)=["\']?/?([^"\'\s>]+)')
+COMPRESSIBLE = ('.html', '.js', '.css', '.svg', '.json', '.ico', '.txt', '.map')
+MIN_COMPRESS_SIZE = 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+frontend_bp = Blueprint('frontend', __name__)
+
+
+def _hash_token(path):
+    match = HASHED_FILE.search(os.path.basename(path))
+    return match.group(0).split('.')[1] if match else None
+
+
+def _reachable_files(dist_dir):
+    """從 index.html 出發，找出實際被引用的檔案
+
+    index.html 以 src/href 引用入口；webpack 的延遲載入 chunk 與 CSS 中的字型、圖片
+    以內容雜湊出現在已引用的檔案裡，所以用雜湊（或檔名）反覆比對直到不再增加。
+    """
+    files = []
+    for root, _, names in os.walk(dist_dir):
+        for name in names:
+            if name == MANIFEST_NAME or name.endswith(('.gz', '.br')):
+                continue
+            files.append(os.path.relpath(os.path.join(root, name), dist_dir).replace(os.sep, '/'))
+
+    def _read(path):
+        with open(os.path.join(dist_dir, path), 'rb') as f:
+            return f.read().decode('utf-8', 'ignore')
+
+    index = _read('index.html')
+    reachable = {'index.html'} | {ref for ref in REFERENCE.findall(index) if ref in files}
+    pending = list(reachable - {'index.html'})
+    candidates = {path: (_hash_token(path) or os.path.basename(path)) for path in files}
+
+    while pending:
+        path = pending.pop()
+        if not path.endswith(('.js', '.css', '.html')):
+            continue
+        text = _read(path)
+        for other, token in candidates.items():
+            if other not in reachable and token in text:
+                reachable.add(other)
+                pending.append(other)
+    return sorted(reachable)
+
+
+def build_manifest(dist_dir):
+    """產生資源清單：只有清單內的檔案會被提供（舊的 bundle 不會外流）"""
+    manifest = {}
+    for path in _reachable_files(dist_dir):
+        full = os.path.join(dist_dir, path)
+        with open(full, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+        encodings = [enc for enc, suffix in (('br', '.br'), ('gzip', '.gz'))
+                     if os.path.exists(full + suffix)]
+        manifest[path] = {
+            'etag': digest,
+            'size': os.path.getsize(full),
+            'immutable': bool(HASHED_FILE.search(os.path.basename(path))),
+            'encodings': encodings
+        }
+    return manifest
+
+
+def precompress(dist_dir, level=9):
+    """預先壓縮可壓縮的資源（gzip，安裝 brotli 時另產生 .br），並寫出清單"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    written = []
+    for path in _reachable_files(dist_dir):
+        full = os.path.join(dist_dir, path)
+        if not path.endswith(COMPRESSIBLE) or os.path.getsize(full) < MIN_COMPRESS_SIZE:
+            continue
+        with open(full, 'rb') as f:
+            data = f.read()
+        # mtime=0 讓相同輸入產生相同輸出
+        with open(full + '.gz', 'wb') as f:
+            with gzip.GzipFile(filename='', mode='wb', fileobj=f, compresslevel=level, mtime=0) as gz:
+                gz.write(data)
+        written.append(path + '.gz')
+        if brotli is not None:
+            with open(full + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+            written.append(path + '.br')
+
+    manifest = build_manifest(dist_dir)
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest, written, brotli is not None
+
+
+class FrontendAssets:
+    """依清單提供 vue/dist 的檔案"""
+
+    def __init__(self, dist_dir):
+        self.dist_dir = dist_dir
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        path = os.path.join(self.dist_dir, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        # 未執行 precompress 時即時產生（沒有壓縮版本）
+        return build_manifest(self.dist_dir)
+
+    def _negotiate(self, encodings):
+        accepted = request.accept_encodings
+        for encoding in encodings:
+            if accepted[encoding]:
+                return encoding
+        return None
+
+    def send(self, path, cache_control=None):
+        info = self.manifest[path]
+        full = os.path.join(self.dist_dir, path)
+        encoding = self._negotiate(info['encodings'])
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if encoding is not None:
+            full += '.br' if encoding == 'br' else '.gz'
+
+        # send_file 會使用 wsgi.file_wrapper（sendfile）
+        response = send_file(full, mimetype=mimetype, conditional=True,
+                             etag=f"{info['etag']}-{encoding}" if encoding else info['etag'])
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        if info['encodings']:
+            response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = cache_control or (
+            IMMUTABLE_CACHE_CONTROL if info['immutable'] else 'public, max-age=0, must-revalidate')
+        return response
+
+    def send_index(self):
+        return self.send('index.html', cache_control='no-cache')
+
+
+@frontend_bp.route('/', defaults={'path': ''}, methods=['GET'])
+@frontend_bp.route('/<path:path>', methods=['GET'])
+def serve_frontend(path):
+    """前端資源；非檔案路徑一律回傳 index.html 交給 Vue Router（SPA fallback）"""
+    assets = current_app.extensions['frontend']
+    if path.startswith('api/'):
+        return jsonify({"error": "找不到 API"}), 404
+    if path in assets.manifest and path != 'index.html':
+        return assets.send(path)
+    if os.path.splitext(path)[1]:
+        # 不在清單中的檔案（含舊版 bundle）不提供
+        return jsonify({"error": "找不到檔案"}), 404
+
+    prerenderer = current_app.extensions.get('prerender')
+    page = prerenderer.lookup(path) if prerenderer is not None else None
+    if page is not None:
+        kind, page_id, snapshot = page
+        if snapshot is not None:
+            response = send_file(snapshot, mimetype='text/html', conditional=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        # 尚未產生：先回傳一般 index.html，背景補產生
+        prerenderer.schedule(kind, page_id)
+    return assets.send_index()
+
+
+def _dist_dir(app):
+    return os.path.normpath(os.path.join(app.root_path, app.config['FRONTEND_DIST_DIR']))
+
+
+def _prerender_dir(app):
+    return os.path.join(app.root_path, app.config['PRERENDER_DIR'])
+
+
+def init_frontend(app):
+    """SERVE_FRONTEND 時由 Flask 直接提供 vue/dist；並註冊 flask frontend 指令"""
+    @app.cli.group('frontend')
+    def frontend_cli():
+        """前端建置相關指令"""
+
+    @frontend_cli.command('precompress')
+    @click.option('--level', default=9, help='gzip 壓縮等級')
+    def precompress_command(level):
+        """預先壓縮 vue/dist 並產生資源清單"""
+        dist_dir = _dist_dir(app)
+        manifest, written, has_brotli = precompress(dist_dir, level=level)
+        click.echo(f'{len(manifest)} 個檔案列入清單，產生 {len(written)} 個壓縮檔')
+        if not has_brotli:
+            click.echo('未安裝 brotli，只產生 gzip')
+
+    @frontend_cli.command('prerender')
+    def prerender_command():
+        """重新產生全部產品與分類頁的靜態快照"""
+        from utils.prerender import Prerenderer
+        prerenderer = Prerenderer(app, FrontendAssets(_dist_dir(app)), _prerender_dir(app))
+        click.echo(f'已產生 {prerenderer.render_all()} 個頁面')
+
+    if not app.config.get('SERVE_FRONTEND'):
+        return None
+    assets = FrontendAssets(_dist_dir(app))
+    app.extensions['frontend'] = assets
+    app.register_blueprint(frontend_bp)
+
+    if app.config.get('PRERENDER_ENABLED'):
+        from utils.prerender import Prerenderer
+        prerenderer = Prerenderer(app, assets, _prerender_dir(app))
+        prerenderer.register_listeners()
+        app.extensions['prerender'] = prerenderer
+    return assets
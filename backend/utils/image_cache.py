@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import current_app, send_file
+
+from models.database import get_bucket
+from models.hooks import on_change
+from utils.singleflight import SingleFlight
+
+class ImageEntry:
+    __slots__ = ('path', 'size', 'content_type', 'etag', 'source_url', 'stored_at')
+
+    def __init__(self, path, size, content_type, etag, source_url, stored_at):
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self.etag = etag
+        self.source_url = source_url
+        self.stored_at = stored_at
+
+
+class ImageDiskCache:
+    """有容量上限的圖片磁碟快取（LRU）
+
+    記憶體中保留 (集合, id) -> 檔案的索引，命中時不需讀取 Firestore。
+    每個檔案旁有 .json 描述檔，重新啟動或其他 worker 寫入的檔案都能重建索引。
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self._fills = SingleFlight()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _base_path(self, key):
+        digest = hashlib.sha1(f'{key[0]}/{key[1]}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def _read_meta(self, base):
+        try:
+            with open(base + '.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            size = os.path.getsize(base + '.bin')
+        except (OSError, ValueError):
+            return None, None
+        entry = ImageEntry(base + '.bin', size, meta['content_type'], meta['etag'],
+                           meta['source_url'], meta['stored_at'])
+        return (meta['collection'], meta['id']), entry
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                key, entry = self._read_meta(os.path.join(self.directory, name[:-5]))
+                if entry is not None:
+                    entries.append((os.path.getatime(entry.path), key, entry))
+        for _, key, entry in sorted(entries, key=lambda item: item[0]):
+            self._index[key] = entry
+            self.total_bytes += entry.size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._index:
+            _, entry = self._index.popitem(last=False)
+            self.total_bytes -= entry.size
+            self._remove_files(entry.path[:-4])
+
+    @staticmethod
+    def _remove_files(base):
+        for suffix in ('.bin', '.json'):
+            try:
+                os.remove(base + suffix)
+            except FileNotFoundError:
+                pass
+
+    def _add(self, key, entry):
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self._index[key] = entry
+            self.total_bytes += entry.size
+            self._evict()
+
+    def lookup(self, key, max_age=None):
+        """命中時回傳 ImageEntry；max_age 秒後的項目視為需要重新確認"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None:
+                self._index.move_to_end(key)
+        if entry is None:
+            # 其他 worker 可能已寫入同一目錄
+            found_key, entry = self._read_meta(self._base_path(key))
+            if entry is None or found_key != key:
+                return None
+            self._add(key, entry)
+        elif not os.path.exists(entry.path):
+            # 已被其他 worker 淘汰
+            self.invalidate(key)
+            return None
+        if max_age is not None and time.time() - entry.stored_at > max_age:
+            return None
+        return entry
+
+    def fill(self, key, source_url, content_type, download):
+        """下載到暫存檔後原子替換；相同 key 的並行 miss 只下載一次"""
+        def _download():
+            base = self._base_path(key)
+            tmp = f'{base}.{uuid.uuid4().hex}.tmp'
+            try:
+                download(tmp)
+                os.replace(tmp, base + '.bin')
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            stored_at = time.time()
+            # 同一來源 URL 即同一內容：ETag 在各實例與重新下載後保持一致
+            etag = hashlib.sha1(source_url.encode('utf-8')).hexdigest()[:16]
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump({'collection': key[0], 'id': key[1], 'content_type': content_type,
+                           'etag': etag, 'source_url': source_url, 'stored_at': stored_at}, f)
+            entry = ImageEntry(base + '.bin', os.path.getsize(base + '.bin'), content_type,
+                               etag, source_url, stored_at)
+            self._add(key, entry)
+            return entry
+
+        entry, _ = self._fills.do(key, _download)
+        return entry
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry.size
+        self._remove_files(self._base_path(key))
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._index), 'bytes': self.total_bytes,
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                # 相對路徑以 app 根目錄為準（send_file 也以此解析）
+                directory = os.path.join(current_app.root_path, current_app.config['IMAGE_CACHE_DIR'])
+                _image_cache = ImageDiskCache(directory, current_app.config['IMAGE_CACHE_MAX_BYTES'])
+    return _image_cache
+
+
+def proxy_enabled():
+    return current_app.config.get('IMAGE_PROXY_ENABLED', False)
+
+
+def _download_blob(image_url):
+    def _download(filename):
+        bucket = get_bucket()
+        path = image_url.split(bucket.name + '/')[-1].split('?')[0]
+        bucket.blob(path).download_to_filename(filename)
+    return _download
+
+
+def serve_image(collection, record_id, load_record):
+    """代理模式下回傳圖片檔案（支援 Range 與條件式請求）
+
+    load_record() 只在快取 miss 時呼叫，需回傳含 image_url / image_type 的物件或 None。
+    圖片 URL 不含版本（同一 ID 可能換圖），超過 IMAGE_PROXY_REVALIDATE 秒會重新比對紀錄，
+    瀏覽器也只快取同樣秒數，之後以 ETag 條件式請求確認。
+    """
+    cache = get_image_cache()
+    key = (collection, str(record_id))
+    revalidate = current_app.config.get('IMAGE_PROXY_REVALIDATE', 300)
+
+    entry = cache.lookup(key, max_age=revalidate)
+    if entry is not None:
+        cache.hits += 1
+    else:
+        cache.misses += 1
+        record = load_record()
+        if not record or not record.image_url:
+            return None
+        stale = cache.lookup(key)
+        if stale is not None and stale.source_url == record.image_url:
+            # 內容未變，只更新確認時間
+            stale.stored_at = time.time()
+            entry = stale
+        else:
+            entry = cache.fill(key, record.image_url, record.image_type or 'image/jpeg',
+                               _download_blob(record.image_url))
+
+    response = send_file(entry.path, mimetype=entry.content_type, conditional=True,
+                         etag=entry.etag, last_modified=entry.stored_at)
+    response.headers['Cache-Control'] = f'public, max-age={revalidate}'
+    return response
+
+
+def _invalidate(collection):
+    def _listener(action, obj):
+        if _image_cache is not None and obj.id:
+            _image_cache.invalidate((collection, str(obj.id)))
+    return _listener
+
+
+on_change('product_images', _invalidate('product_images'))
+on_change('carousels', _invalidate('carousels'))
@@ -0,0 +1,337 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+# 背景工作：名稱 -> fn(payload, data)，回傳值需可 JSON 序列化
+_TASKS = {}
+# 沒有 app context 時使用的佇列（init_job_queue 時設定）
+_default_queue = None
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+
+def register_task(name):
+    """註冊背景工作的裝飾器；工作需可重複執行（重試或租約過期時會再執行一次）"""
+    def wrapper(fn):
+        _TASKS[name] = fn
+        return fn
+    return wrapper
+
+
+def _load_tasks():
+    import utils.tasks  # noqa: F401  註冊內建工作
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class JobQueue:
+    """本機持久化工作佇列（SQLite，重新啟動後未完成的工作會繼續執行，多個 worker 行程共用）
+
+    取出工作時以 BEGIN IMMEDIATE 鎖定，同一筆工作只會交給一個執行緒；執行中的工作有租約，
+    行程中途結束時租約過期後重新排入。失敗的工作以指數退避重試，超過 max_attempts 次後標記為 failed。
+    相同 idempotency_key 的工作只會建立一次。
+    """
+
+    def __init__(self, path, workers=2, max_attempts=5, backoff=2.0, max_delay=300,
+                 lease_seconds=300, poll_interval=1.0, app=None):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.app = app
+        self.executed = 0
+        self.retried = 0
+        self.failed = 0
+        self.lost = 0
+        self._worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                data BLOB,
+                idempotency_key TEXT UNIQUE,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_at REAL NOT NULL,
+                lease_until REAL,
+                worker TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_at)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'payload': json.loads(row['payload']),
+            'idempotency_key': row['idempotency_key'],
+            'attempts': row['attempts'],
+            'max_attempts': row['max_attempts'],
+            'run_at': row['run_at'],
+            'result': json.loads(row['result']) if row['result'] is not None else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+
+    def enqueue(self, kind, payload=None, data=None, idempotency_key=None, delay=0,
+                max_attempts=None):
+        """加入工作並回傳工作內容；idempotency_key 已存在時回傳既有的工作，不重複建立
+
+        data 為隨工作保存的位元組（例如待上傳的檔案），成功後清除。
+        """
+        if kind not in _TASKS:
+            raise KeyError(f"未註冊的背景工作: {kind}")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR IGNORE INTO jobs (id, kind, payload, data, idempotency_key, status, '
+            'max_attempts, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, _json(payload or {}), data, idempotency_key, 'queued',
+             max_attempts or self.max_attempts, now + delay, now, now))
+        if idempotency_key is not None:
+            row = conn.execute('SELECT * FROM jobs WHERE idempotency_key = ?',
+                               (idempotency_key,)).fetchone()
+        else:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        self._wakeup.set()
+        return self._to_dict(row)
+
+    def get(self, job_id):
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list(self, status=None, kind=None, limit=50):
+        """最近更新的工作（可依狀態、種類篩選）"""
+        where, params = [], []
+        if status:
+            where.append('status = ?')
+            params.append(status)
+        if kind:
+            where.append('kind = ?')
+            params.append(kind)
+        sql = 'SELECT * FROM jobs'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY updated_at DESC LIMIT ?'
+        rows = self._connect().execute(sql, params + [limit]).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def retry(self, job_id):
+        """將失敗的工作重新排入（重設嘗試次數），回傳是否成功"""
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, run_at = ?, error = NULL, "
+            "updated_at = ? WHERE id = ? AND status = 'failed'", (now, now, job_id))
+        self._wakeup.set()
+        return cursor.rowcount > 0
+
+    def purge(self, older_than):
+        """刪除 older_than（time.time() 值）之前已結束的工作，回傳刪除筆數"""
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+            (older_than,))
+        return cursor.rowcount
+
+    def claim(self):
+        """取出一筆可執行的工作（排定時間已到，或執行中但租約已過期），沒有時回傳 None"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND run_at <= ?) "
+                "OR (status = 'running' AND lease_until < ?) ORDER BY run_at LIMIT 1",
+                (now, now)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, "
+                    "worker = ?, updated_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, self._worker_id, now, row['id']))
+                row = conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return row
+
+    def _settle(self, row, assignments, params):
+        """只在這次嘗試仍持有租約時寫入結果，回傳是否寫入
+
+        租約過期後工作可能已被其他 worker 重新取出（attempts 會增加）；此時結果以新的嘗試為準。
+        同一行程的執行緒共用 worker id，因此同時比對 attempts。
+        """
+        cursor = self._connect().execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ? AND status = 'running' "
+            "AND attempts = ? AND worker = ?",
+            (*params, row['id'], row['attempts'], row['worker']))
+        if cursor.rowcount == 0:
+            self.lost += 1
+            print(f"Job {row['kind']} {row['id']} lost its lease during attempt {row['attempts']}; "
+                  "result ignored")
+            return False
+        return True
+
+    def _finish(self, row, result):
+        now = time.time()
+        if self._settle(row, "status = 'succeeded', result = ?, error = NULL, data = NULL, "
+                             "lease_until = NULL, updated_at = ?", (_json(result), now)):
+            self.executed += 1
+
+    def _fail(self, row, error):
+        now = time.time()
+        if row['attempts'] < row['max_attempts']:
+            delay = min(self.max_delay, self.backoff * (2 ** (row['attempts'] - 1)))
+            if self._settle(row, "status = 'queued', run_at = ?, error = ?, lease_until = NULL, "
+                                 "updated_at = ?", (now + delay, error, now)):
+                self.retried += 1
+        elif self._settle(row, "status = 'failed', error = ?, lease_until = NULL, updated_at = ?",
+                          (error, now)):
+            self.failed += 1
+            print(f"Job {row['kind']} {row['id']} failed after {row['attempts']} attempts: {error}")
+
+    def run(self, row):
+        """執行一筆已取出的工作並記錄結果"""
+        fn = _TASKS.get(row['kind'])
+        try:
+            if fn is None:
+                raise KeyError(f"未註冊的背景工作: {row['kind']}")
+            payload = json.loads(row['payload'])
+            if self.app is not None:
+                with self.app.app_context():
+                    result = fn(payload, row['data'])
+            else:
+                result = fn(payload, row['data'])
+        except Exception as e:
+            self._fail(row, f'{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}')
+            return False
+        self._finish(row, result)
+        return True
+
+    def run_pending(self, limit=None):
+        """在目前執行緒執行所有可執行的工作（命令列或測試用），回傳執行筆數"""
+        count = 0
+        while limit is None or count < limit:
+            row = self.claim()
+            if row is None:
+                break
+            self.run(row)
+            count += 1
+        return count
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                row = self.claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming job: {str(e)}")
+                row = None
+            if row is None:
+                # 其他行程加入的工作要等到下一次輪詢才會看到
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self.run(row)
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stopping.clear()
+
+    def stats(self):
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        for status, count in self._connect().execute(
+                'SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+            counts[status] = count
+        oldest = self._connect().execute(
+            "SELECT MIN(run_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {
+            'workers': len(self._threads),
+            'jobs': counts,
+            'oldest_queued_age': round(max(0.0, time.time() - oldest), 1) if oldest else None,
+            'executed': self.executed,
+            'retried': self.retried,
+            'failed': self.failed,
+            'lost': self.lost
+        }
+
+
+def get_job_queue():
+    """目前 app 的工作佇列；不在 app context 中時為 init_job_queue 建立的佇列"""
+    from flask import current_app, has_app_context
+    if has_app_context():
+        return current_app.extensions.get('job_queue')
+    return _default_queue
+
+
+def enqueue(kind, payload=None, data=None, idempotency_key=None, **kwargs):
+    """加入背景工作；佇列未啟用時直接在目前執行緒執行（回傳 None）"""
+    _load_tasks()
+    queue = get_job_queue()
+    if queue is None:
+        _TASKS[kind](payload or {}, data)
+        return None
+    return queue.enqueue(kind, payload, data, idempotency_key, **kwargs)
+
+
+def init_job_queue(app):
+    """JOBS_ENABLED 時建立工作佇列並啟動 worker 執行緒"""
+    global _default_queue
+    if not app.config.get('JOBS_ENABLED', True):
+        return None
+    _load_tasks()
+    path = app.config.get('JOB_QUEUE_PATH', 'jobs.db')
+    queue = JobQueue(os.path.join(app.root_path, path),
+                     workers=app.config.get('JOB_WORKERS', 2),
+                     max_attempts=app.config.get('JOB_MAX_ATTEMPTS', 5),
+                     backoff=app.config.get('JOB_RETRY_BACKOFF', 2.0),
+                     max_delay=app.config.get('JOB_RETRY_MAX_DELAY', 300),
+                     lease_seconds=app.config.get('JOB_LEASE_SECONDS', 300),
+                     poll_interval=app.config.get('JOB_POLL_INTERVAL', 1.0),
+                     app=app)
+    app.extensions['job_queue'] = queue
+    _default_queue = queue
+    queue.start()
+    return queue
@@ -0,0 +1,198 @@
+import math
+import threading
+import time
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from utils.subrequest import SUBREQUEST_ENVIRON_KEY
+
+# 本次請求佔用的名額，存於 WSGI environ（就地執行的子請求與外層共用 app context 與 g）
+_STATE_ENVIRON_KEY = 'myweb.load_shedding'
+
+# 不受限制的端點（健康檢查必須在滿載時仍能回應）
+EXEMPT_ENDPOINTS = ('health.liveness', 'health.readiness', 'health.replica_status',
+                    'health.limits_status', 'health.cache_status', 'health.firestore_status',
+                    'health.circuit_status', 'health.jobs_status', 'health.access_status',
+                    'static')
+
+
+class AdaptiveLimiter:
+    """自適應並行上限（gradient 演算法）
+
+    以長期平均延遲與本次延遲的比值調整上限：延遲上升時收斂、平穩時緩慢放寬。
+    額滿時在短佇列中等待 queue_timeout 秒，佇列也滿或逾時即拒絕。
+    """
+
+    def __init__(self, name, initial_limit=20, min_limit=2, max_limit=200,
+                 max_queue=10, queue_timeout=0.5, tolerance=1.5):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.inflight = 0
+        self.waiting = 0
+        self.shed = 0
+        self.long_rtt = None
+        self._cond = threading.Condition()
+
+    def _capacity(self, reserve):
+        return max(self.min_limit, int(self.limit * (1 - reserve)))
+
+    def acquire(self, priority=False, reserve=0.0):
+        """取得執行名額；priority 可使用保留額度並擁有兩倍佇列"""
+        capacity = self._capacity(0.0 if priority else reserve)
+        max_queue = self.max_queue * (2 if priority else 1)
+        with self._cond:
+            if self.inflight < capacity:
+                self.inflight += 1
+                return True
+            if self.waiting >= max_queue:
+                self.shed += 1
+                return False
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.inflight >= capacity:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        return False
+                    self._cond.wait(remaining)
+                    capacity = self._capacity(0.0 if priority else reserve)
+                self.inflight += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self, latency, failed=False):
+        with self._cond:
+            observed_load = self.inflight
+            self.inflight -= 1
+            if failed:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            elif observed_load * 2 >= self.limit:
+                # 只在實際負載接近上限時調整，閒置時不會無限放寬
+                if self.long_rtt is None:
+                    self.long_rtt = latency
+                self.long_rtt = 0.95 * self.long_rtt + 0.05 * latency
+                gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / max(latency, 1e-6)))
+                new_limit = self.limit * gradient + math.sqrt(self.limit)
+                self.limit = min(self.max_limit, max(self.min_limit, 0.8 * self.limit + 0.2 * new_limit))
+            self._cond.notify()
+
+    def cancel(self):
+        """歸還名額但不計入延遲樣本"""
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+    def retry_after(self):
+        """建議的 Retry-After 秒數：依平均延遲與目前排隊量估算"""
+        rtt = self.long_rtt or 1.0
+        return max(1, int(math.ceil(rtt * (1 + self.waiting / max(self.limit, 1)))))
+
+    def to_dict(self):
+        return {
+            'limit': round(self.limit, 2),
+            'inflight': self.inflight,
+            'waiting': self.waiting,
+            'shed': self.shed,
+            'avg_latency_ms': round(self.long_rtt * 1000, 2) if self.long_rtt else None
+        }
+
+
+class LoadShedder:
+    """全域加上每個端點各自的自適應上限；超載時快速回傳 503 + Retry-After"""
+
+    def __init__(self, app):
+        self.default = dict(app.config.get('ENDPOINT_CONCURRENCY_DEFAULT', {}))
+        self.overrides = dict(app.config.get('ENDPOINT_CONCURRENCY', {}))
+        self.priority_endpoints = set(app.config.get('PRIORITY_ENDPOINTS', ()))
+        self.reserve = app.config.get('PRIORITY_RESERVE', 0.2)
+        self.global_limiter = AdaptiveLimiter('global', **app.config.get('GLOBAL_CONCURRENCY', {}))
+        self.limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter_for(self, endpoint):
+        limiter = self.limiters.get(endpoint)
+        if limiter is None:
+            with self._lock:
+                limiter = self.limiters.get(endpoint)
+                if limiter is None:
+                    options = dict(self.default, **self.overrides.get(endpoint, {}))
+                    limiter = self.limiters[endpoint] = AdaptiveLimiter(endpoint, **options)
+        return limiter
+
+    def is_priority(self, endpoint):
+        """便宜的端點，或帶有效 JWT（簽章與期限已驗證）的請求優先；只帶 Authorization 標頭不算"""
+        if endpoint in self.priority_endpoints:
+            return True
+        if 'Authorization' not in request.headers:
+            return False
+        try:
+            verify_jwt_in_request(optional=True)
+            return get_jwt_identity() is not None
+        except Exception:
+            return False
+
+    def before_request(self):
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in EXEMPT_ENDPOINTS:
+            return None
+        priority = self.is_priority(endpoint)
+        limiter = self.limiter_for(endpoint)
+
+        # 內部子請求（/api/batch 等）的全域名額已由外層請求佔用，只需取得端點名額
+        subrequest = bool(request.environ.get(SUBREQUEST_ENVIRON_KEY))
+        if not subrequest and not self.global_limiter.acquire(priority, self.reserve):
+            return self._reject(self.global_limiter)
+        if not limiter.acquire(priority):
+            if not subrequest:
+                self.global_limiter.cancel()
+            return self._reject(limiter)
+
+        request.environ[_STATE_ENVIRON_KEY] = [limiter, not subrequest, time.perf_counter(), 200]
+        return None
+
+    def after_request(self, response):
+        state = request.environ.get(_STATE_ENVIRON_KEY)
+        if state is not None:
+            state[3] = response.status_code
+        return response
+
+    def teardown_request(self, exc):
+        state = request.environ.pop(_STATE_ENVIRON_KEY, None)
+        if state is None:
+            return
+        limiter, holds_global, started, status = state
+        latency = time.perf_counter() - started
+        failed = exc is not None or status >= 500
+        limiter.release(latency, failed)
+        if holds_global:
+            self.global_limiter.release(latency, failed)
+
+    def _reject(self, limiter):
+        response = jsonify({"error": "伺服器忙碌，請稍後再試"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(limiter.retry_after())
+        return response
+
+    def stats(self):
+        return {
+            'global': self.global_limiter.to_dict(),
+            'endpoints': {name: l.to_dict() for name, l in sorted(self.limiters.items())}
+        }
+
+
+def init_load_shedding(app):
+    """LOAD_SHEDDING_ENABLED 時掛上 before/after/teardown hooks"""
+    if not app.config.get('LOAD_SHEDDING_ENABLED', True):
+        return None
+    shedder = LoadShedder(app)
+    app.extensions['load_shedder'] = shedder
+    app.before_request(shedder.before_request)
+    app.after_request(shedder.after_request)
+    app.teardown_request(shedder.teardown_request)
+    return shedder
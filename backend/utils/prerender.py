@@ -0,0 +1,232 @@
+import inspect
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import uuid
+from markupsafe import escape
+
+from models.hooks import on_change
+from utils.subrequest import SUBREQUEST_ENVIRON_KEY
+
+# 頁面路徑（Vue Router）與其首屏需要的 API
+PAGES = {
+    'product': ('product/{id}', ('/api/products/{id}',)),
+    'main': ('products/main/{id}', ('/api/products/category/main/{id}', '/api/categories/')),
+    'sub': ('products/sub/{id}', ('/api/products/category/sub/{id}', '/api/categories/')),
+}
+PAGE_PATTERN = re.compile(r'^(product|products/main|products/sub)/([^/]+)$')
+PAGE_KINDS = {'product': 'product', 'products/main': 'main', 'products/sub': 'sub'}
+
+
+def _json_for_html(data):
+    # 避免 </script> 與 HTML 註解提早結束 script 區塊
+    return (json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+            .replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026'))
+
+
+def _category_names(categories):
+    names = {}
+    for main in categories or []:
+        names[('main', main['id'])] = main['name']
+        for sub in main.get('subcategories', []):
+            names[('sub', sub['id'])] = sub['name']
+    return names
+
+
+def _render_body(kind, page_id, data):
+    """首屏靜態內容；Vue 掛載時會取代 #app 內容"""
+    if kind == 'product':
+        product = data.get(PAGES['product'][1][0].format(id=page_id))
+        if not product:
+            return None, None
+        main = next((img for img in product.get('images', []) if img.get('is_main')), None)
+        main = main or (product.get('images') or [None])[0]
+        parts = [f'<h1>{escape(product["name"])}</h1>']
+        if product.get('model'):
+            parts.append(f'<p class="model">{escape(product["model"])}</p>')
+        if product.get('price') is not None:
+            parts.append(f'<p class="price">NT$ {product["price"]:,.0f}</p>')
+        if main:
+            parts.append(f'<img src="/api/products/image/{escape(main["id"])}" alt="{escape(product["name"])}">')
+        if product.get('description'):
+            parts.append(f'<p>{escape(product["description"])}</p>')
+        return product['name'], '<main class="prerendered">' + ''.join(parts) + '</main>'
+
+    paths = PAGES[kind][1]
+    products = data.get(paths[0].format(id=page_id))
+    if products is None:
+        return None, None
+    title = _category_names(data.get(paths[1])).get((kind, page_id), '')
+    items = ''.join(f'<li><a href="/product/{escape(p["id"])}">{escape(p["name"])}</a></li>'
+                    for p in products)
+    return title, f'<main class="prerendered"><h1>{escape(title)}</h1><ul>{items}</ul></main>'
+
+
+class Prerenderer:
+    """產品與分類頁的靜態 HTML 快照
+
+    快照 = 目前的 index.html + 首屏 API 資料（window.__INITIAL_DATA__，以 API 路徑為 key）
+    + #app 內的靜態內容。依 index.html 的 etag 分目錄存放，前端重新建置後舊快照自動失效。
+    模型變更只重新產生受影響的頁面（背景單一執行緒，重複的頁面會合併）。
+    """
+
+    def __init__(self, app, assets, directory):
+        self.app = app
+        self.assets = assets
+        self.root = directory
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._worker = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        return os.path.join(self.root, self.assets.manifest['index.html']['etag'])
+
+    def _path(self, kind, page_id):
+        return os.path.join(self.directory, PAGES[kind][0].format(id=page_id) + '.html')
+
+    def lookup(self, path):
+        """回傳 (kind, id, 快照檔路徑或 None)；非預渲染頁面回傳 None"""
+        match = PAGE_PATTERN.match(path)
+        if not match:
+            return None
+        kind, page_id = PAGE_KINDS[match.group(1)], match.group(2)
+        if '..' in page_id:
+            return None
+        snapshot = self._path(kind, page_id)
+        return kind, page_id, (snapshot if os.path.exists(snapshot) else None)
+
+    def _call_api(self, api_path):
+        """直接呼叫 API 處理函式（略過回應快取與 single-flight），只收 200 結果"""
+        adapter = self.app.url_map.bind('localhost')
+        endpoint, args = adapter.match(api_path, method='GET')
+        view = inspect.unwrap(self.app.view_functions[endpoint])
+        # 標記為內部子請求（不計入產品瀏覽等統計）
+        with self.app.test_request_context(api_path, environ_base={SUBREQUEST_ENVIRON_KEY: True}):
+            response = self.app.make_response(view(**args))
+        return response.get_json() if response.status_code == 200 else None
+
+    def render(self, kind, page_id):
+        """產生單一頁面；資料不存在時刪除舊快照"""
+        data = {}
+        for template in PAGES[kind][1]:
+            api_path = template.format(id=page_id)
+            data[api_path] = self._call_api(api_path)
+
+        snapshot = self._path(kind, page_id)
+        title, body = _render_body(kind, page_id, data)
+        if body is None:
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+            return None
+
+        with open(os.path.join(self.assets.dist_dir, 'index.html'), 'r', encoding='utf-8') as f:
+            html = f.read()
+        script = f'<script>window.__INITIAL_DATA__={_json_for_html(data)}</script>'
+        if title:
+            html = re.sub(r'<title>.*?</title>', lambda m: f'<title>{escape(title)}</title>', html, count=1)
+        html = html.replace('</head>', script + '</head>', 1)
+        html = html.replace('<div id="app"></div>', f'<div id="app">{body}</div>', 1)
+
+        os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+        tmp = f'{snapshot}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(html)
+        os.replace(tmp, snapshot)
+        return snapshot
+
+    def render_all(self):
+        """重新產生全部頁面，並清除舊版 index.html 的快照目錄"""
+        from models.category import MainCategory, SubCategory
+        from models.product import Product
+
+        count = 0
+        with self.app.app_context():
+            pages = [('main', c.id) for c in MainCategory.all()]
+            pages += [('sub', c.id) for c in SubCategory.all()]
+            pages += [('product', p.id) for p in Product.query().all()]
+            for kind, page_id in pages:
+                if self.render(kind, page_id):
+                    count += 1
+
+        current = os.path.basename(self.directory)
+        for name in os.listdir(self.root):
+            if name != current:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        return count
+
+    def schedule(self, kind, page_id):
+        """排入背景重新產生（相同頁面尚未處理時不重複排入）"""
+        if not page_id:
+            return
+        key = (kind, str(page_id))
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._submit(('page', key))
+
+    def _submit(self, item):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='prerender', daemon=True)
+                self._worker.start()
+        self._queue.put(item)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                with self.app.app_context():
+                    if item[0] == 'page':
+                        with self._lock:
+                            self._pending.discard(item[1])
+                        self.render(*item[1])
+                    else:
+                        # 找出受影響的頁面（在背景執行，不拖慢 save()）
+                        _, handler, obj = item
+                        handler(obj)
+            except Exception as e:
+                print(f"Error prerendering {item[1]}: {str(e)}")
+
+    # ---- 模型變更 → 受影響的頁面（於背景執行緒、app context 內執行） ----
+
+    def _on_product(self, product):
+        from models.category import SubCategory
+        self.schedule('product', product.id)
+        self.schedule('sub', product.sub_category_id)
+        sub = SubCategory.get(product.sub_category_id) if product.sub_category_id else None
+        if sub is not None:
+            self.schedule('main', sub.main_category_id)
+
+    def _on_image(self, image):
+        from models.product import Product
+        product = Product.get(image.product_id) if image.product_id else None
+        if product is not None:
+            # 分類頁的列表也會顯示主圖片
+            self._on_product(product)
+
+    def _on_sub_category(self, sub):
+        from models.product import Product
+        self.schedule('sub', sub.id)
+        self.schedule('main', sub.main_category_id)
+        for product in Product.filter_by(sub_category_id=sub.id):
+            self.schedule('product', product.id)
+
+    def _on_main_category(self, main):
+        from models.category import SubCategory
+        self.schedule('main', main.id)
+        for sub in SubCategory.filter_by(main_category_id=main.id):
+            self._on_sub_category(sub)
+
+    def register_listeners(self):
+        for collection, handler in (('products', self._on_product),
+                                    ('product_images', self._on_image),
+                                    ('sub_categories', self._on_sub_category),
+                                    ('main_categories', self._on_main_category)):
+            on_change(collection, lambda action, obj, handler=handler: self._submit(('resolve', handler, obj)))
@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+
+from models.hooks import on_change, on_replicated
+from utils.singleflight import auth_scope
+
+
+class CacheEntry:
+    __slots__ = ('body', 'status', 'headers', 'stored_at', 'ttl', 'swr', 'sie',
+                 'tags', 'invalidated', 'refreshing')
+
+    def __init__(self, body, status, headers, ttl, swr, sie, tags):
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.stored_at = time.time()
+        self.ttl = ttl
+        self.swr = swr
+        self.sie = sie
+        self.tags = tags
+        self.invalidated = False
+        self.refreshing = False
+
+    def age(self):
+        return time.time() - self.stored_at
+
+
+class ResponseCache:
+    """以 URL + 授權範圍為 key 的完整回應快取（LRU）"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}   # tag -> 失效次數
+        self._lock = threading.Lock()
+        self.stats = {'hit': 0, 'stale': 0, 'stale_if_error': 0, 'miss': 0, 'invalidated': 0,
+                      'discarded': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def generation(self, tags):
+        """tags 目前的失效次數；產生回應前取得，存入時用來判斷期間是否有寫入"""
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in sorted(tags))
+
+    def set(self, key, entry, generation=None):
+        """存入項目；generation 與目前不同（產生期間 tags 已失效）時不存入並回傳 False"""
+        with self._lock:
+            if generation is not None and generation != tuple(
+                    self._generations.get(tag, 0) for tag in sorted(entry.tags)):
+                self.stats['discarded'] += 1
+                return False
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, tag):
+        """標記含有 tag 的項目失效：不再當作新鮮或 SWR 使用，但仍可作為 stale-if-error 備援
+
+        同時遞增 tag 的失效次數，失效前開始產生、失效後才完成的回應不會存入。
+        """
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for entry in self._entries.values():
+                if tag in entry.tags and not entry.invalidated:
+                    entry.invalidated = True
+                    self.stats['invalidated'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+
+response_cache = ResponseCache()
+_tag_listeners = set()
+
+
+def _cache_key():
+    return (request.path, tuple(sorted(request.args.items(multi=True))), auth_scope())
+
+
+def _build_response(entry, state):
+    response = current_app.response_class(entry.body, status=entry.status, headers=entry.headers)
+    response.headers['X-Cache'] = state
+    response.headers['Age'] = str(int(entry.age()))
+    return response
+
+
+def _route_policy(ttl, swr, sie):
+    override = current_app.config.get('RESPONSE_CACHE_TTLS', {}).get(request.endpoint)
+    if isinstance(override, dict):
+        return (override.get('ttl', ttl), override.get('stale_while_revalidate', swr),
+                override.get('stale_if_error', sie))
+    if override is not None:
+        return override, swr, sie
+    return ttl, swr, sie
+
+
+def _refresh_in_background(key, entry, fn, args, kwargs, policy, tags):
+    """背景重新產生回應；同一個項目同時只會有一個刷新"""
+    app = current_app._get_current_object()
+    path, query_string = request.path, request.query_string
+    headers = {'Authorization': request.headers['Authorization']} if 'Authorization' in request.headers else {}
+
+    def _run():
+        try:
+            generation = response_cache.generation(tags)
+            with app.test_request_context(path, query_string=query_string, headers=headers):
+                response = app.make_response(fn(*args, **kwargs))
+                if response.status_code == 200:
+                    _store(key, response, policy, tags, generation)
+        except Exception as e:
+            print(f"Error refreshing cached response {path}: {str(e)}")
+        finally:
+            entry.refreshing = False
+
+    threading.Thread(target=_run, name='cache-refresh', daemon=True).start()
+
+
+def _store(key, response, policy, tags, generation):
+    ttl, swr, sie = policy
+    scope = 'public' if key[2] == 'anon' else 'private'
+    response.headers['Cache-Control'] = (f'{scope}, max-age={ttl}, '
+                                         f'stale-while-revalidate={swr}, stale-if-error={sie}')
+    headers = [(k, v) for k, v in response.headers.items() if k not in ('X-Cache', 'Age', 'X-Coalesced')]
+    response_cache.set(key, CacheEntry(response.get_data(), response.status_code, headers,
+                                       ttl, swr, sie, tags), generation)
+
+
+def cached_response(ttl=60, stale_while_revalidate=300, stale_if_error=3600, tags=()):
+    """公開 GET 端點的回應快取
+
+    - 新鮮期內直接回傳（X-Cache: HIT）
+    - 超過 ttl 但在 stale_while_revalidate 內：回傳舊內容並於背景刷新一次（STALE）
+    - 重新產生失敗（例外或 5xx）時，stale_if_error 內回傳舊內容（STALE-IF-ERROR）
+    - tags 對應的模型 save()/delete() 會讓項目失效
+    RESPONSE_CACHE_TTLS 可依端點覆寫 ttl。
+    """
+    tags = frozenset(tags)
+    for tag in tags:
+        if tag not in _tag_listeners:
+            _tag_listeners.add(tag)
+            on_change(tag, lambda action, obj, tag=tag: response_cache.invalidate(tag))
+            # 讀取副本追上寫入後再失效一次，副本落後期間存入的舊資料不會保留到 ttl 結束
+            on_replicated(tag, lambda tag=tag: response_cache.invalidate(tag))
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not current_app.config.get('RESPONSE_CACHE_ENABLED', True):
+                return fn(*args, **kwargs)
+
+            policy = _route_policy(ttl, stale_while_revalidate, stale_if_error)
+            key = _cache_key()
+            entry = response_cache.get(key)
+
+            if entry is not None and not entry.invalidated:
+                age = entry.age()
+                if age < entry.ttl:
+                    response_cache.count('hit')
+                    return _build_response(entry, 'HIT')
+                if age < entry.ttl + entry.swr:
+                    if not entry.refreshing:
+                        entry.refreshing = True
+                        _refresh_in_background(key, entry, fn, args, kwargs, policy, tags)
+                    response_cache.count('stale')
+                    return _build_response(entry, 'STALE')
+
+            def _stale_fallback():
+                if entry is not None and entry.age() < entry.ttl + entry.sie:
+                    response_cache.count('stale_if_error')
+                    return _build_response(entry, 'STALE-IF-ERROR')
+                return None
+
+            generation = response_cache.generation(tags)
+            try:
+                response = current_app.make_response(fn(*args, **kwargs))
+            except Exception:
+                fallback = _stale_fallback()
+                if fallback is not None:
+                    return fallback
+                raise
+
+            if response.status_code >= 500:
+                fallback = _stale_fallback()
+                if fallback is not None:
+                    return fallback
+            elif response.status_code == 200:
+                _store(key, response, policy, tags, generation)
+
+            response_cache.count('miss')
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,115 @@
+import copy
+import hashlib
+import threading
+from functools import wraps
+from flask import current_app, has_app_context, request
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """相同 key 的並行呼叫只執行一次，其餘呼叫等待並共用結果"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """回傳 (result, shared)；shared 為 True 表示結果來自其他呼叫"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def inflight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+request_flights = SingleFlight()
+model_flights = SingleFlight()
+
+
+def _enabled():
+    return not has_app_context() or current_app.config.get('SINGLE_FLIGHT_ENABLED', True)
+
+
+def auth_scope():
+    """授權範圍：匿名共用，帶 token 的請求依 token 雜湊分開"""
+    header = request.headers.get('Authorization')
+    if not header:
+        return 'anon'
+    return 'auth:' + hashlib.sha256(header.encode('utf-8')).hexdigest()[:16]
+
+
+def request_key():
+    """正規化的請求 key：路徑 + 排序後的查詢參數 + 授權範圍"""
+    args = sorted(request.args.items(multi=True))
+    return (request.method, request.path, tuple(args), auth_scope())
+
+
+def coalesce_request(fn):
+    """處理函式層級的 single-flight：並行的相同 GET 請求共用一次計算結果"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not _enabled():
+            return fn(*args, **kwargs)
+
+        def _compute():
+            response = current_app.make_response(fn(*args, **kwargs))
+            return response.get_data(), response.status_code, list(response.headers.items())
+
+        (body, status, headers), shared = request_flights.do(request_key(), _compute)
+        response = current_app.response_class(body, status=status, headers=headers)
+        if shared:
+            response.headers['X-Coalesced'] = '1'
+        return response
+    return wrapper
+
+
+def _clone_result(result):
+    # 模型物件可被呼叫端修改，共用結果時給每個等待者一份淺拷貝
+    if isinstance(result, list):
+        return [copy.copy(item) for item in result]
+    return copy.copy(result)
+
+
+def coalesce_method(fn):
+    """模型讀取方法的 single-flight（置於 @classmethod 之下）"""
+    @wraps(fn)
+    def wrapper(cls, *args, **kwargs):
+        if not _enabled():
+            return fn(cls, *args, **kwargs)
+        key = (cls.COLLECTION, fn.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return fn(cls, *args, **kwargs)
+        result, shared = model_flights.do(key, lambda: fn(cls, *args, **kwargs))
+        return _clone_result(result) if shared else result
+    return wrapper
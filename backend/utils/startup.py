@@ -0,0 +1,128 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# 預熱掛勾：名稱 -> fn(app)，依註冊順序執行
+_WARMUP_HOOKS = {}
+
+
+def register_warmup(name, fn):
+    """註冊預熱步驟，在 worker 回報 ready 之前執行"""
+    _WARMUP_HOOKS[name] = fn
+
+
+class StartupState:
+    """記錄啟動各階段耗時與 readiness 狀態"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.phases = {}
+        self.ready = threading.Event()
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = round(seconds * 1000, 2)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    def to_dict(self):
+        with self._lock:
+            phases = dict(self.phases)
+        return {
+            'ready': self.ready.is_set(),
+            'uptime': round(time.time() - self.started_at, 3),
+            'phases_ms': phases,
+            'error': self.error
+        }
+
+
+class LazyFirestoreClient:
+    """延遲建立的 Firestore client，第一次存取屬性時才初始化"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self):
+        return self._client is not None
+
+    def resolve(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+
+def _open_firestore_channel(app):
+    """建立 client 並送出一次輕量查詢，讓 gRPC channel 先連線"""
+    db = app.db
+    if isinstance(db, LazyFirestoreClient):
+        db.resolve()
+    list(db.collection('main_categories').limit(1).stream())
+
+
+def _init_storage_bucket(app):
+    """載入 Storage 函式庫並建立 bucket 物件"""
+    from models.database import get_bucket
+    get_bucket()
+
+
+def run_warmup(app):
+    """執行一次完整預熱，成功後標記為 ready"""
+    state = app.extensions['startup']
+    steps = [('firestore_channel', _open_firestore_channel),
+             ('storage_bucket', _init_storage_bucket)]
+    steps.extend(_WARMUP_HOOKS.items())
+
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            for name, fn in steps:
+                with state.phase(f'warmup.{name}'):
+                    fn(app)
+    except Exception as e:
+        state.error = f'{type(e).__name__}: {str(e)}'
+        print(f"Warm-up failed: {state.error}")
+        return False
+
+    state.add_phase('warmup', time.perf_counter() - started)
+    state.error = None
+    state.ready.set()
+    return True
+
+
+def _warmup_loop(app, interval):
+    while not run_warmup(app):
+        time.sleep(interval)
+
+
+def start_warmup(app):
+    """依 WARMUP_MODE 執行預熱：sync（阻塞）、background（背景）、off（略過）"""
+    state = app.extensions['startup']
+    mode = app.config.get('WARMUP_MODE', 'background')
+    interval = app.config.get('WARMUP_RETRY_INTERVAL', 5)
+
+    if mode == 'off':
+        state.ready.set()
+        return
+
+    if mode == 'sync' and run_warmup(app):
+        return
+
+    thread = threading.Thread(target=_warmup_loop, args=(app, interval),
+                              name='warmup', daemon=True)
+    thread.start()
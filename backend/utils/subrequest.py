@@ -0,0 +1,33 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 內部子請求在 WSGI environ 中的標記（負載卸除等 hooks 據此略過）
+SUBREQUEST_ENVIRON_KEY = 'myweb.subrequest'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_subrequest_pool(app):
+    """子請求共用的有界執行緒池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=app.config.get('SUBREQUEST_WORKERS', 16),
+                                           thread_name_prefix='subrequest')
+    return _pool
+
+
+def run_subrequest(app, path, headers=None, environ=None):
+    """以獨立的 request context 執行內部 GET 子請求（完整經過路由、hooks 與錯誤處理）
+
+    回傳 (response, 耗時秒數)。可在任何執行緒呼叫。
+    """
+    started = time.perf_counter()
+    environ_base = {SUBREQUEST_ENVIRON_KEY: True}
+    environ_base.update(environ or {})
+    with app.test_request_context(path, method='GET', headers=headers or {}, environ_base=environ_base):
+        response = app.full_dispatch_request()
+    return response, time.perf_counter() - started
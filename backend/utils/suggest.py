@@ -0,0 +1,316 @@
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from flask import has_request_context, request
+
+from models.hooks import on_change
+from utils.startup import register_warmup
+from utils.subrequest import SUBREQUEST_ENVIRON_KEY
+
+# 型號中的分隔符號，比對時忽略（「AB-12」與「ab12」相同）
+_MODEL_SEPARATORS = re.compile(r'[\s\-_./\\]+')
+# 索引鍵的最大長度，較長的查詢只比對前段
+MAX_KEY_LENGTH = 32
+# 型號數字段內的後綴至少幾位數才建立索引（「200」可找到「AB-1200」）
+MIN_DIGIT_SUFFIX = 2
+
+
+def normalize(text):
+    """NFKC（全形轉半形）、不分大小寫、合併空白"""
+    text = unicodedata.normalize('NFKC', str(text or '')).casefold()
+    return ' '.join(text.split())
+
+
+def _compact(text):
+    return _MODEL_SEPARATORS.sub('', text)
+
+
+def _is_cjk(char):
+    return unicodedata.category(char) == 'Lo'
+
+
+def _starts(text):
+    """可作為比對起點的位置：中日韓文字的每個字元，以及英數字詞的開頭與字母、數字交界"""
+    positions = []
+    previous = ''
+    for index, char in enumerate(text):
+        if _is_cjk(char):
+            positions.append(index)
+        elif char.isalnum() and not (previous.isalnum() and not _is_cjk(previous)
+                                     and previous.isdigit() == char.isdigit()):
+            positions.append(index)
+        previous = char
+    return positions
+
+
+def _digit_suffix_starts(text):
+    """數字段內（不含開頭）剩餘至少 MIN_DIGIT_SUFFIX 位數的位置"""
+    positions = []
+    run = 0
+    for index in range(len(text) - 1, -1, -1):
+        run = run + 1 if text[index].isdigit() else 0
+        if run >= MIN_DIGIT_SUFFIX and index > 0 and text[index - 1].isdigit():
+            positions.append(index)
+    return positions
+
+
+def index_keys(name, model):
+    """產品的索引鍵：[(鍵, 是否為欄位開頭)]
+
+    名稱從每個起點取後綴（中文可從任一字開始比對）；型號去除分隔符號後從每段開頭，
+    以及數字段內的每個位置取後綴。
+    """
+    keys = {}
+    name = normalize(name)
+    for position in _starts(name):
+        key = name[position:position + MAX_KEY_LENGTH]
+        keys[key] = keys.get(key, False) or position == 0
+    model = normalize(model)
+    for position in _starts(model) + _digit_suffix_starts(model):
+        key = _compact(model[position:])[:MAX_KEY_LENGTH]
+        if key:
+            keys[key] = keys.get(key, False) or position == 0
+    return list(keys.items())
+
+
+class Popularity:
+    """以指數衰減計算的產品熱門度
+
+    每次存取加上 2^(經過時間/半衰期)，比較時不需逐一衰減：較舊的存取權重自然較小。
+    """
+
+    def __init__(self, half_life=7 * 86400):
+        self.half_life = half_life
+        self._epoch = time.time()
+        self._scores = {}
+        self._lock = threading.Lock()
+
+    def hit(self, product_id, weight=1.0):
+        boost = weight * 2 ** ((time.time() - self._epoch) / self.half_life)
+        with self._lock:
+            self._scores[product_id] = self._scores.get(product_id, 0.0) + boost
+
+    def get(self, product_id):
+        return self._scores.get(product_id, 0.0)
+
+    def forget(self, product_id):
+        with self._lock:
+            self._scores.pop(product_id, None)
+
+
+class SuggestIndex:
+    """產品名稱與型號的前綴索引（排序陣列 + 二分搜尋）
+
+    寫入先放進待合併區，查詢同時掃描排序陣列與待合併區；待合併區超過 merge_threshold 筆時
+    重新排序合併。前綴範圍超過 scan_limit 個鍵（通常是一、兩個字的查詢）時，排序結果快取
+    cache_ttl 秒，避免每次按鍵都掃描大範圍。
+    """
+
+    def __init__(self, merge_threshold=256, scan_limit=500, cache_ttl=30, half_life=7 * 86400):
+        self.merge_threshold = merge_threshold
+        self.scan_limit = scan_limit
+        self.cache_ttl = cache_ttl
+        self.popularity = Popularity(half_life)
+        self.loaded_at = None
+        self.merges = 0
+        self._lock = threading.RLock()
+        self._products = {}      # product_id -> (名稱, 型號, 是否精選)
+        self._keys = []          # 排序後的索引鍵
+        self._ids = []           # 與 _keys 對應的 product_id
+        self._heads = []         # 與 _keys 對應：是否為欄位開頭
+        self._pending = {}       # product_id -> [(鍵, 是否為欄位開頭)]，尚未合併
+        self._stale = set()      # 排序陣列中已更新或刪除的 product_id
+        self._wide_cache = {}    # 前綴 -> (時間, 排序後的 product_id)
+
+    @property
+    def loaded(self):
+        return self.loaded_at is not None
+
+    def __len__(self):
+        return len(self._products)
+
+    def _merge(self):
+        entries = []
+        for product_id, (name, model, featured) in self._products.items():
+            for key, head in index_keys(name, model):
+                entries.append((key, product_id, head))
+        entries.sort()
+        self._keys = [entry[0] for entry in entries]
+        self._ids = [entry[1] for entry in entries]
+        self._heads = [entry[2] for entry in entries]
+        self._pending = {}
+        self._stale = set()
+        self._wide_cache = {}
+        self.merges += 1
+
+    def load(self, db):
+        """從 Firestore 重建整份索引（只讀取名稱、型號與精選欄位）"""
+        from models.product import Product
+
+        products = {}
+        query = db.collection(Product.COLLECTION).select(['name', 'model', 'is_featured'])
+        for doc in query.stream():
+            data = doc.to_dict() or {}
+            products[doc.id] = (data.get('name') or '', data.get('model') or '',
+                                bool(data.get('is_featured')))
+        with self._lock:
+            self._products = products
+            self._merge()
+            self.loaded_at = time.time()
+
+    def upsert(self, product):
+        """新增或更新一筆產品（接受 Product 物件）"""
+        with self._lock:
+            entry = (product.name or '', product.model or '', bool(product.is_featured))
+            if self._products.get(product.id) == entry:
+                return
+            self._products[product.id] = entry
+            self._stale.add(product.id)
+            self._pending[product.id] = index_keys(entry[0], entry[1])
+            self._wide_cache = {}
+            if len(self._pending) >= self.merge_threshold:
+                self._merge()
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._products.pop(product_id, None) is None:
+                return
+            self._stale.add(product_id)
+            self._pending.pop(product_id, None)
+            self._wide_cache = {}
+            self.popularity.forget(product_id)
+
+    def _rank(self, candidates):
+        """依熱門度、精選、是否從開頭比對、名稱長度排序"""
+        popularity = self.popularity.get
+        products = self._products
+
+        def key(item):
+            product_id, head = item
+            name, _, featured = products[product_id]
+            return (-popularity(product_id), not featured, not head, len(name), name)
+
+        return sorted(candidates.items(), key=key)
+
+    def _collect(self, prefix, candidates, limit):
+        """prefix 範圍內的候選 {product_id: 是否從開頭比對}；範圍超過 limit 時回傳 False"""
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + '\U0010ffff', lo)
+        if hi - lo > limit:
+            return False
+        for index in range(lo, hi):
+            product_id = self._ids[index]
+            if product_id in self._stale:
+                continue
+            candidates[product_id] = candidates.get(product_id, False) or self._heads[index]
+        for product_id, pending_keys in self._pending.items():
+            for key, head in pending_keys:
+                if key.startswith(prefix):
+                    candidates[product_id] = candidates.get(product_id, False) or head
+        return True
+
+    def suggest(self, query, limit=8):
+        """前綴符合 query 的產品 [{'id', 'name', 'model'}]，依熱門度排序"""
+        prefix = normalize(query)[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        prefixes = {prefix}
+        compact = _compact(prefix)
+        if compact and compact != prefix:
+            prefixes.add(compact)
+
+        with self._lock:
+            cache_key = '\0'.join(sorted(prefixes))
+            cached = self._wide_cache.get(cache_key)
+            if cached is not None and time.time() - cached[0] < self.cache_ttl:
+                ranked = cached[1]
+            else:
+                candidates = {}
+                narrow = all([self._collect(p, candidates, self.scan_limit) for p in prefixes])
+                if narrow:
+                    ranked = [product_id for product_id, _ in self._rank(candidates)[:limit]]
+                else:
+                    # 大範圍：完整掃描一次並快取前 100 名
+                    for p in prefixes:
+                        self._collect(p, candidates, len(self._keys))
+                    ranked = [product_id for product_id, _ in self._rank(candidates)[:100]]
+                    self._wide_cache[cache_key] = (time.time(), ranked)
+
+            result = []
+            for product_id in ranked[:limit]:
+                name, model, _ = self._products[product_id]
+                result.append({'id': product_id, 'name': name, 'model': model or None})
+            return result
+
+    def top(self, count):
+        """目前熱門度最高的產品 id"""
+        with self._lock:
+            return heapq.nlargest(count, self._products, key=self.popularity.get)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'products': len(self._products),
+                'keys': len(self._keys),
+                'pending': len(self._pending),
+                'merges': self.merges,
+                'loaded_at': self.loaded_at
+            }
+
+
+suggest_index = SuggestIndex()
+
+
+def get_suggest_index(app):
+    """取得已載入的索引；首次使用時同步載入，超過 CATALOG_REFRESH_INTERVAL 則背景重載"""
+    if not suggest_index.loaded:
+        with suggest_index._lock:
+            if not suggest_index.loaded:
+                suggest_index.load(app.db)
+    elif time.time() - suggest_index.loaded_at >= app.config.get('CATALOG_REFRESH_INTERVAL', 300):
+        _refresh_async(app.db)
+    return suggest_index
+
+
+_refreshing = threading.Lock()
+
+
+def _refresh_async(db):
+    """背景重載（同步其他 worker 的寫入），同一時間只跑一次"""
+    if not _refreshing.acquire(blocking=False):
+        return
+
+    def _run():
+        try:
+            suggest_index.load(db)
+        except Exception as e:
+            print(f"Error refreshing suggest index: {str(e)}")
+        finally:
+            _refreshing.release()
+
+    threading.Thread(target=_run, name='suggest-refresh', daemon=True).start()
+
+
+def record_product_view(product_id):
+    """記錄一次產品瀏覽，提高其建議排序；內部請求（預熱、預渲染、子請求）不計入"""
+    if has_request_context() and request.environ.get(SUBREQUEST_ENVIRON_KEY):
+        return
+    if suggest_index.loaded and product_id in suggest_index._products:
+        suggest_index.popularity.hit(product_id)
+
+
+def _on_product_change(action, product):
+    if not suggest_index.loaded or not product.id:
+        return
+    if action == 'delete':
+        suggest_index.remove(product.id)
+    else:
+        suggest_index.upsert(product)
+
+
+on_change('products', _on_product_change)
+register_warmup('suggest', lambda app: get_suggest_index(app))
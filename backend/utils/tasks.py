@@ -0,0 +1,82 @@
+from models.blobs import release_blob, store_blob
+from models.counters import CATEGORY_PRODUCT_COUNTS, COUNTER_COLLECTION
+from models.database import get_bucket, get_db
+from models.deadline import call_timeout
+from .jobs import register_task
+
+
+@register_task('blobs.store')
+def store_content_blob(payload, data):
+    """上傳內容定址 blob 並增加參照（op_key 確保重試不重複計數）"""
+    return {'url': store_blob(data, payload['content_type'], op_key=payload['op_key'])}
+
+
+@register_task('blobs.release')
+def release_content_blob(payload, data):
+    """減少 blob 參照，歸零時刪除檔案"""
+    return {'deleted': release_blob(payload['url'], op_key=payload['op_key'])}
+
+
+@register_task('storage.upload')
+def upload_file(payload, data):
+    """上傳檔案到固定路徑（路徑在加入工作時已決定，重試會覆寫相同內容）"""
+    blob = get_bucket().blob(payload['path'])
+    blob.upload_from_string(data, content_type=payload.get('content_type'))
+    blob.make_public()
+    return {'url': blob.public_url}
+
+
+@register_task('storage.delete')
+def delete_file(payload, data):
+    """從 Storage 刪除非內容定址的檔案（檔案已不存在視為成功）"""
+    return {'deleted': release_blob(payload['url'])}
+
+
+def _delete_all(records):
+    """逐筆刪除，回傳 (成功刪除的紀錄, 失敗的 id)"""
+    records = list(records)
+    deleted, failed = [], []
+    for record in records:
+        (deleted if record.delete() else failed).append(record)
+    return deleted, [record.id for record in failed]
+
+
+def _raise_failed(failed):
+    if failed:
+        raise RuntimeError(f"刪除失敗: {', '.join(map(str, failed))}")
+
+
+@register_task('cascade.product_images')
+def delete_product_images(payload, data):
+    """刪除已刪除產品的所有圖片"""
+    from models.product import ProductImage
+    deleted, failed = _delete_all(ProductImage.filter_by(product_id=payload['product_id']))
+    _raise_failed(failed)
+    return {'deleted': len(deleted)}
+
+
+@register_task('cascade.subcategory_products')
+def delete_subcategory_products(payload, data):
+    """刪除已刪除子分類的所有產品
+
+    子分類已不存在，產品刪除時查不到主分類，主分類的產品數由這裡依實際刪除筆數扣除。
+    """
+    from models.product import Product
+    deleted, failed = _delete_all(Product.filter_by(sub_category_id=payload['sub_category_id']))
+    main_category_id = payload.get('main_category_id')
+    if deleted and main_category_id:
+        db = get_db()
+        batch = db.batch()
+        CATEGORY_PRODUCT_COUNTS.increment(batch, db, {f'main:{main_category_id}': -len(deleted)})
+        batch.commit(timeout=call_timeout(COUNTER_COLLECTION))
+    _raise_failed(failed)
+    return {'deleted': len(deleted)}
+
+
+@register_task('cascade.main_category_subcategories')
+def delete_main_category_subcategories(payload, data):
+    """刪除已刪除主分類的所有子分類"""
+    from models.category import SubCategory
+    deleted, failed = _delete_all(SubCategory.filter_by(main_category_id=payload['main_category_id']))
+    _raise_failed(failed)
+    return {'deleted': len(deleted)}